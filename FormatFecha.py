@@ -1,5 +1,4 @@
-from app import connect_db  # Importar la función connect_db desde app.py
-import sqlite3
+from db import connect as connect_db
 from datetime import datetime
 
 def reformat_dates():
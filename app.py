@@ -1,15 +1,16 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, g, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, g, jsonify, Response, stream_with_context
 from flask_sse import sse
 import sqlite3
 from flask_cors import CORS
 import pandas as pd
 import matplotlib
 matplotlib.use('Agg')  # Usar backend 'Agg' para entornos sin GUI
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from io import BytesIO
 import base64
 import os
 import json
+import zlib
 from datetime import datetime, timedelta
 import subprocess
 import re
@@ -24,12 +25,21 @@ import signal
 from datetime import datetime, timedelta
 from contextlib import contextmanager
 import platform
+import asyncio
 import redis
-
-# Constantes para el ping personalizado
-ICMP_ECHO_REQUEST = 8
-DEFAULT_TIMEOUT = 10  # segundos
-DEFAULT_COUNT = 1
+from markupsafe import Markup, escape
+
+# Constantes y motor para el ping personalizado
+from icmp_engine import checksum, get_engine as get_icmp_engine, ICMP_ECHO_REQUEST, DEFAULT_TIMEOUT, DEFAULT_COUNT
+from monitor_scheduler import MonitorScheduler, AdaptivePolicy
+from latency_ring import LatencyRing
+from status_broadcaster import StatusBroadcaster
+from response_cache import ResponseCache
+from db import connect as connect_db
+from migrations import migrate as run_migrations
+from ticket_import import UPLOAD_EXTENSIONS, find_import, import_file, save_upload
+from job_queue import JobQueue
+from ping_history import PingHistoryStore, RAW as PING_HISTORY_RAW, RESOLUTIONS as PING_HISTORY_RESOLUTIONS
 
 class TimeoutError(Exception):
     pass
@@ -46,30 +56,6 @@ def timeout(seconds):
     finally:
         signal.alarm(0)
 
-def checksum(source_string):
-    """
-    Calcula el checksum de la cabecera ICMP
-    """
-    sum = 0
-    count_to = (len(source_string) // 2) * 2
-    count = 0
-    while count < count_to:
-        this_val = source_string[count + 1] * 256 + source_string[count]
-        sum = sum + this_val
-        sum = sum & 0xffffffff
-        count = count + 2
-
-    if count_to < len(source_string):
-        sum = sum + source_string[-1]
-        sum = sum & 0xffffffff
-
-    sum = (sum >> 16) + (sum & 0xffff)
-    sum = sum + (sum >> 16)
-    answer = ~sum
-    answer = answer & 0xffff
-    answer = answer >> 8 | (answer << 8 & 0xff00)
-    return answer
-
 def ping(host, timeout=10):
     """
     Envía un ping a la dirección IP especificada usando el comando del sistema.
@@ -179,10 +165,6 @@ except Exception as e:
     app.config['USE_SSE'] = False
     print(f"[SSE] Redis no disponible ({e}). SSE deshabilitado. La app funcionará sin notificaciones en tiempo real.")
 
-# Variables globales para monitoreo
-monitoring_threads = {}
-monitoring_events = {}
-
 # Variable global para caché de datos de ping
 # Función para validar IP
 def is_valid_ip(ip):
@@ -193,46 +175,174 @@ def is_valid_ip(ip):
         return False
 
 class PingCache:
-    def __init__(self):
-        self.data = {}
-        self.lock = threading.RLock()  # Usar RLock para permitir anidamiento seguro
-        self.max_samples = 100  # Número máximo de muestras a mantener por IP
-        
+    """
+    Caché de resultados de ping con bloqueo por franjas y snapshots publicados.
+
+    Cada IP se protege con uno de `stripes` locks (según su hash), así que los
+    sondeos de IPs distintas no compiten entre sí. Tras cada escritura se
+    publica en `published` una copia serializable de la entrada; esa copia no
+    se vuelve a modificar, por lo que los lectores HTTP la toman sin ningún
+    lock y la serialización a JSON ocurre fuera de la sección crítica.
+
+    El snapshot lleva sólo el resumen que el buffer circular ya mantiene
+    (`window_stats`: min/max/avg/last), no la lista de latencias: copiarla en
+    cada sondeo es O(ventana) por escritura. Los lectores que la necesitan la
+    piden con `expand()`, que la arma una sola vez por versión (el primer
+    lector toma el lock de la franja) y el resto la toma de `_latency_lists`
+    sin lock.
+
+    Cada publicación o baja incrementa `version` (monótona); los snapshots
+    llevan la versión en que se publicaron para poder enviar sólo los cambios.
+    """
+
+    MAX_TOMBSTONES = 1024  # Bajas recordadas para los clientes incrementales
+
+    def __init__(self, stripes=32, max_samples=100):
+        self.data = {}  # Entradas mutables, sólo se tocan con el lock de su franja
+        self.published = {}  # IP -> snapshot inmutable de la última escritura
+        self._stripes = [threading.RLock() for _ in range(stripes)]
+        self.max_samples = max_samples  # Número máximo de muestras a mantener por IP
+        self.version = 0
+        self.removed = {}  # IP -> versión en que se eliminó
+        self._removed_floor = 0  # Versión máxima de las bajas ya olvidadas
+        self._version_lock = threading.Lock()  # Sólo protege la asignación de versiones (O(1))
+        self.listeners = []  # Funciones listener(ip, snapshot, version); snapshot None en las bajas
+        self._latency_lists = {}  # IP -> (versión, tupla de latencias) armada a pedido de un lector
+
+    def lock_for(self, ip):
+        """Lock de la franja que protege a una IP."""
+        return self._stripes[hash(ip) % len(self._stripes)]
+
+    @contextmanager
+    def mutate(self, ip):
+        """
+        Bloquea la franja de la IP, entrega su entrada (creándola si no existe)
+        y publica un nuevo snapshot al terminar.
+        """
+        with self.lock_for(ip):
+            entry = self.data.get(ip)
+            if entry is None:
+                entry = self.data[ip] = {}
+            yield entry
+            self._publish(ip)
+
+    def reset(self, ip, entry):
+        """Reemplaza la entrada de una IP y la publica."""
+        with self.lock_for(ip):
+            self.data[ip] = entry
+            self._publish(ip)
+
+    def remove(self, ip):
+        """Elimina una IP de la caché. Devuelve su último snapshot o None."""
+        with self.lock_for(ip):
+            self.data.pop(ip, None)
+            self._latency_lists.pop(ip, None)
+            with self._version_lock:
+                snapshot = self.published.pop(ip, None)
+                if snapshot is not None:
+                    self.version += 1
+                    self.removed[ip] = self.version
+                    # Olvidar las bajas más antiguas; quien pida cambios anteriores recibe todo
+                    while len(self.removed) > self.MAX_TOMBSTONES:
+                        oldest = next(iter(self.removed))
+                        self._removed_floor = max(self._removed_floor, self.removed.pop(oldest))
+                    version = self.version
+            if snapshot is not None:
+                self._notify(ip, None, version)
+            return snapshot
+
+    def _publish(self, ip):
+        # Se llama con el lock de la franja tomado. El snapshot se arma fuera del
+        # lock de versiones; la versión se asigna y publica en orden, así todo
+        # snapshot con versión <= self.version ya es visible para los lectores
+        entry = self.data.get(ip)
+        if entry is not None:
+            snapshot = self._serialize_entry(entry)
+            with self._version_lock:
+                self.version += 1
+                snapshot['version'] = self.version
+                self.published[ip] = snapshot
+                self.removed.pop(ip, None)
+            self._notify(ip, snapshot, snapshot['version'])
+
+    def expand(self, ip, snapshot):
+        """
+        Copia de un snapshot con su lista de latencias, para enviarlo completo a un cliente.
+
+        La lista corresponde siempre a la versión devuelta: si el buffer ya
+        avanzó respecto de `snapshot`, se devuelve el último snapshot publicado.
+        """
+        if snapshot is None:
+            return None
+        cached = self._latency_lists.get(ip)
+        if cached is not None and cached[0] == snapshot['version']:
+            return {**snapshot, 'latencies': cached[1]}
+        with self.lock_for(ip):
+            # Con el lock de la franja el buffer coincide con el último snapshot publicado
+            current = self.published.get(ip)
+            if current is None:
+                return {**snapshot, 'latencies': ()}
+            ring = (self.data.get(ip) or {}).get('latencies')
+            values = tuple(ring.values() if isinstance(ring, LatencyRing) else ring or ())
+            self._latency_lists[ip] = (current['version'], values)
+        return {**current, 'latencies': values}
+
+    def expand_all(self, snapshots):
+        return {ip: self.expand(ip, snapshot) for ip, snapshot in snapshots.items()}
+
+    def _notify(self, ip, snapshot, version):
+        for listener in self.listeners:
+            try:
+                listener(ip, snapshot, version)
+            except Exception as e:
+                print(f"[PingCache] Error notificando el cambio de {ip}: {str(e)}")
+
     def _initialize_ip_data(self, ip):
-        """Inicializa la estructura de datos para una IP si no existe."""
-        with self.lock:
-            if ip not in self.data or not isinstance(self.data[ip], dict):
-                self.data[ip] = {
-                    'latencies': [],
-                    'loss': 100.0,
-                    'last_update': None,
-                    'stats': {
-                        'total_pings': 0,
-                        'successful_pings': 0,
-                        'failed_pings': 0,
-                        'min_latency': None,
-                        'max_latency': None,
-                        'avg_latency': None,
-                        'loss_percentage': 0.0
-                    }
+        """Inicializa la estructura de datos para una IP si no existe y la publica si la creó."""
+        with self.lock_for(ip):
+            if self._ensure_entry(ip):
+                self._publish(ip)
+
+    def _ensure_entry(self, ip):
+        """
+        Completa los campos que falten en la entrada de una IP, sin publicar.
+        Se llama con el lock de la franja tomado. Devuelve True si creó la entrada.
+        """
+        created = ip not in self.data or not isinstance(self.data[ip], dict)
+        if created:
+            self.data[ip] = {
+                'latencies': LatencyRing(self.max_samples),
+                'loss': 100.0,
+                'last_update': None,
+                'stats': {
+                    'total_pings': 0,
+                    'successful_pings': 0,
+                    'failed_pings': 0,
+                    'min_latency': None,
+                    'max_latency': None,
+                    'avg_latency': None,
+                    'loss_percentage': 0.0
                 }
-            # Asegurarse de que todos los campos necesarios existen
-            if 'stats' not in self.data[ip]:
-                self.data[ip]['stats'] = {}
-            
-            # Inicializar todos los campos necesarios
-            stats = self.data[ip]['stats']
-            stats.setdefault('total_pings', 0)
-            stats.setdefault('successful_pings', 0)
-            stats.setdefault('failed_pings', 0)
-            stats.setdefault('min_latency', None)
-            stats.setdefault('max_latency', None)
-            stats.setdefault('avg_latency', None)
-            stats.setdefault('loss_percentage', 0.0)
-            
-            self.data[ip].setdefault('latencies', [])
-            self.data[ip].setdefault('loss', 100.0)
-            self.data[ip].setdefault('last_update', None)
+            }
+        # Asegurarse de que todos los campos necesarios existen
+        if 'stats' not in self.data[ip]:
+            self.data[ip]['stats'] = {}
+        
+        # Inicializar todos los campos necesarios
+        stats = self.data[ip]['stats']
+        stats.setdefault('total_pings', 0)
+        stats.setdefault('successful_pings', 0)
+        stats.setdefault('failed_pings', 0)
+        stats.setdefault('min_latency', None)
+        stats.setdefault('max_latency', None)
+        stats.setdefault('avg_latency', None)
+        stats.setdefault('loss_percentage', 0.0)
+        
+        if not isinstance(self.data[ip].get('latencies'), LatencyRing):
+            self.data[ip]['latencies'] = LatencyRing(self.max_samples)
+        self.data[ip].setdefault('loss', 100.0)
+        self.data[ip].setdefault('last_update', None)
+        return created
 
     def _get_or_create_ip_data(self, ip):
         """Obtiene los datos de una IP, inicializándolos si es necesario."""
@@ -246,10 +356,10 @@ class PingCache:
             print(f"[PingCache] IP inválida: {ip}")
             return False
             
-        with self.lock:
+        with self.lock_for(ip):
             try:
-                # Asegurarse de que los datos estén inicializados
-                self._initialize_ip_data(ip)
+                # Asegurarse de que los datos estén inicializados (se publica una sola vez, al final)
+                self._ensure_entry(ip)
                 ip_data = self.data[ip]
                 stats = ip_data['stats']
                 
@@ -266,7 +376,7 @@ class PingCache:
                 
                 # Actualizar contadores basados en si el ping fue exitoso o no
                 if is_success:  # Ping exitoso
-                    # Añadir latencia a la lista
+                    # Añadir latencia al buffer circular (descarta la más antigua si está lleno)
                     ip_data['latencies'].append(latency)
                     
                     # Actualizar estadísticas de latencia
@@ -275,9 +385,8 @@ class PingCache:
                     if stats['max_latency'] is None or latency > stats['max_latency']:
                         stats['max_latency'] = latency
                         
-                    # Calcular promedio de latencia
-                    if ip_data['latencies']:
-                        stats['avg_latency'] = sum(ip_data['latencies']) / len(ip_data['latencies'])
+                    # Promedio de la ventana, mantenido incrementalmente por el buffer
+                    stats['avg_latency'] = ip_data['latencies'].avg
                 
                 # Actualizar contadores de éxito/fracaso
                 if is_success:
@@ -303,10 +412,7 @@ class PingCache:
                 
                 # Actualizar timestamp
                 ip_data['last_update'] = datetime.now()
-                
-                # Limitar el tamaño de la lista de latencias
-                if len(ip_data['latencies']) > self.max_samples:
-                    ip_data['latencies'] = ip_data['latencies'][-self.max_samples:]
+                self._publish(ip)
                 
                 # Debug: Mostrar estado actual de los contadores
                 print(f"[PingCache] Update - IP: {ip}, Éxitos: {stats['successful_pings']}, Fallos: {stats['failed_pings']}, Total: {stats['total_pings']}, Pérdida: {ip_data['loss']:.2f}%")
@@ -343,142 +449,122 @@ class PingCache:
                 }
             }
             
-        with self.lock:
-            try:
-                # Asegurarse de que los datos estén inicializados
-                if ip not in self.data or 'stats' not in self.data.get(ip, {}):
-                    return {
-                        'latencies': [],
-                        'loss': 100,
-                        'valid': False,
-                        'message': 'No hay datos disponibles para esta IP',
-                        'stats': {
-                            'total_pings': 0,
-                            'successful_pings': 0,
-                            'failed_pings': 0,
-                            'min_latency': None,
-                            'max_latency': None,
-                            'avg_latency': None
-                        }
-                    }
-                
-                # Hacer una copia profunda para evitar problemas de concurrencia
-                import copy
-                ip_data = copy.deepcopy(self.data[ip])
-                
-                # Asegurar que los campos requeridos existan
-                ip_data.setdefault('latencies', [])
-                ip_data.setdefault('loss', 100)
-                ip_data.setdefault('valid', True)
-                ip_data.setdefault('stats', {})
-                
-                # Inicializar estadísticas si no existen
-                stats = ip_data['stats']
-                stats.setdefault('total_pings', 0)
-                stats.setdefault('successful_pings', 0)
-                stats.setdefault('failed_pings', 0)
-                
-                # Calcular estadísticas de latencia si hay datos
-                if ip_data['latencies']:
-                    stats['min_latency'] = min(ip_data['latencies'])
-                    stats['max_latency'] = max(ip_data['latencies'])
-                    stats['avg_latency'] = sum(ip_data['latencies']) / len(ip_data['latencies'])
-                else:
-                    stats['min_latency'] = None
-                    stats['max_latency'] = None
-                    stats['avg_latency'] = None
-                
-                # Preparar el resultado final
-                result = {
-                    'latencies': ip_data['latencies'].copy(),
-                    'loss': ip_data['loss'],
-                    'last_update': ip_data.get('last_update'),
-                    'valid': ip_data['valid'],
-                    'stats': stats.copy()
-                }
-                
-                return result
-                
-            except Exception as e:
-                print(f"[PingCache] Error al obtener datos para {ip}: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                return {
-                    'latencies': [],
-                    'loss': 100,
-                    'valid': False,
-                    'error': f'Error al obtener datos: {str(e)}',
-                    'stats': {
-                        'total_pings': 0,
-                        'successful_pings': 0,
-                        'failed_pings': 0,
-                        'min_latency': None,
-                        'max_latency': None,
-                        'avg_latency': None
-                    }
+        # Lectura desde el snapshot publicado (con sus latencias, ver expand)
+        ip_data = self.expand(ip, self.published.get(ip))
+        if ip_data is None or 'stats' not in ip_data:
+            return {
+                'latencies': [],
+                'loss': 100,
+                'valid': False,
+                'message': 'No hay datos disponibles para esta IP',
+                'stats': {
+                    'total_pings': 0,
+                    'successful_pings': 0,
+                    'failed_pings': 0,
+                    'min_latency': None,
+                    'max_latency': None,
+                    'avg_latency': None
                 }
+            }
+        
+        # Copiar sólo las estadísticas; el snapshot no se comparte mutable
+        stats = dict(ip_data['stats'])
+        stats.setdefault('total_pings', 0)
+        stats.setdefault('successful_pings', 0)
+        stats.setdefault('failed_pings', 0)
+        
+        # Estadísticas de latencia calculadas por el buffer circular al publicar
+        window = ip_data['window_stats']
+        stats['min_latency'] = window['min']
+        stats['max_latency'] = window['max']
+        stats['avg_latency'] = window['avg']
+        
+        return {
+            'latencies': list(ip_data['latencies']),
+            'loss': ip_data.get('loss', 100),
+            'last_update': ip_data.get('last_update'),
+            'valid': ip_data.get('valid', True),
+            'stats': stats
+        }
 
-ping_cache = PingCache()
+    @staticmethod
+    def _serialize_entry(ip_data):
+        """Convierte una entrada de la caché en un dict serializable a JSON (sin la lista de latencias)."""
+        entry = dict(ip_data)
+        ring = entry.pop('latencies', None)
+        if isinstance(ring, LatencyRing):
+            entry['window_stats'] = ring.stats()
+        else:
+            entry['window_stats'] = LatencyRing(1).stats()
+        if isinstance(entry.get('stats'), dict):
+            entry['stats'] = dict(entry['stats'])
+        return entry
+
+    def get(self, ip):
+        """Último snapshot publicado de una IP (sin lock). No debe modificarse."""
+        return self.published.get(ip)
+
+    def snapshot(self, ip=None):
+        """Snapshots publicados: de una IP, o de toda la caché. Nunca bloquea a los escritores."""
+        if ip is not None:
+            return self.published.get(ip)
+        # dict.copy() es atómica bajo el GIL
+        return self.published.copy()
+
+    def changes_since(self, since):
+        """
+        Cambios publicados después de la versión `since`.
+
+        Devuelve (version, full, changed, removed): `full` indica que el cliente
+        debe reemplazar todo su estado (primera consulta, bajas ya olvidadas o
+        una versión mayor a la actual: el contador se reinicia con el proceso y
+        cada worker tiene el suyo).
+        """
+        # Leer la versión antes de copiar: todo lo que tenga versión <= current ya está publicado
+        current = self.version
+        published = self.published.copy()
+        if since <= 0 or since < self._removed_floor or since > current:
+            return current, True, published, []
+        changed = {ip: snapshot for ip, snapshot in published.items() if snapshot['version'] > since}
+        removed = [ip for ip, version in self.removed.copy().items() if version > since]
+        return current, False, changed, removed
+
+    def __contains__(self, ip):
+        return ip in self.published
+
+# Muestras de latencia que se conservan por IP (un único buffer por IP, el de la caché)
+LATENCY_WINDOW = 60
+
+ping_cache = PingCache(max_samples=LATENCY_WINDOW)
+
+# Stream de estado en tiempo real alimentado por las publicaciones de la caché
+status_broadcaster = StatusBroadcaster(lambda: (ping_cache.version, ping_cache.expand_all(ping_cache.snapshot())),
+                                       expand=ping_cache.expand)
+ping_cache.listeners.append(status_broadcaster.publish)
+if app.config['USE_SSE']:
+    # Con Redis disponible los cambios se difunden también entre procesos
+    status_broadcaster.attach_redis(_redis_client)
+
+# Caché de respuestas del dashboard; las rutas que escriben tickets la invalidan
+response_cache = ResponseCache(ttl=float(os.environ.get('RESPONSE_CACHE_TTL', '60')))
+
+# Cola de trabajos en segundo plano (importaciones, informes, escaneo de correo), ver job_queue.py
+job_queue = JobQueue(connect_db, workers=int(os.environ.get('JOB_WORKERS', '2')))
+EMAIL_SCAN_INTERVAL_MINUTES = float(os.environ.get('EMAIL_SCAN_INTERVAL_MINUTES', '0'))  # 0 = sólo a pedido
+IMPORT_UPLOAD_DIR = os.environ.get('IMPORT_UPLOAD_DIR') or None  # None = carpeta temporal del sistema
+
+# Columnas de configuración del monitoreo adaptativo por servidor (NULL = valor global)
+SERVER_MONITOR_COLUMNS = ('monitor_healthy_interval', 'monitor_degraded_interval', 'monitor_max_backoff')
 
 def init_db():
-    """Inicializa la base de datos y agrega columnas si es necesario."""
-    db_exists = os.path.exists('tickets.db')
-    conn = sqlite3.connect('tickets.db')
-    c = conn.cursor()
-
-    # Crear tablas
-    c.execute('''CREATE TABLE IF NOT EXISTS tickets (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    ticket_number INTEGER UNIQUE,
-                    creation_date TEXT,
-                    agent TEXT,
-                    status TEXT,
-                    collaborators TEXT,
-                    first_response TEXT,
-                    sla_resolution TEXT,
-                    close_date TEXT,
-                    delay TEXT,
-                    user TEXT,
-                    details TEXT,
-                    priority TEXT,
-                    type TEXT,
-                    branch TEXT
-                )''')
-
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS branches (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE NOT NULL
-        )
-    ''')
-
-    c.execute('''CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT UNIQUE NOT NULL
-    )''')
-
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS servers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            branch TEXT NOT NULL UNIQUE,
-            branch_code TEXT NOT NULL,
-            dyndns TEXT,
-            primary_service_provider TEXT,
-            primary_service_ip TEXT,
-            primary_service_speed TEXT,
-            secondary_service_provider TEXT,
-            secondary_service_ip TEXT,
-            secondary_service_speed TEXT
-        )
-    ''')
-
-    # Insertar sucursales por defecto
-    default_branches = sorted(['Casa Central', 'Sucursal Norte', 'Sucursal Sur'])
-    for branch in default_branches:
-        c.execute('INSERT OR IGNORE INTO branches (name) VALUES (?)', (branch,))
+    """Crea o actualiza el esquema aplicando las migraciones pendientes (ver migrations.py)."""
+    return run_migrations(verbose=True)
 
-    conn.commit()
-    conn.close()
+# Mantener el esquema al día al iniciar
+try:
+    init_db()
+except sqlite3.Error as e:
+    print(f"[DB] Error al aplicar las migraciones: {e}")
 
 
 @app.route('/edit_server/<int:server_id>', methods=['GET', 'POST'])
@@ -566,16 +652,21 @@ def get_servers():
     return servers  # Devolver la lista de servidores
 
 def get_db():
-    """Conecta a la base de datos SQLite (usando el contexto de la aplicación)."""
-    if 'db' not in g:
-        g.db = sqlite3.connect('tickets.db')
+    """
+    Conexión a la base de datos SQLite del pool compartido (una por contexto de la app).
+    Si la ruta ya la devolvió con close(), se toma otra del pool.
+    """
+    if 'db' not in g or g.db.lease != g.db_lease:
+        g.db = connect_db()
+        g.db_lease = g.db.lease
     return g.db
 
 @app.teardown_appcontext
 def close_db(exception):
-    """Cierra la conexión a la base de datos al final del ciclo de vida de la app."""
+    """Devuelve la conexión al pool al final del ciclo de vida del contexto."""
     db = g.pop('db', None)
-    if db is not None:
+    lease = g.pop('db_lease', None)
+    if db is not None and db.lease == lease:
         db.close()
 
 
@@ -743,37 +834,32 @@ def average_filter(lst):
     except (TypeError, ZeroDivisionError):
         return 0
 
+def load_dashboard_counters(conn):
+    """
+    Contadores materializados del dashboard (tabla ticket_counters).
+    Devuelve {dimensión: {valor: (total, sla_excedidos)}}.
+    """
+    counters = {}
+    rows = conn.execute("SELECT dimension, value, total, sla_exceeded FROM ticket_counters WHERE total > 0")
+    for dimension, value, total, exceeded in rows:
+        counters.setdefault(dimension, {})[value] = (total, exceeded)
+    return counters
+
 @app.route('/')
+@response_cache.cached('tickets')
 def index():
     conn = get_db()
     c = conn.cursor()
 
-    # Obtener todos los estados únicos
-    c.execute("SELECT DISTINCT status FROM tickets")
-    statuses = [row[0] for row in c.fetchall()]
-
-    # Contar tickets por estado
-    tickets_by_status = {}
-    total_tickets = 0
-    for status in statuses:
-        c.execute("SELECT COUNT(*) FROM tickets WHERE status = ?", (status,))
-        count = c.fetchone()[0]
-        tickets_by_status[status] = count
-        total_tickets += count
+    # Contadores por estado, agente y SLA desde la tabla materializada
+    counters = load_dashboard_counters(conn)
+    tickets_by_status = {status: total for status, (total, _) in counters.get('status', {}).items()}
+    total_tickets = sum(tickets_by_status.values())
 
     # Obtener contadores específicos directamente
     closed_tickets = tickets_by_status.get('Cerrado', 0)
     open_tickets_count = tickets_by_status.get('Abierto', 0)
     derived_tickets = tickets_by_status.get('Derivado', 0)
-    pending_tickets = tickets_by_status.get('Pendiente', 0)
-
-    print("\n--- VERIFICACIÓN DE CONSISTENCIA ---")
-    print(f"Total tickets: {total_tickets}")
-    print(f"Cerrados: {closed_tickets}")
-    print(f"Abiertos: {open_tickets_count}")
-    print(f"Derivados: {derived_tickets}")
-    print(f"Pendientes: {pending_tickets}")
-    print("--- FIN DE VERIFICACIÓN ---\n")
 
     # Formatear datos para el gráfico "Tickets por Estado"
     tickets_by_status_data = {
@@ -782,54 +868,60 @@ def index():
     }
 
     # Últimos tickets creados
-    c.execute("SELECT id, ticket_number, creation_date, agent, status FROM tickets ORDER BY creation_date DESC LIMIT 5")
+    c.execute("SELECT id, ticket_number, creation_date, agent, status FROM tickets ORDER BY created_at DESC LIMIT 5")
     recent_tickets = c.fetchall()
 
-    # Obtener los últimos tickets abiertos
-    c.execute("SELECT id, ticket_number, creation_date, agent, status FROM tickets WHERE status = 'Abierto' ORDER BY creation_date DESC LIMIT 5")
-    open_tickets = c.fetchall()
+    # % SLA Excedido sobre todos los tickets
+    exceeded = counters.get('sla', {}).get('Excedido', (0, 0))[0]
+    percent_exceeded = round(exceeded * 100.0 / total_tickets, 2) if total_tickets else 0
+    sla_exceeded_data = {"labels": ["Total"], "values": [percent_exceeded]}
 
-    # % SLA Excedidos en los últimos 4 meses (ahora sobre todos los tickets)
-    c.execute("""
-        SELECT 
-            COUNT(*) as total_tickets,
-            COUNT(CASE WHEN sla_resolution = 'Excedido' THEN 1 END) as excedidos,
-            ROUND((COUNT(CASE WHEN sla_resolution = 'Excedido' THEN 1 END) * 100.0 / COUNT(*)), 2) AS percent_exceeded
-        FROM tickets
-    """)
-    sla_exceeded_summary = c.fetchone()
+    # Tickets con SLA excedido por agente
+    agent_exceeded = sorted(
+        ((agent or 'Sin agente', exceeded) for agent, (_, exceeded) in counters.get('agent', {}).items() if exceeded),
+        key=lambda item: item[1], reverse=True
+    )
+    agent_exceeded_data = {
+        "labels": [agent for agent, _ in agent_exceeded],
+        "values": [exceeded for _, exceeded in agent_exceeded]
+    }
 
-    print("\n--- VERIFICACIÓN DE SLA ---")
+    return render_template('index.html',
+                           current_datetime=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                           total_tickets=total_tickets,
+                           closed_tickets=closed_tickets,
+                           derived_tickets=derived_tickets,
+                           open_tickets_count=open_tickets_count,
+                           recent_tickets=recent_tickets,
+                           tickets_by_status_json=json.dumps(tickets_by_status_data),
+                           sla_exceeded_json=json.dumps(sla_exceeded_data),
+                           agent_exceeded_json=json.dumps(agent_exceeded_data))
 
 # --- NUEVAS RUTAS API PARA REACT ---
 @app.route('/api/dashboard/stats')
+@response_cache.cached('tickets')
 def api_dashboard_stats():
     conn = get_db()
     c = conn.cursor()
     
-    # Obtener estados y contadores (Lógica similar a index)
-    c.execute("SELECT status, COUNT(*) FROM tickets GROUP BY status")
-    counts = dict(c.fetchall())
+    # Contadores materializados: se leen unas pocas filas en lugar de recorrer tickets
+    counters = load_dashboard_counters(conn)
+    counts = {status: total for status, (total, _) in counters.get('status', {}).items()}
     
     total = sum(counts.values())
     
     # SLA General
-    c.execute("""
-        SELECT 
-            COUNT(*) as total_tickets,
-            COUNT(CASE WHEN sla_resolution = 'Excedido' THEN 1 END) as excedidos
-        FROM tickets
-    """)
-    sla_row = c.fetchone()
-    sla_percent = (sla_row[1] * 100.0 / sla_row[0]) if sla_row[0] > 0 else 0
+    exceeded = counters.get('sla', {}).get('Excedido', (0, 0))[0]
+    sla_percent = (exceeded * 100.0 / total) if total > 0 else 0
 
     # Actividad Reciente (Últimos 5 creados)
     c.execute("SELECT ticket_number, user, creation_date, status FROM tickets ORDER BY id DESC LIMIT 5")
     recent_created = [{"type": "new", "ticket": r[0], "user": r[1], "date": r[2], "status": r[3]} for r in c.fetchall()]
 
     # Estadísticas por Sucursal (Top 5)
-    c.execute("SELECT branch, COUNT(*) as count FROM tickets WHERE branch IS NOT NULL AND branch != '' GROUP BY branch ORDER BY count DESC LIMIT 5")
-    branch_stats = [{"name": r[0], "count": r[1]} for r in c.fetchall()]
+    branches = sorted(((branch, count) for branch, (count, _) in counters.get('branch', {}).items() if branch),
+                      key=lambda item: item[1], reverse=True)[:5]
+    branch_stats = [{"name": branch, "count": count} for branch, count in branches]
 
     return jsonify({
         "total_tickets": total,
@@ -842,103 +934,338 @@ def api_dashboard_stats():
         "branch_stats": branch_stats
     })
 
+@app.route('/api/cache/stats')
+def api_cache_stats():
+    return jsonify(response_cache.stats())
+
+# Filtros de /api/tickets: parámetro -> columna (igualdad exacta)
+TICKET_FILTERS = {'status': 'status', 'agent': 'agent', 'branch': 'branch', 'user': 'user'}
+TICKETS_PAGE_SIZE = 50
+TICKETS_MAX_PAGE_SIZE = 500
+
+def ticket_columns(conn):
+    """Columnas de la tabla tickets (para validar `fields=`)."""
+    return [row[1] for row in conn.execute("PRAGMA table_info(tickets)")]
+
+def parse_date_filter(value, end=False):
+    """Fecha YYYY-MM-DD o D/M/YYYY de un filtro; `end` la vuelve exclusiva (día siguiente)."""
+    for fmt in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            day = datetime.strptime(value.strip(), fmt)
+            return (day + timedelta(days=1) if end else day).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    raise ValueError(f"Fecha inválida: {value}")
+
+def ticket_filters(args):
+    """Condiciones SQL y parámetros de los filtros de tickets presentes en `args`."""
+    conditions, params = [], []
+    for arg, column in TICKET_FILTERS.items():
+        if args.get(arg):
+            conditions.append(f"{column} = ?")
+            params.append(args[arg])
+    if args.get('date_from'):
+        conditions.append("created_at >= ?")
+        params.append(parse_date_filter(args['date_from']))
+    if args.get('date_to'):
+        conditions.append("created_at < ?")
+        params.append(parse_date_filter(args['date_to'], end=True))
+    return conditions, params
+
+def tickets_total(conn, args, conditions, params):
+    """
+    Total de tickets que cumplen los filtros. Sin filtros o con un único filtro
+    por estado/agente/sucursal sale de ticket_counters; si no, se cuenta.
+    """
+    used = [arg for arg in ('status', 'agent', 'branch', 'user', 'date_from', 'date_to') if args.get(arg)]
+    if not used:
+        row = conn.execute("SELECT SUM(total) FROM ticket_counters WHERE dimension = 'status'").fetchone()
+        return row[0] or 0
+    if len(used) == 1 and used[0] in ('status', 'agent', 'branch'):
+        row = conn.execute("SELECT total FROM ticket_counters WHERE dimension = ? AND value = ?",
+                           (used[0], args[used[0]])).fetchone()
+        return row[0] if row else 0
+    return conn.execute(f"SELECT COUNT(*) FROM tickets WHERE {' AND '.join(conditions)}", params).fetchone()[0]
+
 @app.route('/api/tickets')
+@response_cache.cached('tickets')
 def api_get_tickets():
+    """
+    Tickets paginados por cursor (keyset) sobre ticket_number, del más nuevo al más viejo.
+
+    Parámetros: limit, cursor (next_cursor de la página anterior), order=desc|asc,
+    status, agent, branch, user, date_from, date_to (YYYY-MM-DD o D/M/YYYY) y
+    fields=col1,col2 para devolver sólo esas columnas. `total` se calcula sólo
+    en la primera página (sin cursor).
+    """
     conn = get_db()
-    c = conn.cursor()
-    # Usamos CAST para asegurar orden numérico si ticket_number es texto
-    c.execute("SELECT * FROM tickets ORDER BY CAST(ticket_number AS INTEGER) DESC")
-    columns = [column[0] for column in c.description]
-    tickets = [dict(zip(columns, row)) for row in c.fetchall()]
-    conn.close()
-    return jsonify(tickets)
+    columns = ticket_columns(conn)
+
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    unknown = [f for f in fields if f not in columns]
+    if unknown:
+        return jsonify({"status": "error", "message": f"Campos desconocidos: {', '.join(unknown)}"}), 400
+    if fields:
+        # id y ticket_number siempre: identifican la fila y arman el cursor
+        fields = ['id', 'ticket_number'] + [f for f in fields if f not in ('id', 'ticket_number')]
+    else:
+        fields = columns
+
+    try:
+        limit = min(max(int(request.args.get('limit', TICKETS_PAGE_SIZE)), 1), TICKETS_MAX_PAGE_SIZE)
+        cursor = request.args.get('cursor')
+        cursor = int(cursor) if cursor not in (None, '') else None
+        conditions, params = ticket_filters(request.args)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    descending = request.args.get('order', 'desc').lower() != 'asc'
+    total = tickets_total(conn, request.args, conditions, params) if cursor is None else None
+
+    # ticket_number tiene afinidad INTEGER: ordenar por la columna usa su índice único
+    page_conditions = list(conditions)
+    page_params = list(params)
+    if cursor is not None:
+        page_conditions.append("ticket_number < ?" if descending else "ticket_number > ?")
+        page_params.append(cursor)
+    where = f"WHERE {' AND '.join(page_conditions)}" if page_conditions else ""
+    rows = conn.execute(
+        f"SELECT {', '.join(fields)} FROM tickets {where} "
+        f"ORDER BY ticket_number {'DESC' if descending else 'ASC'} LIMIT ?",
+        page_params + [limit + 1]
+    ).fetchall()
+
+    has_more = len(rows) > limit
+    tickets = [dict(zip(fields, row)) for row in rows[:limit]]
+    return jsonify({
+        "tickets": tickets,
+        "next_cursor": tickets[-1]['ticket_number'] if has_more else None,
+        "has_more": has_more,
+        "total": total,
+        "limit": limit
+    })
+
+EXPORT_BATCH_SIZE = 1000  # Filas por fetchmany y por chunk de la respuesta
+
+def iter_ticket_export(sql, params, fields, fmt):
+    """
+    Genera la exportación por lotes: cada `fetchmany` se codifica y se envía
+    sin acumular la tabla en memoria. Usa su propia conexión del pool porque
+    el generador sigue corriendo después de que la vista devolvió la respuesta.
+    """
+    conn = connect_db()
+    try:
+        cursor = conn.execute(sql, params)
+        first = True
+        if fmt == 'json':
+            yield '['
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                break
+            encoded = [json.dumps(dict(zip(fields, row)), ensure_ascii=False, default=str) for row in rows]
+            if fmt == 'json':
+                yield ('' if first else ',') + ','.join(encoded)
+            else:
+                yield '\n'.join(encoded) + '\n'
+            first = False
+        if fmt == 'json':
+            yield ']'
+    finally:
+        conn.close()
+
+def gzip_stream(chunks):
+    """Comprime un stream de texto chunk a chunk (formato gzip)."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        # SYNC_FLUSH: cada lote sale al cliente sin esperar al siguiente
+        data = compressor.compress(chunk.encode('utf-8')) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+@app.route('/api/tickets/export')
+def api_export_tickets():
+    """
+    Exportación completa de tickets en streaming, con memoria constante.
+
+    Parámetros: format=ndjson|json, order=desc|asc, fields= y los mismos
+    filtros que /api/tickets. Se comprime con gzip si el cliente lo acepta
+    (gzip=0 lo desactiva).
+    """
+    fmt = request.args.get('format', 'ndjson').lower()
+    if fmt not in ('ndjson', 'json'):
+        return jsonify({"status": "error", "message": "format debe ser ndjson o json"}), 400
+
+    conn = get_db()
+    columns = ticket_columns(conn)
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()] or columns
+    unknown = [f for f in fields if f not in columns]
+    if unknown:
+        return jsonify({"status": "error", "message": f"Campos desconocidos: {', '.join(unknown)}"}), 400
+    try:
+        conditions, params = ticket_filters(request.args)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    order = 'ASC' if request.args.get('order', 'desc').lower() == 'asc' else 'DESC'
+    sql = f"SELECT {', '.join(fields)} FROM tickets {where} ORDER BY ticket_number {order}"
+
+    body = iter_ticket_export(sql, params, fields, fmt)
+    headers = {
+        'Content-Disposition': f'attachment; filename=tickets.{fmt}',
+        'Cache-Control': 'no-cache',
+    }
+    use_gzip = request.args.get('gzip', '1') != '0' and 'gzip' in request.headers.get('Accept-Encoding', '')
+    if use_gzip:
+        body = gzip_stream(body)
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+    return Response(body, mimetype=mimetype, headers=headers)
+
+def import_finished(info):
+    """Borra el archivo subido y, si la importación terminó bien, invalida la caché de tickets."""
+    try:
+        os.remove(info['payload']['path'])
+    except OSError:
+        pass
+    if info['status'] == 'done':
+        response_cache.invalidate('tickets')
+
+# Una importación a la vez (SQLite tiene un solo escritor); un reintento retoma por los rangos ya guardados
+@job_queue.register('import', max_attempts=3, retry_delay=10, concurrency=1, on_finish=import_finished)
+def run_import_job(job):
+    options = job.payload
+
+    def progress(partial):
+        total = partial['total_rows']
+        job.progress(min(round(partial['rows'] * 100 / total, 1), 99) if total else None,
+                     f"{partial['rows']} filas leídas",
+                     rows=partial['rows'], total_rows=total,
+                     new_tickets=partial['new_tickets'], updated_tickets=partial['updated_tickets'])
+
+    conn = connect_db()
+    try:
+        return import_file(conn, options['path'], options['filename'], options['file_hash'],
+                           options.get('force', False), options.get('update', False), progress)
+    finally:
+        conn.close()
+
+def enqueue_import(path, filename, file_hash, force=False, update=False):
+    return job_queue.enqueue('import', {'path': path, 'filename': filename, 'file_hash': file_hash,
+                                        'force': force, 'update': update})
 
 @app.route('/api/tickets/upload', methods=['POST'])
 def api_upload_tickets():
+    """
+    Recibe una exportación (.xlsx, .xls o .csv) y la importa en segundo plano.
+
+    Si el archivo ya se importó se responde enseguida (200, `duplicate`); si no,
+    se devuelve 202 con el id del trabajo para consultar su progreso en
+    /api/jobs/<job_id>. Con update=1 también se actualizan los
+    tickets existentes que cambiaron (historial en /api/tickets/<id>/changes).
+    """
     if 'file' not in request.files:
         return jsonify({"status": "error", "message": "No se recibió archivo"}), 400
     
     file = request.files['file']
-    if not file or not file.filename.endswith(('.xlsx', '.xls')):
+    if not file or not file.filename.lower().endswith(UPLOAD_EXTENSIONS):
         return jsonify({"status": "error", "message": "Formato de archivo inválido"}), 400
 
     try:
-        data = pd.read_excel(file)
-        conn = get_db()
-        c = conn.cursor()
-        new_count = 0
-
-        for _, row in data.iterrows():
-            ticket_number = row.get('Ticket')
-            if not ticket_number: continue
-
-            # Verificar si existe para no duplicar
-            c.execute("SELECT 1 FROM tickets WHERE ticket_number = ?", (ticket_number,))
-            if not c.fetchone():
-                creation_date = row.get('Fecha de creacion')
-                agent_raw = str(row.get('Agente', ''))
-                status = row.get('Estado')
-                collaborators = row.get('Colaboradores')
-                first_response = row.get('Primera Respuesta')
-                sla_resolution = row.get('SLA de resolucion')
-                close_date = row.get('Fecha de cierre')
-                
-                # Lógica de extracción de Usuario y Sucursal
-                user = row.get('Usuario')
-                branch = row.get('Sucursal', '')
-                agent = agent_raw
-
-                # Si el campo Agente trae la info del cliente (formato "| Sucursal, Usuario")
-                if '|' in agent_raw:
-                    parts = agent_raw.split('|')
-                    if len(parts) > 1:
-                        info = parts[1].split(',')
-                        if len(info) > 1:
-                            if not branch or pd.isna(branch):
-                                branch = info[0].strip()
-                            if not user or pd.isna(user):
-                                user = info[1].strip()
-                    agent = "S/A" # Opcional: podrías poner "Sistema" o dejarlo vacío si es info de usuario
-
-                # Asegurar que no sean NaN para la DB
-                user = str(user) if user and not pd.isna(user) else ''
-                branch = str(branch) if branch and not pd.isna(branch) else ''
-                agent = str(agent) if agent and not pd.isna(agent) else ''
-
-                priority = row.get('Prioridad', 'Normal')
-                
-                # Cálculo de demora
-                delay = '0 días'
-                if close_date and creation_date:
-                    try:
-                        if isinstance(creation_date, str) and isinstance(close_date, str):
-                            creation = datetime.strptime(creation_date, "%d/%m/%Y")
-                            close = datetime.strptime(close_date, "%d/%m/%Y")
-                            delay = f"{(close - creation).days} días"
-                        elif hasattr(creation_date, 'year') and hasattr(close_date, 'year'):
-                            delay = f"{(close_date - creation_date).days} días"
-                    except:
-                        delay = str(row.get('Demora', '0 días'))
-
-                c.execute('''
-                    INSERT INTO tickets (ticket_number, creation_date, agent, status, collaborators, 
-                    first_response, sla_resolution, close_date, delay, user, details, branch, priority)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                    (ticket_number, str(creation_date), agent, status, collaborators, 
-                     first_response, sla_resolution, str(close_date), delay, user, "", branch, priority))
-                new_count += 1
-
-        conn.commit()
-        conn.close()
+        path, file_hash = save_upload(file, IMPORT_UPLOAD_DIR)
+        force = request.form.get('force') == '1'
+        update = request.form.get('update') == '1'
+        previous = None if force else find_import(get_db(), file_hash, 'upsert' if update else 'insert')
+        if previous is not None:
+            os.remove(path)
+            import_id, rows, existing, rejected, imported_at = previous
+            return jsonify({
+                "status": "success",
+                "message": f"Este archivo ya se importó el {imported_at}. No hay cambios.",
+                "duplicate": True,
+                "import_id": import_id,
+                "imported_at": imported_at,
+                "rows": rows,
+                "new_tickets": 0,
+                "updated_tickets": 0,
+                "existing": existing,
+                "rejected": rejected
+            })
+        job_id = enqueue_import(path, file.filename, file_hash, force=force, update=update)
         return jsonify({
-            "status": "success", 
-            "message": f"Se procesaron los datos. {new_count} nuevos tickets agregados.",
-            "new_tickets": new_count
-        })
+            "status": "accepted",
+            "message": "Importación en cola.",
+            "job_id": job_id,
+            "status_url": url_for('api_job', job_id=job_id)
+        }), 202
     except Exception as e:
-        if 'conn' in locals(): conn.close()
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/api/imports')
+def api_imports():
+    """Últimas importaciones registradas (import_ledger)."""
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    c = get_db().execute("""
+        SELECT id, filename, sheet, mode, status, rows, processed_rows, new_tickets, existing_tickets,
+               updated_tickets, rejected, rejected_rows, duration_ms, imported_at
+        FROM import_ledger ORDER BY id DESC LIMIT ?
+    """, (limit,))
+    columns = [column[0] for column in c.description]
+    imports = [dict(zip(columns, row)) for row in c.fetchall()]
+    for entry in imports:
+        entry['rejected_rows'] = json.loads(entry['rejected_rows'] or '[]')
+    return jsonify(imports)
+
+# El escáner inserta tickets por su cuenta: al terminar se invalida la caché
+@job_queue.register('email_scan', max_attempts=3, retry_delay=60, concurrency=1,
+                    on_finish=lambda info: response_cache.invalidate('tickets'))
+def run_email_scan_job(job):
+    from email_ticket_scanner import scan_emails  # Lee las credenciales de .env.email al importarse
+    return {'new_tickets': scan_emails(raise_errors=True)}
+
+if EMAIL_SCAN_INTERVAL_MINUTES > 0:
+    job_queue.schedule('email_scan', EMAIL_SCAN_INTERVAL_MINUTES * 60)
+
+@app.route('/api/email/scan', methods=['POST'])
+def api_email_scan():
+    """Encola un escaneo de correos (si ya hay uno pendiente se devuelve ese)."""
+    pending = job_queue.list(kind='email_scan', status='queued', limit=1) or \
+        job_queue.list(kind='email_scan', status='running', limit=1)
+    job_id = pending[0]['id'] if pending else job_queue.enqueue('email_scan')
+    return jsonify({
+        "status": "accepted",
+        "job_id": job_id,
+        "status_url": url_for('api_job', job_id=job_id)
+    }), 202
+
+@app.route('/api/jobs')
+def api_jobs():
+    """Últimos trabajos de la cola, filtrables por tipo (kind) y estado (status)."""
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    return jsonify(job_queue.list(request.args.get('kind'), request.args.get('status'), limit))
+
+@app.route('/api/jobs/stats')
+def api_jobs_stats():
+    return jsonify(job_queue.stats())
+
+@app.route('/api/jobs/<int:job_id>')
+def api_job(job_id):
+    """Estado, avance y resultado de un trabajo."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Trabajo no encontrado"}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<int:job_id>/cancel', methods=['POST'])
+def api_cancel_job(job_id):
+    status = job_queue.cancel(job_id)
+    if status is None:
+        return jsonify({"status": "error", "message": "Trabajo no encontrado"}), 404
+    return jsonify({"status": "success", "job_status": status, "cancel_requested": status == 'running'})
+
 @app.route('/api/agents')
 def api_get_agents():
     conn = get_db()
@@ -974,6 +1301,16 @@ def api_get_branches():
     conn.close()
     return jsonify(all_branches)
 
+@app.route('/api/tickets/<int:ticket_id>/changes')
+def api_ticket_changes(ticket_id):
+    """Cambios que las importaciones hicieron en un ticket, del más reciente al más viejo."""
+    c = get_db().execute("""
+        SELECT id, field, old_value, new_value, import_id, changed_at
+        FROM ticket_changes WHERE ticket_id = ? ORDER BY id DESC
+    """, (ticket_id,))
+    columns = [column[0] for column in c.description]
+    return jsonify([dict(zip(columns, row)) for row in c.fetchall()])
+
 @app.route('/api/tickets/<int:ticket_id>', methods=['PUT'])
 def api_update_ticket(ticket_id):
     data = request.json
@@ -1039,6 +1376,7 @@ def api_update_ticket(ticket_id):
             ticket_id
         ))
         conn.commit()
+        response_cache.invalidate('tickets')
         conn.close()
         return jsonify({"status": "success", "message": "Ticket actualizado correctamente", "delay": delay})
     except Exception as e:
@@ -1052,8 +1390,10 @@ def api_get_servers():
         # Enriquecer con datos de cache si existen
         for server in servers:
             ip = server.get('primary_service_ip')
-            if ip and ip in ping_cache.data:
-                server['monitoring'] = ping_cache.data[ip]
+            if ip:
+                monitoring = ping_cache.expand(ip, ping_cache.snapshot(ip))
+                if monitoring is not None:
+                    server['monitoring'] = monitoring
         return jsonify(servers)
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -1075,12 +1415,15 @@ def api_add_server():
         
         c.execute('''INSERT INTO servers (branch, branch_code, dyndns, primary_service_provider, 
                       primary_service_ip, primary_service_speed, secondary_service_provider, 
-                      secondary_service_ip, secondary_service_speed) 
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''', 
+                      secondary_service_ip, secondary_service_speed, monitor_healthy_interval, 
+                      monitor_degraded_interval, monitor_max_backoff) 
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', 
                   (branch_name, data.get('branch_code'), data.get('dyndns', ''), 
                    data.get('primary_service_provider'), data.get('primary_service_ip'), 
                    data.get('primary_service_speed'), data.get('secondary_service_provider', ''), 
-                   data.get('secondary_service_ip', ''), data.get('secondary_service_speed', '')))
+                   data.get('secondary_service_ip', ''), data.get('secondary_service_speed', ''),
+                   data.get('monitor_healthy_interval'), data.get('monitor_degraded_interval'),
+                   data.get('monitor_max_backoff')))
         conn.commit()
         return jsonify({"status": "success", "message": "Servidor agregado correctamente"})
     except Exception as e:
@@ -1104,7 +1447,18 @@ def api_server_detail(server_id):
                        data.get('primary_service_provider'), data.get('primary_service_ip'), 
                        data.get('primary_service_speed'), data.get('secondary_service_provider'), 
                        data.get('secondary_service_ip'), data.get('secondary_service_speed'), server_id))
+            
+            # Intervalos de monitoreo: sólo se modifican si vienen en la solicitud
+            monitor_settings = {column: data[column] for column in SERVER_MONITOR_COLUMNS if column in data}
+            if monitor_settings:
+                assignments = ', '.join(f"{column}=?" for column in monitor_settings)
+                c.execute(f"UPDATE servers SET {assignments} WHERE id=?", (*monitor_settings.values(), server_id))
             conn.commit()
+            
+            c.execute("SELECT * FROM servers WHERE id = ?", (server_id,))
+            row = c.fetchone()
+            if row:
+                refresh_monitor_policies(dict(zip([column[0] for column in c.description], row)))
             return jsonify({"status": "success", "message": "Servidor actualizado"})
         
         elif request.method == 'DELETE':
@@ -1118,9 +1472,58 @@ def api_server_detail(server_id):
 
 @app.route('/api/servers/status', methods=['GET'])
 def api_servers_status():
-    # Retornar el estado actual de la caché de pings
-    with ping_cache.lock:
-        return jsonify(ping_cache.data)
+    """
+    Estado de la caché de pings.
+
+    Sin parámetros devuelve la caché completa con ETag = versión actual (304 si
+    el cliente ya la tiene). Con `?since=<versión>` devuelve sólo las IPs que
+    cambiaron y las que se dejaron de monitorear desde esa versión.
+    """
+    current = ping_cache.version
+    etag = str(current)
+    since = request.args.get('since', type=int)
+    
+    # Nada nuevo para el cliente: responder sin cuerpo (una versión mayor a la
+    # actual viene de otro proceso o de antes de un reinicio: va el estado completo)
+    if (since is not None and 0 < since and since == current) or request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    
+    if since is None:
+        # Retornar el estado actual de la caché de pings
+        response = jsonify(ping_cache.expand_all(ping_cache.snapshot()))
+    else:
+        version, full, changed, removed = ping_cache.changes_since(since)
+        etag = str(version)
+        response = jsonify({
+            'version': version,
+            'full': full,
+            'changed': ping_cache.expand_all(changed),
+            'removed': removed
+        })
+    response.set_etag(etag)
+    response.headers['X-Status-Version'] = etag
+    return response
+
+@app.route('/api/servers/stream', methods=['GET'])
+def api_servers_stream():
+    """
+    Stream SSE del estado de la caché de pings.
+
+    Envía un evento `snapshot` con el estado completo al conectar y luego
+    eventos `update` con el mismo formato que /api/servers/status?since=
+    ({version, changed, removed}) a medida que llegan los sondeos.
+    """
+    subscriber = status_broadcaster.subscribe()
+    return Response(
+        stream_with_context(status_broadcaster.stream(subscriber)),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Evitar que un proxy nginx acumule los eventos
+        }
+    )
 
 @app.route('/api/servers/monitor/start-all', methods=['POST'])
 def api_monitor_start_all():
@@ -1129,11 +1532,17 @@ def api_monitor_start_all():
     for server in servers:
         for key in ['primary_service_ip', 'secondary_service_ip']:
             ip = server.get(key)
-            if ip and is_valid_ip(ip) and ip not in monitoring_threads:
-                start_monitor(ip)
+            if ip and is_valid_ip(ip) and ip not in monitor_scheduler:
+                # Sin esperar el primer resultado: el planificador reparte los sondeos
+                begin_monitoring(ip)
                 count += 1
     return jsonify({"status": "success", "message": f"Iniciado monitoreo para {count} servicios"})
 
+@app.route('/api/servers/monitor', methods=['GET'])
+def api_monitor_list():
+    # IPs actualmente en el planificador de monitoreo
+    return jsonify(monitor_scheduler.list())
+
 @app.route('/tickets')
 def show_tickets():
     page = int(request.args.get('page', 1))
@@ -1183,41 +1592,87 @@ def show_tickets():
         min=min
     )
 
-@app.route('/search_tickets', methods=['GET'])
-def search_tickets():
-    query = request.args.get('query', '').lower()
-    conn = get_db()
-    c = conn.cursor()
+# Columnas del listado de tickets.html (el template accede por posición)
+TICKET_LIST_COLUMNS = ('id', 'ticket_number', 'creation_date', 'agent', 'status', 'collaborators',
+                       'first_response', 'sla_resolution', 'close_date', 'delay', 'user',
+                       'details', 'priority', 'type', 'branch')
+# Peso de cada columna de tickets_fts en bm25 (mismo orden que migrations.FTS_COLUMNS)
+SEARCH_WEIGHTS = (10.0, 3.0, 1.0, 3.0, 1.0, 2.0)
+SEARCH_PAGE_SIZE = 50
 
-    # Dividir la consulta en palabras
-    words = query.split()
+def fts_query(text):
+    """
+    Convierte el texto del buscador en una consulta FTS5: cada palabra como
+    prefijo entre comillas (sin operadores del usuario), todas obligatorias.
+    """
+    words = [w.replace('"', '') for w in text.split()]
+    return ' '.join(f'"{w}"*' for w in words if w)
 
-    # Construir la cláusula WHERE
-    where_clauses = []
-    params = []
-    for word in words:
-        # Para cada palabra, agregamos una condición a la cláusula WHERE
-        where_clauses.append("LOWER(ticket_number) LIKE ? OR LOWER(agent) LIKE ? OR LOWER(status) LIKE ? OR LOWER(user) LIKE ? OR LOWER(details) LIKE ? OR LOWER(branch) LIKE ?")
-        params.extend([f'%{word}%', f'%{word}%', f'%{word}%', f'%{word}%', f'%{word}%', f'%{word}%'])
+def search_snippet(raw):
+    """Fragmento de snippet() listo para HTML: texto escapado y coincidencias en <mark>."""
+    if not raw:
+        return Markup('')
+    return Markup(str(escape(raw)).replace('\x02', '<mark>').replace('\x03', '</mark>'))
 
-    # Unir las cláusulas WHERE con 'OR'
-    where_sql = ' OR '.join(where_clauses)
+def search_ticket_index(conn, text, page=1, per_page=SEARCH_PAGE_SIZE):
+    """
+    Busca en tickets_fts con bm25. Devuelve (filas, total); cada fila trae las
+    columnas de TICKET_LIST_COLUMNS seguidas del snippet crudo y el rank.
+    """
+    match = fts_query(text)
+    if not match:
+        return [], 0
+    total = conn.execute("SELECT COUNT(*) FROM tickets_fts WHERE tickets_fts MATCH ?", (match,)).fetchone()[0]
+    columns = ', '.join(f't.{c}' for c in TICKET_LIST_COLUMNS)
+    weights = ', '.join(str(w) for w in SEARCH_WEIGHTS)
+    rows = conn.execute(f"""
+        SELECT {columns},
+               snippet(tickets_fts, -1, char(2), char(3), '…', 12),
+               bm25(tickets_fts, {weights}) AS rank
+        FROM tickets_fts
+        JOIN tickets t ON t.id = tickets_fts.rowid
+        WHERE tickets_fts MATCH ?
+        ORDER BY rank
+        LIMIT ? OFFSET ?
+    """, (match, per_page, (page - 1) * per_page)).fetchall()
+    return rows, total
 
-    # Ejecutar la consulta
-    c.execute(f"SELECT * FROM tickets WHERE {where_sql}", params)
-    results = c.fetchall()
-    conn.close()
+@app.route('/search_tickets', methods=['GET'])
+def search_tickets():
+    query = request.args.get('query', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    conn = get_db()
+    results, total = search_ticket_index(conn, query, page)
+    total_pages = max((total + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE, 1)
 
     # Enviar max y min al contexto para evitar errores de Jinja2
     return render_template(
         'tickets.html',
         tickets=results,
-        page=1,
-        total_pages=1,
+        snippets={row[0]: search_snippet(row[len(TICKET_LIST_COLUMNS)]) for row in results},
+        page=page,
+        total_pages=total_pages,
+        query=query,
+        pagination_endpoint='search_tickets',
         max=max,  # Pasar max al contexto
         min=min   # Pasar min al contexto
     )
 
+@app.route('/api/tickets/search')
+def api_search_tickets():
+    """Búsqueda de texto completo: q, page, per_page (máx. 200). Resultados ordenados por relevancia."""
+    query = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', SEARCH_PAGE_SIZE, type=int), 1), 200)
+    rows, total = search_ticket_index(get_db(), query, page, per_page)
+    results = []
+    for row in rows:
+        ticket = dict(zip(TICKET_LIST_COLUMNS, row))
+        ticket['snippet'] = str(search_snippet(row[len(TICKET_LIST_COLUMNS)]))
+        ticket['rank'] = row[len(TICKET_LIST_COLUMNS) + 1]
+        results.append(ticket)
+    return jsonify({"query": query, "total": total, "page": page, "per_page": per_page, "results": results})
+
 @app.route('/new_ticket', methods=['GET', 'POST'])
 def new_ticket():
     conn = get_db()
@@ -1281,6 +1736,7 @@ def new_ticket():
                     (ticket_number, creation_date, agent, status, collaborators, 
                     first_response, sla_resolution, close_date, delay, user, details, priority, type_, branch))
             conn.commit()
+            response_cache.invalidate('tickets')
             conn.close()
             flash('Ticket agregado exitosamente.', 'success')
             return redirect(url_for('show_tickets'))
@@ -1298,88 +1754,120 @@ def new_ticket():
 def upload():
     if request.method == 'POST':
         file = request.files.get('file')
-        if file and file.filename.endswith(('.xlsx', '.xls')):
+        if file and file.filename.lower().endswith(UPLOAD_EXTENSIONS):
             try:
-                data = pd.read_excel(file)
-                conn = get_db()
-                c = conn.cursor()
-
-                for _, row in data.iterrows():
-                    ticket_number = row.get('Ticket')
-                    creation_date = row.get('Fecha de creacion')
-                    agent = row.get('Agente')
-                    status = row.get('Estado')
-                    collaborators = row.get('Colaboradores')
-                    first_response = row.get('Primera Respuesta')
-                    sla_resolution = row.get('SLA de resolucion')
-                    close_date = row.get('Fecha de cierre')
-                    if close_date and creation_date:
-                        try:
-                            creation = datetime.strptime(str(creation_date), "%d/%m/%Y")
-                            close = datetime.strptime(str(close_date), "%d/%m/%Y")
-                            delay = f"{(close - creation).days} días"
-                        except ValueError:
-                            delay = row.get('Demora', '0 días')
-                    else:
-                        delay = '0 días'
-                    user = row.get('Usuario')
-                    details = row.get('Detalle del billete', '')
-                    branch = row.get('Sucursal', '')
-
-                    c.execute("SELECT 1 FROM tickets WHERE ticket_number = ?", (ticket_number,))
-                    if not c.fetchone():
-                        c.execute('''
-                            INSERT INTO tickets (ticket_number, creation_date, agent, status, collaborators, 
-                            first_response, sla_resolution, close_date, delay, user, details, branch)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                            (ticket_number, creation_date, agent, status, collaborators, 
-                             first_response, sla_resolution, close_date, delay, user, details, branch))
-                conn.commit()
-                conn.close()
-                flash('Archivo cargado exitosamente.', 'success')
-                return redirect(url_for('show_tickets'))
+                path, file_hash = save_upload(file, IMPORT_UPLOAD_DIR)
+                update = request.form.get('update') == '1'
+                previous = find_import(get_db(), file_hash, 'upsert' if update else 'insert')
+                if previous is not None:
+                    os.remove(path)
+                    flash(f"Este archivo ya se importó el {previous[4]}.", 'info')
+                    return redirect(url_for('show_tickets'))
+                job_id = enqueue_import(path, file.filename, file_hash, update=update)
+                return redirect(url_for('upload', job=job_id))
             except Exception as e:
                 flash(f'Error al procesar el archivo: {e}', 'error')
-    return render_template('upload.html')
+        else:
+            flash('Formato de archivo inválido.', 'error')
+    return render_template('upload.html', job_id=request.args.get('job', type=int))
 
-@app.route('/kanban')
-def kanban():
-    selected_status = request.args.get('status', None)
-    conn = get_db()
-    c = conn.cursor()
+KANBAN_COLUMN_LIMIT = 30  # Tarjetas por columna en la carga inicial y en cada "Cargar más"
+KANBAN_CARD_COLUMNS = ('id', 'ticket_number', 'creation_date', 'agent', 'status', 'user', 'details', 'created_at')
 
-    # Obtener todos los estados únicos, excluyendo None
-    c.execute("SELECT DISTINCT status FROM tickets WHERE status IS NOT NULL")
-    statuses = [row[0] for row in c.fetchall()]
+def kanban_card(row):
+    card = dict(zip(KANBAN_CARD_COLUMNS, row))
+    # Cursor para seguir la columna desde esta tarjeta (orden: created_at DESC, id DESC)
+    card['cursor'] = f"{card['created_at'] or ''}|{card['id']}"
+    return card
 
-    # Obtener tickets agrupados por estado
-    tickets_by_status = {status: [] for status in statuses}
-    for status in statuses:
-        if selected_status and status != selected_status:
-            continue
-        c.execute("SELECT * FROM tickets WHERE status = ?", (status,))
-        tickets = c.fetchall()
-        tickets_by_status[status] = tickets
+def kanban_columns(conn, status=None, limit=KANBAN_COLUMN_LIMIT):
+    """
+    Columnas del tablero con su total y sus primeras `limit` tarjetas, en una sola consulta.
 
-    conn.close()
-    return render_template('kanban.html', statuses=statuses, tickets=tickets_by_status, selected_status=selected_status)
+    Los estados y totales salen de ticket_counters; para cada estado la
+    subconsulta correlacionada toma las `limit` más recientes recorriendo
+    idx_tickets_status_created_at, así el costo no depende de cuántos tickets
+    tenga cada columna. ROW_NUMBER() ordena las tarjetas dentro de la columna.
+    """
+    columns = ', '.join(f't.{c}' for c in KANBAN_CARD_COLUMNS)
+    status_filter = "AND s.value = ?" if status else ""
+    rows = conn.execute(f"""
+        SELECT s.value, s.total, {columns},
+               ROW_NUMBER() OVER (PARTITION BY s.value ORDER BY t.created_at DESC, t.id DESC) AS position
+        FROM ticket_counters s
+        LEFT JOIN tickets t ON t.id IN (
+            SELECT id FROM tickets WHERE status = s.value
+            ORDER BY created_at DESC, id DESC LIMIT ?
+        )
+        WHERE s.dimension = 'status' AND s.value != '' AND s.total > 0 {status_filter}
+        ORDER BY s.value, position
+    """, [limit] + ([status] if status else [])).fetchall()
+    board = {}
+    for row in rows:
+        column = board.setdefault(row[0], {"status": row[0], "count": row[1], "cards": []})
+        if row[2] is not None:
+            column["cards"].append(kanban_card(row[2:2 + len(KANBAN_CARD_COLUMNS)]))
+    return list(board.values())
 
-@app.route('/generate_report', methods=['GET', 'POST'])
-def generate_report():
-    db = get_db()
-    cursor = db.cursor()
-    
-    # Obtener parámetros del formulario
-    estado = request.form.get('estado', 'Todos')
-    mes = request.form.get('mes', 'Todos')
-    agente = request.form.get('agente', 'Todos')
-    first_response = request.form.get('first_response', 'Todos')
-    sla_resolution = request.form.get('sla_resolution', 'Todos')
-    reporte = request.form.get('reporte', 'estados')  # Tipo de reporte por defecto
+@app.route('/kanban')
+def kanban():
+    selected_status = request.args.get('status', None)
+    conn = get_db()
+    columns = kanban_columns(conn, selected_status)
+    statuses = [column["status"] for column in columns] if not selected_status else [
+        value for value, (total, _) in sorted(load_dashboard_counters(conn).get('status', {}).items()) if value
+    ]
+    return render_template('kanban.html', statuses=statuses, columns=columns,
+                           selected_status=selected_status, page_size=KANBAN_COLUMN_LIMIT)
+
+@app.route('/api/kanban/cards')
+def api_kanban_cards():
+    """Siguientes tarjetas de una columna: status, cursor (de la última tarjeta) y limit."""
+    status = request.args.get('status', '')
+    if not status:
+        return jsonify({"status": "error", "message": "Falta el estado"}), 400
+    limit = min(max(request.args.get('limit', KANBAN_COLUMN_LIMIT, type=int), 1), 200)
+    created_at, _, last_id = request.args.get('cursor', '').rpartition('|')
+    try:
+        last_id = int(last_id)
+    except ValueError:
+        return jsonify({"status": "error", "message": "Cursor inválido"}), 400
+
+    # Mismo orden que kanban_columns: created_at DESC (NULL al final), id DESC
+    if created_at:
+        after = "(created_at < ? OR (created_at = ? AND id < ?) OR created_at IS NULL)"
+        params = [status, created_at, created_at, last_id]
+    else:
+        after = "(created_at IS NULL AND id < ?)"
+        params = [status, last_id]
+    rows = get_db().execute(f"""
+        SELECT {', '.join(KANBAN_CARD_COLUMNS)} FROM tickets
+        WHERE status = ? AND {after}
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    """, params + [limit + 1]).fetchall()
+    cards = [kanban_card(row) for row in rows[:limit]]
+    return jsonify({"cards": cards, "has_more": len(rows) > limit})
+
+REPORT_FILTERS = ('estado', 'mes', 'agente', 'first_response', 'sla_resolution')
+
+def render_report_chart(conn, options, job=None):
+    """
+    Gráfico PNG (en base64) del informe pedido en `options` (filtros de
+    REPORT_FILTERS y tipo en 'reporte'). Usa Figure en lugar de pyplot para
+    poder correr en los hilos de la cola de trabajos.
+    """
+    estado = options.get('estado', 'Todos')
+    mes = options.get('mes', 'Todos')
+    agente = options.get('agente', 'Todos')
+    first_response = options.get('first_response', 'Todos')
+    sla_resolution = options.get('sla_resolution', 'Todos')
+    reporte = options.get('reporte', 'estados')  # Tipo de reporte por defecto
 
     # Construir consulta base
+    # resolution_days (última columna) sale de las fechas normalizadas, sin parsear en Python
     query = """
-    SELECT * FROM tickets 
+    SELECT *, julianday(closed_at) - julianday(created_at) AS resolution_days FROM tickets 
     WHERE 1=1
     """
     params = []
@@ -1390,7 +1878,7 @@ def generate_report():
         params.append(estado)
     
     if mes != 'Todos':
-        query += " AND strftime('%m', creation_date) = ?"
+        query += " AND strftime('%m', created_at) = ?"
         params.append(mes)
     
     if agente != 'Todos':
@@ -1406,19 +1894,14 @@ def generate_report():
         params.append(sla_resolution)
 
     # Ejecutar consulta
-    cursor.execute(query, params)
-    tickets = cursor.fetchall()
-
-    # Definir estados y agentes
-    estados_query = "SELECT DISTINCT status FROM tickets ORDER BY status"
-    cursor.execute(estados_query)
-    estados = [row[0] for row in cursor.fetchall()]
-    
-    agentes_query = "SELECT DISTINCT agent FROM tickets WHERE agent IS NOT NULL AND agent != '' ORDER BY agent"
-    cursor.execute(agentes_query)
-    agentes = [row[0] for row in cursor.fetchall()]
+    if job:
+        job.progress(10, 'Consultando tickets')
+    tickets = conn.execute(query, params).fetchall()
+    if job:
+        job.progress(50, 'Dibujando gráfico')
 
-    plt.figure(figsize=(12, 8))
+    fig = Figure(figsize=(12, 8))
+    ax = fig.subplots()
 
     # Generar gráficos según el tipo de reporte
     if reporte == 'rendimiento_agente':
@@ -1444,29 +1927,26 @@ def generate_report():
         tickets_cerrados = [rendimiento_agentes[a]['tickets_cerrados'] for a in agentes_nombres]
 
         x = range(len(agentes_nombres))
-        plt.bar(x, total_tickets, label='Total Tickets', color='#47adcc', alpha=0.7)
-        plt.bar(x, tickets_cerrados, label='Tickets Cerrados', color='#2e8b57', alpha=0.7)
-        plt.xlabel('Agente')
-        plt.ylabel('Número de Tickets')
-        plt.title('Rendimiento por Agente')
-        plt.xticks(x, agentes_nombres, rotation=45)
-        plt.legend()
+        ax.bar(x, total_tickets, label='Total Tickets', color='#47adcc', alpha=0.7)
+        ax.bar(x, tickets_cerrados, label='Tickets Cerrados', color='#2e8b57', alpha=0.7)
+        ax.set_xlabel('Agente')
+        ax.set_ylabel('Número de Tickets')
+        ax.set_title('Rendimiento por Agente')
+        ax.set_xticks(x, agentes_nombres, rotation=45)
+        ax.legend()
 
     elif reporte == 'tiempo_resolucion':
         # Calcular tiempo de resolución
         tiempos_resolucion = []
         for ticket in tickets:
-            if ticket[3] == 'Cerrado':
-                # Calcular tiempo de resolución en días
-                creation_date = datetime.strptime(ticket[4], '%Y-%m-%d %H:%M:%S')
-                close_date = datetime.strptime(ticket[5], '%Y-%m-%d %H:%M:%S')
-                tiempo = (close_date - creation_date).total_seconds() / (24 * 3600)
-                tiempos_resolucion.append(tiempo)
+            # Días de resolución ya calculados por la consulta (NULL si no está cerrado)
+            if ticket[-1] is not None:
+                tiempos_resolucion.append(ticket[-1])
 
-        plt.hist(tiempos_resolucion, bins=20, color='#47adcc', edgecolor='black')
-        plt.xlabel('Días para Resolución')
-        plt.ylabel('Número de Tickets')
-        plt.title('Distribución de Tiempo de Resolución')
+        ax.hist(tiempos_resolucion, bins=20, color='#47adcc', edgecolor='black')
+        ax.set_xlabel('Días para Resolución')
+        ax.set_ylabel('Número de Tickets')
+        ax.set_title('Distribución de Tiempo de Resolución')
 
     else:  # Por defecto, tickets por estado
         estado_counts = {}
@@ -1476,33 +1956,61 @@ def generate_report():
                 estado_counts[estado] = 0
             estado_counts[estado] += 1
 
-        estados_grafico = list(estado_counts.keys())
+        estados_grafico = [str(e) for e in estado_counts.keys()]
         counts = list(estado_counts.values())
 
-        plt.bar(estados_grafico, counts, color='#47adcc', edgecolor='black')
-        plt.xlabel('Estado')
-        plt.ylabel('Número de Tickets')
-        plt.title('Distribución de Tickets por Estado')
-        plt.xticks(rotation=45, ha='right')
+        ax.bar(estados_grafico, counts, color='#47adcc', edgecolor='black')
+        ax.set_xlabel('Estado')
+        ax.set_ylabel('Número de Tickets')
+        ax.set_title('Distribución de Tickets por Estado')
+        ax.tick_params(axis='x', labelrotation=45)
+        for label in ax.get_xticklabels():
+            label.set_horizontalalignment('right')
         
         # Añadir valores en la parte superior de cada barra
         for i, v in enumerate(counts):
-            plt.text(i, v, str(v), ha='center', va='bottom')
+            ax.text(i, v, str(v), ha='center', va='bottom')
 
-    plt.tight_layout()
+    fig.tight_layout()
 
     # Guardar gráfico
     buffer = BytesIO()
-    plt.savefig(buffer, format='png')
-    buffer.seek(0)
-    plot_url = base64.b64encode(buffer.getvalue()).decode('utf-8')
-    plt.close()
+    fig.savefig(buffer, format='png')
+    return base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+@job_queue.register('report', concurrency=2)
+def run_report_job(job):
+    conn = connect_db()
+    try:
+        return {'plot_url': render_report_chart(conn, job.payload, job)}
+    finally:
+        conn.close()
+
+@app.route('/generate_report', methods=['GET', 'POST'])
+def generate_report():
+    # El gráfico se genera en la cola de trabajos; la página consulta /api/jobs/<id> hasta tenerlo
+    if request.method == 'POST':
+        options = {name: request.form.get(name, 'Todos') for name in REPORT_FILTERS}
+        options['reporte'] = request.form.get('reporte', 'estados')
+        job_id = job_queue.enqueue('report', options)
+        return redirect(url_for('generate_report', job=job_id))
+
+    db = get_db()
+    cursor = db.cursor()
+
+    # Definir estados y agentes
+    estados_query = "SELECT DISTINCT status FROM tickets ORDER BY status"
+    cursor.execute(estados_query)
+    estados = [row[0] for row in cursor.fetchall()]
+    
+    agentes_query = "SELECT DISTINCT agent FROM tickets WHERE agent IS NOT NULL AND agent != '' ORDER BY agent"
+    cursor.execute(agentes_query)
+    agentes = [row[0] for row in cursor.fetchall()]
 
     return render_template('informes.html', 
                            estados=estados,
                            agentes=agentes,
-                           tickets=tickets,
-                           plot_url=plot_url)
+                           job_id=request.args.get('job', type=int))
 
 @app.route('/edit_ticket/<int:ticket_id>', methods=['GET', 'POST'])
 def edit_ticket(ticket_id):
@@ -1622,6 +2130,7 @@ def edit_ticket(ticket_id):
                        details, priority, type_, branch, ticket_id))
             
             conn.commit()
+            response_cache.invalidate('tickets')
             flash('Ticket actualizado exitosamente.', 'success')
             print("Ticket actualizado, redirigiendo...")  # Para depuración
             
@@ -1746,6 +2255,7 @@ def delete_ticket(ticket_id):
         # Eliminamos el ticket
         cursor.execute("DELETE FROM tickets WHERE id = ?", (ticket_id,))
         db.commit()
+        response_cache.invalidate('tickets')
         
         print(f"Ticket #{ticket[1]} eliminado correctamente")
         
@@ -1999,420 +2509,408 @@ def add_server():
 
     return redirect(url_for('server_status'))  # Redirigir a la página de estado de servidores
 
-# Función para realizar ping continuo
-def continuous_ping(ip, result_queue, stop_event):
+# Configuración de ping - valores conservadores
+PING_COUNT = 3  # 3 intentos por sondeo
+PING_TIMEOUT = 2  # 2 segundos de timeout
+MONITOR_INTERVAL = 1.0  # Intervalo fijo si el sondeo falla con una excepción
+# Intervalos adaptativos por defecto (cada servidor puede sobrescribirlos)
+MONITOR_HEALTHY_INTERVAL = float(os.environ.get('MONITOR_HEALTHY_INTERVAL', '5'))  # Enlace estable
+MONITOR_DEGRADED_INTERVAL = float(os.environ.get('MONITOR_DEGRADED_INTERVAL', '1'))  # Pérdida o latencia alta
+MONITOR_MAX_BACKOFF = float(os.environ.get('MONITOR_MAX_BACKOFF', '60'))  # Tope del backoff con el enlace caído
+MAX_CONSECUTIVE_ERRORS = 3
+MAX_CONCURRENT_PROBES = int(os.environ.get('MONITOR_MAX_CONCURRENCY', '64'))
+
+# Histórico persistente de sondeos (escritura en lote desde un hilo propio)
+ping_history = PingHistoryStore(
+    os.environ.get('PING_HISTORY_DB', 'ping_history.db'),
+    sample_interval=MONITOR_DEGRADED_INTERVAL,
+    # Retención en días por resolución; vacío = valor por defecto
+    retention={
+        resolution: float(os.environ[var]) * 86400
+        for resolution, var in (
+            (PING_HISTORY_RAW, 'PING_HISTORY_RAW_DAYS'),
+            (60, 'PING_HISTORY_1M_DAYS'),
+            (3600, 'PING_HISTORY_1H_DAYS'),
+            (86400, 'PING_HISTORY_1D_DAYS')
+        )
+        if os.environ.get(var)
+    }
+)
+
+def monitor_log(ip, msg, level='INFO'):
+    timestamp = datetime.now().strftime('%H:%M:%S.%f')[:-3]
+    print(f"[{timestamp}] [{level}] [IP:{ip}] {msg}")
+
+def send_single_ping(ip, timeout=PING_TIMEOUT):
     """
-    Función mejorada para hacer ping continuo a una IP.
-    Versión con diagnóstico detallado para identificar problemas de conexión.
-    
-    Args:
-        ip (str): Dirección IP a monitorear
-        result_queue (queue.Queue): Cola para enviar resultados
-        stop_event (threading.Event): Evento para detener el monitoreo
+    Envía un solo ping usando el comando del sistema.
+    Sólo se usa cuando no se puede abrir un socket ICMP (ver icmp_engine).
     """
-    def log(msg, level='INFO'):
-        timestamp = datetime.now().strftime('%H:%M:%S.%f')[:-3]
-        print(f"[{timestamp}] [{level}] [IP:{ip}] {msg}")
-    
-    if not is_valid_ip(ip):
-        error_msg = f"IP inválida: {ip}"
-        log(error_msg, 'ERROR')
-        result_queue.put({'error': error_msg, 'ip': ip, 'status': 'error'})
-        return
-    
-    log("Iniciando monitoreo de ping mejorado", 'INFO')
-    
-    # Inicializar datos locales
-    latencies = []
-    total_pings = 0
-    successful_pings = 0
-    consecutive_errors = 0
-    MAX_CONSECUTIVE_ERRORS = 3
-    
-    # Configuración de ping - valores más conservadores
-    PING_COUNT = 3  # 3 intentos por ping
-    PING_TIMEOUT = 2  # 2 segundos de timeout
-    PING_INTERVAL = 0.2  # 200ms entre pings
-    
-    log(f"Configuración: count={PING_COUNT}, timeout={PING_TIMEOUT}s, interval={PING_INTERVAL}s", 'DEBUG')
-    
-    # Función para enviar un solo ping
-    def send_single_ping():
-        try:
-            # Construir comando según el sistema operativo
-            system = platform.system().lower()
-            if system == 'windows':
-                timeout_ms = max(1, int(float(PING_TIMEOUT) * 1000))
-                cmd = ['ping', '-n', '1', '-w', str(timeout_ms), ip]
-            else:
-                cmd = ['ping', '-c', '1', '-W', str(PING_TIMEOUT), ip]
-            log(f"Ejecutando: {' '.join(cmd)}", 'DEBUG')
-            
-            start_time = time.time()
-            result = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True,
-                timeout=PING_TIMEOUT + 1
-            )
-            
-            # Combinar stdout y stderr para un mejor análisis
-            output = result.stdout + "\n" + result.stderr
-            elapsed_ms = (time.time() - start_time) * 1000
-            
-            # Verificar si el ping fue exitoso (0) o no
-            if result.returncode == 0:
-                # Verificar si realmente recibimos respuesta (para diferentes idiomas)
-                if not (
-                    '1 received' in output or '1 packets received' in output or '1 recibidos' in output or
-                    'Received = 1' in output or 'recibidos = 1' in output
-                ):
-                    return {
-                        'success': False,
-                        'error': 'No se recibió respuesta de ping',
-                        'output': output,
-                        'latency': -1
-                    }
-                
-                # Intentar extraer el tiempo usando diferentes patrones
-                time_patterns = [
-                    r'time=([\d.,]+)\s*ms',            # Unix/Linux estándar
-                    r'time[<>=]([\d.,]+)\s*ms',       # time<X>ms
-                    r'tiempo[<>=]?\s*=\s*([\d.,]+)\s*ms',  # Windows en español
-                    r'tiempo=([\d.,]+)\s*ms',         # Variante común español
-                    r'([\d.,]+)\s*ms\s*$'            # Último número antes de ms
-                ]
-                
-                for pattern in time_patterns:
-                    match = re.search(pattern, output, re.MULTILINE)
-                    if match:
-                        latency = float(match.group(1).replace(',', '.'))
-                        log(f"Ping exitoso: {latency:.2f}ms", 'DEBUG')
-                        return {
-                            'success': True,
-                            'latency': latency,
-                            'output': output
-                        }
-                
-                # Si no se pudo extraer el tiempo pero el ping fue exitoso
-                log(f"Ping exitoso pero no se pudo extraer tiempo (usando tiempo medido): {elapsed_ms:.2f}ms", 'WARNING')
-                return {
-                    'success': True,
-                    'latency': elapsed_ms,
-                    'output': output
-                }
-            else:
-                # Manejar diferentes tipos de errores
-                if '100% packet loss' in output or '100% de pérdida' in output or 'Request timed out' in output or 'tiempo de espera agotado' in output:
-                    error_msg = "Pérdida total de paquetes"
-                elif 'Network is unreachable' in output or 'Red es inalcanzable' in output:
-                    error_msg = "Red inalcanzable"
-                elif 'Name or service not known' in output or 'Nombre o servicio no conocido' in output or 'could not find host' in output or 'no se pudo encontrar el host' in output:
-                    error_msg = "Nombre de host desconocido"
-                else:
-                    error_msg = f"Error (código: {result.returncode})"
-                
-                log(f"Error en ping: {error_msg}", 'WARNING')
+    try:
+        # Construir comando según el sistema operativo
+        system = platform.system().lower()
+        if system == 'windows':
+            timeout_ms = max(1, int(float(timeout) * 1000))
+            cmd = ['ping', '-n', '1', '-w', str(timeout_ms), ip]
+        else:
+            cmd = ['ping', '-c', '1', '-W', str(timeout), ip]
+        monitor_log(ip, f"Ejecutando: {' '.join(cmd)}", 'DEBUG')
+        
+        start_time = time.time()
+        result = subprocess.run(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            timeout=timeout + 1
+        )
+        
+        # Combinar stdout y stderr para un mejor análisis
+        output = result.stdout + "\n" + result.stderr
+        elapsed_ms = (time.time() - start_time) * 1000
+        
+        # Verificar si el ping fue exitoso (0) o no
+        if result.returncode == 0:
+            # Verificar si realmente recibimos respuesta (para diferentes idiomas)
+            if not (
+                '1 received' in output or '1 packets received' in output or '1 recibidos' in output or
+                'Received = 1' in output or 'recibidos = 1' in output
+            ):
                 return {
                     'success': False,
-                    'error': error_msg,
+                    'error': 'No se recibió respuesta de ping',
                     'output': output,
                     'latency': -1
                 }
-                
-        except subprocess.TimeoutExpired:
-            error_msg = "Tiempo de espera agotado"
-            log(error_msg, 'WARNING')
+            
+            # Intentar extraer el tiempo usando diferentes patrones
+            time_patterns = [
+                r'time=([\d.,]+)\s*ms',            # Unix/Linux estándar
+                r'time[<>=]([\d.,]+)\s*ms',       # time<X>ms
+                r'tiempo[<>=]?\s*=\s*([\d.,]+)\s*ms',  # Windows en español
+                r'tiempo=([\d.,]+)\s*ms',         # Variante común español
+                r'([\d.,]+)\s*ms\s*$'            # Último número antes de ms
+            ]
+            
+            for pattern in time_patterns:
+                match = re.search(pattern, output, re.MULTILINE)
+                if match:
+                    latency = float(match.group(1).replace(',', '.'))
+                    monitor_log(ip, f"Ping exitoso: {latency:.2f}ms", 'DEBUG')
+                    return {
+                        'success': True,
+                        'latency': latency,
+                        'output': output
+                    }
+            
+            # Si no se pudo extraer el tiempo pero el ping fue exitoso
+            monitor_log(ip, f"Ping exitoso pero no se pudo extraer tiempo (usando tiempo medido): {elapsed_ms:.2f}ms", 'WARNING')
             return {
-                'success': False,
-                'error': error_msg,
-                'latency': -1
+                'success': True,
+                'latency': elapsed_ms,
+                'output': output
             }
-        except Exception as e:
-            error_msg = f"Error inesperado: {str(e)}"
-            log(error_msg, 'ERROR')
+        else:
+            # Manejar diferentes tipos de errores
+            if '100% packet loss' in output or '100% de pérdida' in output or 'Request timed out' in output or 'tiempo de espera agotado' in output:
+                error_msg = "Pérdida total de paquetes"
+            elif 'Network is unreachable' in output or 'Red es inalcanzable' in output:
+                error_msg = "Red inalcanzable"
+            elif 'Name or service not known' in output or 'Nombre o servicio no conocido' in output or 'could not find host' in output or 'no se pudo encontrar el host' in output:
+                error_msg = "Nombre de host desconocido"
+            else:
+                error_msg = f"Error (código: {result.returncode})"
+            
+            monitor_log(ip, f"Error en ping: {error_msg}", 'WARNING')
             return {
                 'success': False,
                 'error': error_msg,
+                'output': output,
                 'latency': -1
             }
-            error_msg = result.stderr if result.stderr else result.stdout
-            log(f"Error en ping: {error_msg.strip()}", 'WARNING')
-            return {'success': False, 'error': error_msg.strip()}
-            
-        except subprocess.TimeoutExpired:
-            log("Timeout al ejecutar ping", 'WARNING')
-            return {'success': False, 'error': 'timeout'}
-        except Exception as e:
-            log(f"Error inesperado al ejecutar ping: {str(e)}", 'ERROR')
-            return {'success': False, 'error': str(e)}
-    
-    start_time = time.time()
-    
-    try:
-        while not stop_event.is_set():
-            iteration_start = time.time()
-            successful_attempts = 0
-            attempt_latencies = []
-            
-            # Verificar si debemos detenernos
-            if stop_event.is_set():
-                log("Señal de detección recibida, finalizando monitoreo...", 'INFO')
-                break
-            
-            # Realizar múltiples intentos de ping
-            last_error = None
-            for attempt in range(PING_COUNT):
-                try:
-                    result = send_single_ping()
-                    
-                    if result.get('success', False):
-                        successful_attempts += 1
-                        attempt_latencies.append(result['latency'])
-                    else:
-                        # Guardar el último error para mostrarlo si todos los intentos fallan
-                        last_error = result.get('error', 'Error desconocido')
-                    
-                    # Pequeña pausa entre intentos
-                    if attempt < PING_COUNT - 1:
-                        time.sleep(0.1)
-                        
-                except Exception as e:
-                    error_msg = str(e)
-                    log(f"Error en intento de ping: {error_msg}", 'WARNING')
-                    last_error = error_msg
-                    continue
-            
-            total_pings += 1
-            
-            # Inicializar variables
-            latency = 0
-            status = 'unknown'
-            
-            # Procesar resultados de los intentos
-            if successful_attempts > 0:
-                # Calcular latencia promedio de los intentos exitosos
-                avg_latency = sum(attempt_latencies) / len(attempt_latencies)
-                latency = min(avg_latency, 1000)  # Limitar a 1000ms
-                successful_pings += 1
-                consecutive_errors = 0
-                status = 'success'
-                
-                # Agregar a las latencias recientes (máximo 60 muestras)
-                latencies.append(latency)
-                if len(latencies) > 60:
-                    latencies.pop(0)
-                
-                log(f"Ping exitoso: {latency:.2f}ms (de {successful_attempts}/{PING_COUNT} intentos)", 'DEBUG')
-            else:
-                # Todos los intentos fallaron
-                latency = -1
-                consecutive_errors += 1
-                status = 'error'
-                error_msg = last_error if last_error else 'Error desconocido en todos los intentos'
-                log(f"Fallo en ping: {error_msg}", 'WARNING')
-                
-                # Si hay demasiados errores consecutivos, reiniciar contadores
-                if consecutive_errors >= MAX_CONSECUTIVE_ERRORS:
-                    log(f"Demasiados errores consecutivos ({consecutive_errors}), reiniciando contadores...", 'WARNING')
-                    successful_pings = 0
-                    total_pings = 0
-                    latencies = []
-                    consecutive_errors = 0
-            
-            # Calcular la pérdida de paquetes
-            failed_pings = total_pings - successful_pings
-            packet_loss = (failed_pings / total_pings * 100) if total_pings > 0 else 0.0
-            
-            # Asegurarse de que los contadores no sean negativos
-            successful_pings = max(0, successful_pings)
-            failed_pings = max(0, failed_pings)
-            total_pings = max(1, successful_pings + failed_pings)  # Asegurar que total_pings sea al menos 1
-            
-            # Asegurar que la pérdida de paquetes esté entre 0 y 100
-            packet_loss = max(0, min(100, packet_loss))
             
-            # Preparar datos para la caché
-            result_data = {
-                'ip': ip,
-                'latency': latency if latency > 0 else 0,  # Usar 0 como valor de error
-                'current_latency': latency if latency > 0 else 0,  # Usar 0 como valor de error
-                'packet_loss': min(100, max(0, packet_loss)),  # Asegurar entre 0 y 100
-                'successful_pings': successful_pings,
-                'failed_pings': consecutive_errors,  # Usar el contador de errores consecutivos
-                'total_pings': total_pings,
-                'status': status,
-                'timestamp': time.time(),
-                'latencies': latencies.copy(),
-                'stats': {
-                    'min': min(latencies) if latencies else 0,
-                    'max': max(latencies) if latencies else 0,
-                    'avg': sum(latencies) / len(latencies) if latencies else 0,
-                    'loss': max(0, min(100, packet_loss))  # Asegurar entre 0 y 100
-                },
-                'success': successful_attempts > 0,
-                'consecutive_errors': consecutive_errors,
-                'last_update': datetime.now().isoformat()
-            }
-            
-            # Agregar mensaje de error si corresponde
-            if status == 'error':
-                result_data['error'] = error_msg
-            
-            # Actualizar la caché de manera incremental
-            with ping_cache.lock:
-                if ip not in ping_cache.data:
-                    ping_cache.data[ip] = {}
-                
-                # Obtener datos existentes o inicializar si no existen
-                existing_data = ping_cache.data[ip]
-                
-                # Actualizar solo los campos necesarios
-                existing_data.update({
-                    'ip': ip,
-                    'latency': result_data.get('latency', existing_data.get('latency', 0)),
-                    'current_latency': result_data.get('current_latency', existing_data.get('current_latency', 0)),
-                    'status': result_data.get('status', existing_data.get('status', 'unknown')),
-                    'timestamp': result_data.get('timestamp', existing_data.get('timestamp', time.time())),
-                    'error': result_data.get('error', existing_data.get('error', None)),
-                    'success': result_data.get('success', existing_data.get('success', False)),
-                    'consecutive_errors': result_data.get('consecutive_errors', existing_data.get('consecutive_errors', 0))
-                })
-                
-                # Manejar los contadores de manera incremental
-                existing_data['successful_pings'] = existing_data.get('successful_pings', 0) + (1 if result_data.get('success', False) else 0)
-                existing_data['failed_pings'] = existing_data.get('failed_pings', 0) + (0 if result_data.get('success', False) else 1)
-                existing_data['total_pings'] = existing_data.get('successful_pings', 0) + existing_data.get('failed_pings', 0)
-                
-                # Calcular la pérdida de paquetes basada en los contadores incrementales
-                if existing_data['total_pings'] > 0:
-                    existing_data['packet_loss'] = (existing_data['failed_pings'] / existing_data['total_pings']) * 100
-                else:
-                    existing_data['packet_loss'] = 0
-                
-                # Manejar las latencias
-                if 'latencies' not in existing_data:
-                    existing_data['latencies'] = []
-                
-                # Agregar la nueva latencia si es válida
-                if result_data.get('latency', 0) > 0:
-                    existing_data['latencies'].append(result_data['latency'])
-                    # Mantener un máximo de 60 muestras
-                    if len(existing_data['latencies']) > 60:
-                        existing_data['latencies'].pop(0)
-                
-                # Actualizar estadísticas
-                if 'stats' not in existing_data:
-                    existing_data['stats'] = {}
-                
-                # Calcular estadísticas de latencia
-                if existing_data['latencies']:
-                    existing_data['stats'].update({
-                        'min': min(existing_data['latencies']),
-                        'max': max(existing_data['latencies']),
-                        'avg': sum(existing_data['latencies']) / len(existing_data['latencies']),
-                        'loss': existing_data['packet_loss']
-                    })
-                else:
-                    existing_data['stats'].update({
-                        'min': 0,
-                        'max': 0,
-                        'avg': 0,
-                        'loss': existing_data['packet_loss']
-                    })
-            
-            # Enviar a la cola de resultados
-            try:
-                result_queue.put(result_data, timeout=1)
-            except queue.Full:
-                log("Cola de resultados llena, descartando datos", 'WARNING')
-            
-            # Calcular tiempo de espera hasta la próxima iteración
-            elapsed = time.time() - iteration_start
-            sleep_time = max(0, PING_INTERVAL - elapsed)
-            
-            # Usar wait con timeout para poder detectar la señal de stop
-            if sleep_time > 0:
-                stop_event.wait(timeout=sleep_time)
-                if stop_event.is_set():
-                    log("Señal de detección recibida durante la espera, finalizando...", 'INFO')
-                    break
-                
-            # Esperar 1 segundo entre pings
-            elapsed_since_start = time.time() - iteration_start
-            if elapsed_since_start < 1.0:
-                remaining = 1.0 - elapsed_since_start
-                stop_event.wait(timeout=remaining)
-                if stop_event.is_set():
-                    log("Señal de detección recibida durante la espera, finalizando...", 'INFO')
-                    break
-                
     except subprocess.TimeoutExpired:
-        # Timeout del comando
-        total_pings += 1
-        current_loss = 100 - ((successful_pings / total_pings) * 100) if total_pings > 0 else 100
-        
-        result_data = {
-            'latency': -1,
-            'status': 'timeout',
-            'timestamp': datetime.now().isoformat(),
-            'packet_loss': current_loss,
-            'total_pings': total_pings,
-            'successful_pings': successful_pings,
-            'stats': {
-                'min': min(latencies) if latencies else 0,
-                'max': max(latencies) if latencies else 0,
-                'avg': sum(latencies)/len(latencies) if latencies else 0,
-                'packet_loss': current_loss
-            }
+        error_msg = "Tiempo de espera agotado"
+        monitor_log(ip, error_msg, 'WARNING')
+        return {
+            'success': False,
+            'error': error_msg,
+            'latency': -1
         }
+    except Exception as e:
+        error_msg = f"Error inesperado: {str(e)}"
+        monitor_log(ip, error_msg, 'ERROR')
+        return {
+            'success': False,
+            'error': error_msg,
+            'latency': -1
+        }
+
+async def probe_ip(ip):
+    """
+    Realiza los PING_COUNT intentos de un sondeo y devuelve la lista de resultados.
+    Con el motor ICMP los intentos salen en paralelo sobre el socket compartido;
+    sin él, el comando ping se ejecuta en el pool de hilos del loop.
+    """
+    icmp_engine = get_icmp_engine()
+    if icmp_engine is not None:
+        return await asyncio.gather(*[icmp_engine.ping_async(ip, PING_TIMEOUT) for _ in range(PING_COUNT)])
+    
+    loop = asyncio.get_running_loop()
+    attempts = []
+    for attempt in range(PING_COUNT):
+        attempts.append(await loop.run_in_executor(None, send_single_ping, ip))
+        # Pequeña pausa entre intentos
+        if attempt < PING_COUNT - 1:
+            await asyncio.sleep(0.1)
+    return attempts
+
+def record_ping_round(ip, state, attempts):
+    """
+    Procesa los intentos de un sondeo, actualiza la caché y devuelve el resultado.
+    
+    Args:
+        ip (str): Dirección IP monitoreada
+        state (dict): Contadores propios de la IP, persistentes entre sondeos
+        attempts (list): Resultados de cada intento de ping
+
+    Las latencias viven sólo en el buffer circular de la entrada de la caché.
+    """
+    reset_window = False
+    state.setdefault('total_pings', 0)
+    state.setdefault('successful_pings', 0)
+    state.setdefault('consecutive_errors', 0)
+    
+    successful_attempts = 0
+    attempt_latencies = []
+    last_error = None
+    for result in attempts:
+        if result.get('success', False):
+            successful_attempts += 1
+            attempt_latencies.append(result['latency'])
+        else:
+            # Guardar el último error para mostrarlo si todos los intentos fallan
+            last_error = result.get('error', 'Error desconocido')
+    
+    state['total_pings'] += 1
+    
+    # Procesar resultados de los intentos
+    if successful_attempts > 0:
+        # Calcular latencia promedio de los intentos exitosos
+        avg_latency = sum(attempt_latencies) / len(attempt_latencies)
+        latency = min(avg_latency, 1000)  # Limitar a 1000ms
+        state['successful_pings'] += 1
+        state['consecutive_errors'] = 0
+        status = 'success'
+        
+        monitor_log(ip, f"Ping exitoso: {latency:.2f}ms (de {successful_attempts}/{PING_COUNT} intentos)", 'DEBUG')
+    else:
+        # Todos los intentos fallaron
+        latency = -1
+        state['consecutive_errors'] += 1
+        status = 'error'
+        error_msg = last_error if last_error else 'Error desconocido en todos los intentos'
+        monitor_log(ip, f"Fallo en ping: {error_msg}", 'WARNING')
+        
+        # Si hay demasiados errores consecutivos, reiniciar contadores
+        if state['consecutive_errors'] >= MAX_CONSECUTIVE_ERRORS:
+            monitor_log(ip, f"Demasiados errores consecutivos ({state['consecutive_errors']}), reiniciando contadores...", 'WARNING')
+            state['successful_pings'] = 0
+            state['total_pings'] = 0
+            reset_window = True
+            state['consecutive_errors'] = 0
+    
+    successful_pings = state['successful_pings']
+    consecutive_errors = state['consecutive_errors']
+    
+    # Calcular la pérdida de paquetes
+    failed_pings = state['total_pings'] - successful_pings
+    packet_loss = (failed_pings / state['total_pings'] * 100) if state['total_pings'] > 0 else 0.0
+    
+    # Asegurarse de que los contadores no sean negativos
+    failed_pings = max(0, failed_pings)
+    total_pings = max(1, successful_pings + failed_pings)  # Asegurar que total_pings sea al menos 1
+    
+    # Asegurar que la pérdida de paquetes esté entre 0 y 100
+    packet_loss = max(0, min(100, packet_loss))
+    
+    # Preparar datos para la caché
+    result_data = {
+        'ip': ip,
+        'latency': latency if latency > 0 else 0,  # Usar 0 como valor de error
+        'current_latency': latency if latency > 0 else 0,  # Usar 0 como valor de error
+        'packet_loss': packet_loss,
+        'successful_pings': successful_pings,
+        'failed_pings': consecutive_errors,  # Usar el contador de errores consecutivos
+        'total_pings': total_pings,
+        'status': status,
+        'timestamp': time.time(),
+        'success': successful_attempts > 0,
+        'consecutive_errors': consecutive_errors,
+        'last_update': datetime.now().isoformat()
+    }
+    
+    # Agregar mensaje de error si corresponde
+    if status == 'error':
+        result_data['error'] = error_msg
+    
+    # Guardar el sondeo en el histórico (sólo se encola, no bloquea el loop)
+    ping_history.record(
+        ip,
+        latency if successful_attempts > 0 else None,
+        len(attempts),
+        successful_attempts,
+        error_msg if status == 'error' else None,
+        ts=result_data['timestamp']
+    )
+    
+    # Actualizar la caché de manera incremental: sólo se bloquea la franja de esta IP
+    # y al salir se publica el snapshot que leen los endpoints HTTP
+    with ping_cache.mutate(ip) as existing_data:
+        # Actualizar solo los campos necesarios
+        existing_data.update({
+            'ip': ip,
+            'latency': result_data.get('latency', existing_data.get('latency', 0)),
+            'current_latency': result_data.get('current_latency', existing_data.get('current_latency', 0)),
+            'status': result_data.get('status', existing_data.get('status', 'unknown')),
+            'timestamp': result_data.get('timestamp', existing_data.get('timestamp', time.time())),
+            'error': result_data.get('error', existing_data.get('error', None)),
+            'success': result_data.get('success', existing_data.get('success', False)),
+            'consecutive_errors': result_data.get('consecutive_errors', existing_data.get('consecutive_errors', 0))
+        })
         
-        # Actualizar la caché
-        with ping_cache.lock:
-            if ip not in ping_cache.data:
-                ping_cache.data[ip] = {}
-            ping_cache.data[ip] = result_data
-        
-        result_queue.put(result_data)
+        # Manejar los contadores de manera incremental
+        existing_data['successful_pings'] = existing_data.get('successful_pings', 0) + (1 if result_data.get('success', False) else 0)
+        existing_data['failed_pings'] = existing_data.get('failed_pings', 0) + (0 if result_data.get('success', False) else 1)
+        existing_data['total_pings'] = existing_data.get('successful_pings', 0) + existing_data.get('failed_pings', 0)
         
-        # Pequeña pausa antes de continuar
-        stop_event.wait(timeout=1.0)
+        # Calcular la pérdida de paquetes basada en los contadores incrementales
+        if existing_data['total_pings'] > 0:
+            existing_data['packet_loss'] = (existing_data['failed_pings'] / existing_data['total_pings']) * 100
+        else:
+            existing_data['packet_loss'] = 0
+        
+        # Manejar las latencias
+        if not isinstance(existing_data.get('latencies'), LatencyRing):
+            existing_data['latencies'] = LatencyRing(LATENCY_WINDOW)
+        ring = existing_data['latencies']
+        if reset_window:
+            ring.clear()
+        
+        # Agregar la nueva latencia si es válida (el buffer descarta la más antigua)
+        if result_data.get('latency', 0) > 0:
+            ring.append(result_data['latency'])
+        result_data['stats'] = {
+            'min': ring.min or 0,
+            'max': ring.max or 0,
+            'avg': ring.avg or 0,
+            'loss': packet_loss
+        }
         
-    except Exception as e:
-        if not stop_event.is_set():  # Solo registrar errores si no estamos deteniendo el monitoreo
-            print(f"[continuous_ping] Error inesperado: {e}")
-            result_queue.put({
-                'error': str(e),
-                'status': 'error',
-                'ip': ip,
-                'timestamp': datetime.now().isoformat(),
-                'packet_loss': 100
+        # Actualizar estadísticas
+        if 'stats' not in existing_data:
+            existing_data['stats'] = {}
+        
+        # Estadísticas de latencia en O(1), sin recorrer el historial
+        if ring:
+            existing_data['stats'].update({
+                'min': ring.min,
+                'max': ring.max,
+                'avg': ring.avg,
+                'loss': existing_data['packet_loss']
             })
-    finally:
-        # Limpiar recursos
-        log("Limpiando recursos del monitoreo...", 'DEBUG')
-        
-        # Asegurarse de que la caché esté limpia
-        with ping_cache.lock:
-            if ip in ping_cache.data:
-                del ping_cache.data[ip]
-        
-        # Limpiar referencias
-        if ip in monitoring_threads:
-            try:
-                del monitoring_threads[ip]
-            except KeyError:
-                pass
-                
-        if ip in monitoring_events:
-            try:
-                del monitoring_events[ip]
-            except KeyError:
-                pass
-                
-        log(f"Monitoreo finalizado para {ip}", 'INFO')
-        time.sleep(5)  # Esperar 5 segundos en caso de error
+        else:
+            existing_data['stats'].update({
+                'min': 0,
+                'max': 0,
+                'avg': 0,
+                'loss': existing_data['packet_loss']
+            })
+    
+    return result_data
+
+def on_monitor_stop(ip):
+    """Limpia la caché cuando se deja de monitorear una IP."""
+    ping_cache.remove(ip)
+    monitor_log(ip, f"Monitoreo finalizado para {ip}", 'INFO')
+
+# Planificador único: una corrutina por IP en un solo event loop, en lugar de un hilo por IP
+monitor_scheduler = MonitorScheduler(
+    probe=probe_ip,
+    on_result=record_ping_round,
+    on_stop=on_monitor_stop,
+    max_concurrency=MAX_CONCURRENT_PROBES
+)
+
+def get_monitor_policy(ip, server=None):
+    """
+    Política de sondeo adaptativo para una IP: usa los intervalos configurados
+    en el servidor que tiene esa IP (si los hay) y los globales para el resto.
+    """
+    if server is None:
+        conn = connect_db()
+        try:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute(
+                f"SELECT {', '.join(SERVER_MONITOR_COLUMNS)} FROM servers "
+                "WHERE primary_service_ip = ? OR secondary_service_ip = ? LIMIT 1",
+                (ip, ip)
+            ).fetchone()
+            server = dict(row) if row else {}
+        except sqlite3.Error:
+            # Base sin las columnas de monitoreo: usar los valores globales
+            server = {}
+        finally:
+            conn.close()
+    
+    def setting(column, default):
+        value = server.get(column)
+        return float(value) if value not in (None, '') else default
+    
+    return AdaptivePolicy(
+        healthy_interval=setting('monitor_healthy_interval', MONITOR_HEALTHY_INTERVAL),
+        degraded_interval=setting('monitor_degraded_interval', MONITOR_DEGRADED_INTERVAL),
+        max_backoff=setting('monitor_max_backoff', MONITOR_MAX_BACKOFF)
+    )
+
+def refresh_monitor_policies(server):
+    """Aplica la configuración de un servidor a sus IPs que se estén monitoreando."""
+    policy = get_monitor_policy(None, server)
+    for key in ('primary_service_ip', 'secondary_service_ip'):
+        ip = server.get(key)
+        if ip and ip in monitor_scheduler:
+            monitor_scheduler.set_policy(ip, policy)
+
+def begin_monitoring(ip):
+    """Inicializa la caché de una IP y la agrega al planificador (reinicia si ya estaba)."""
+    if ip in monitor_scheduler:
+        monitor_scheduler.stop(ip)
+    
+    # Inicializar los datos con valores por defecto
+    ping_cache.reset(ip, {
+        'ip': ip,
+        'latency': 0,
+        'current_latency': 0,
+        'packet_loss': 0,
+        'successful_pings': 0,
+        'failed_pings': 0,
+        'total_pings': 0,
+        'status': 'unknown',
+        'timestamp': time.time(),
+        'latencies': LatencyRing(LATENCY_WINDOW),
+        'stats': {
+            'min': 0,
+            'max': 0,
+            'avg': 0,
+            'loss': 0,
+            'packet_loss': 0
+        },
+        'success': False,
+        'consecutive_errors': 0,
+        'last_update': datetime.now().isoformat()
+    })
+    
+    monitor_scheduler.start(ip, interval=MONITOR_INTERVAL, policy=get_monitor_policy(ip))
 
 # Ruta para iniciar el monitoreo
 @app.route('/start_monitor/<ip>', methods=['GET'])
@@ -2430,88 +2928,14 @@ def start_monitor(ip):
             log(error_msg, 'ERROR')
             return jsonify({"error": error_msg}), 400
         
-        # Inicializar la caché si no existe
-        if not hasattr(ping_cache, 'data'):
-            log("Inicializando caché de ping", 'DEBUG')
-            ping_cache.data = {}
-        
-        # Inicializar los datos para esta IP
-        with ping_cache.lock:
-            # Limpiar cualquier dato anterior para esta IP
-            if ip in ping_cache.data:
-                log(f"Limpiando caché anterior para IP: {ip}", 'DEBUG')
-                del ping_cache.data[ip]
-            
-            # Inicializar los datos con valores por defecto
-            ping_cache.data[ip] = {
-                'ip': ip,
-                'latency': 0,
-                'current_latency': 0,
-                'packet_loss': 0,
-                'successful_pings': 0,
-                'failed_pings': 0,
-                'total_pings': 0,
-                'status': 'unknown',
-                'timestamp': time.time(),
-                'latencies': [],
-                'stats': {
-                    'min': 0,
-                    'max': 0,
-                    'avg': 0,
-                    'loss': 0,
-                    'packet_loss': 0
-                },
-                'success': False,
-                'consecutive_errors': 0,
-                'last_update': datetime.now().isoformat()
-            }
-            log(f"Datos inicializados para IP: {ip}", 'DEBUG')
-        
-        # Crear una cola para los resultados
-        result_queue = queue.Queue()
-        
-        # Crear un evento para detener el monitoreo
-        stop_event = threading.Event()
-        monitoring_events[ip] = stop_event
-        
-        # Iniciar el monitoreo en un hilo separado
-        monitor_thread = threading.Thread(
-            target=continuous_ping, 
-            args=(ip, result_queue, stop_event),
-            daemon=True,  # El hilo se cerrará cuando el programa principal termine
-            name=f"PingMonitor-{ip}"
-        )
-        
-        # Registrar el hilo
-        monitoring_threads[ip] = monitor_thread
-        monitor_thread.start()
-        log(f"Hilo de monitoreo iniciado: {monitor_thread.name}", 'DEBUG')
+        # Inicializar los datos y agregar la IP al planificador de monitoreo
+        begin_monitoring(ip)
+        log(f"IP agregada al planificador ({len(monitor_scheduler)} objetivos activos)", 'DEBUG')
         
         # Esperar el primer resultado para asegurarnos de que el ping está funcionando
-        try:
-            log("Esperando primer resultado...", 'DEBUG')
-            first_result = result_queue.get(timeout=10)  # Esperar máximo 10 segundos
-            log(f"Primer resultado recibido: {first_result}", 'DEBUG')
-            
-            # Inicializar la caché con los datos iniciales
-            with ping_cache.lock:
-                if ip not in ping_cache.data:
-                    ping_cache._initialize_ip_data(ip)
-                
-                # Actualizar con los datos del primer resultado
-                if 'latency' in first_result:
-                    latency = first_result['latency'] if first_result['latency'] > 0 else -1
-                    packet_loss = first_result.get('packet_loss', 100)
-                    ping_cache.update(ip, latency, packet_loss)
-                    log(f"Caché actualizada con latencia: {latency}ms, pérdida: {packet_loss}%", 'DEBUG')
-            
-            # Si hay un error, lo registramos pero no detenemos el monitoreo
-            if 'error' in first_result or first_result.get('latency', -1) <= 0:
-                error_msg = first_result.get('error', 'No se pudo conectar al servidor')
-                log(f"Advertencia en el primer ping: {error_msg}", 'WARNING')
-                log("Continuando con el monitoreo...", 'INFO')
-                
-        except queue.Empty:
+        log("Esperando primer resultado...", 'DEBUG')
+        first_result = monitor_scheduler.wait_first_result(ip, timeout=10)  # Esperar máximo 10 segundos
+        if first_result is None:
             error_msg = f"No se recibió respuesta del ping para {ip} en 10 segundos"
             log(error_msg, 'ERROR')
             return jsonify({
@@ -2519,6 +2943,14 @@ def start_monitor(ip):
                 "message": error_msg,
                 "timestamp": datetime.now().isoformat()
             }), 504
+        # record_ping_round ya guardó este resultado en la caché
+        log(f"Primer resultado recibido: {first_result}", 'DEBUG')
+        
+        # Si hay un error, lo registramos pero no detenemos el monitoreo
+        if 'error' in first_result or first_result.get('latency', -1) <= 0:
+            error_msg = first_result.get('error', 'No se pudo conectar al servidor')
+            log(f"Advertencia en el primer ping: {error_msg}", 'WARNING')
+            log("Continuando con el monitoreo...", 'INFO')
         
         log("Monitoreo iniciado exitosamente", 'INFO')
         return jsonify({
@@ -2537,7 +2969,104 @@ def start_monitor(ip):
             "message": error_msg,
             "timestamp": datetime.now().isoformat()
         }), 500
-        return jsonify({"error": error_msg}), 500
+
+def build_ping_data(ip, ip_data):
+    """
+    Arma la respuesta de datos de ping de una IP a partir de su snapshot de la caché.
+    Las estadísticas de la ventana ya vienen calculadas por el buffer circular.
+    """
+    # Si no hay datos, devolver respuesta vacía
+    if not ip_data:
+        return {
+            'success': False,
+            'error': 'No hay datos disponibles',
+            'valid': False,
+            'latencies': [],
+            'loss': 100,
+            'current_latency': -1,
+            'status': 'offline',
+            'stats': {
+                'total_pings': 0,
+                'successful_pings': 0,
+                'failed_pings': 0,
+                'packet_loss': 100,
+                'min_latency': 0,
+                'max_latency': 0,
+                'avg_latency': 0,
+                'last_update': datetime.now().isoformat()
+            }
+        }
+    
+    # La lista no viaja en el snapshot: se arma una vez por versión al responder
+    ip_data = ping_cache.expand(ip, ip_data)
+    ring_stats = ip_data.get('window_stats', {'count': 0})
+    latencies = list(ip_data['latencies'])
+    
+    # Obtener datos básicos directamente del último resultado
+    current_latency = ip_data.get('current_latency', -1)
+    status = ip_data.get('status', 'unknown')
+    packet_loss = ip_data.get('packet_loss', 100)
+    
+    # El buffer sólo guarda latencias válidas (> 0)
+    valid_latencies = ring_stats['count'] > 0
+    
+    # Estadísticas de latencia
+    if valid_latencies:
+        # Redondear valores para mejor presentación
+        min_latency = round(ring_stats['min'], 2)
+        max_latency = round(ring_stats['max'], 2)
+        avg_latency = round(ring_stats['avg'], 2)
+    else:
+        min_latency = 0
+        max_latency = 0
+        avg_latency = 0
+    
+    # Obtener contadores de pings
+    total_pings = ip_data.get('total_pings', 0)
+    successful_pings = ip_data.get('successful_pings', 0)
+    failed_pings = max(0, total_pings - successful_pings)
+    
+    # Asegurarse de que la pérdida de paquetes esté en un rango válido
+    packet_loss = max(0, min(100, packet_loss))
+    
+    # Si no hay latencias válidas, forzar la pérdida de paquetes al 100%
+    if not valid_latencies and total_pings > 0:
+        packet_loss = 100
+    
+    # Si nunca tuvimos éxito, forzar un valor de latencia alto
+    if not valid_latencies and status != 'success':
+        latencies = [1000] * min(total_pings, 10)  # Máximo 10 muestras de fallo
+        min_latency = max_latency = avg_latency = 1000
+    
+    return {
+        'success': True,
+        'ip': ip,
+        'version': ip_data.get('version', 0),
+        'latency': current_latency if current_latency > 0 else -1,
+        'current_latency': current_latency if current_latency > 0 else -1,
+        'status': status,
+        'latencies': latencies[-100:],  # Últimas 100 muestras
+        'loss': packet_loss,
+        'total_pings': total_pings,
+        'successful_pings': successful_pings,
+        'failed_pings': failed_pings,
+        'valid': True,
+        'timestamp': ip_data.get('timestamp', datetime.now().isoformat()),
+        'stats': {
+            'min': min_latency,
+            'max': max_latency,
+            'avg': avg_latency,
+            'packet_loss': packet_loss,
+            'total_pings': total_pings,
+            'successful_pings': successful_pings,
+            'failed_pings': failed_pings,
+            'min_latency': min_latency if min_latency > 0 else None,
+            'max_latency': max_latency if max_latency > 0 else None,
+            'avg_latency': avg_latency if avg_latency > 0 else None,
+            'last_update': ip_data.get('timestamp'),
+            'consecutive_errors': ip_data.get('stats', {}).get('consecutive_errors', 0)
+        }
+    }
 
 @app.route('/get_ping_data/<ip>', methods=['GET'])
 def get_ping_data(ip):
@@ -2546,112 +3075,20 @@ def get_ping_data(ip):
     Versión mejorada con cálculos más precisos.
     """
     try:
-        print(f"[get_ping_data] Solicitando datos para IP: {ip}")
+        # Leer el último snapshot publicado (sin lock)
+        ip_data = ping_cache.get(ip) or {}
         
-        # Obtener datos de la caché
-        with ping_cache.lock:
-            ip_data = ping_cache.data.get(ip, {})
+        # Si el cliente ya tiene esta versión de la IP, no recalcular ni reenviar nada
+        etag = str(ip_data.get('version', 0))
+        if ip_data and request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
         
-        print(f"[get_ping_data] Datos obtenidos de la caché: {ip_data}")
-        
-        # Si no hay datos, devolver respuesta vacía
-        if not ip_data:
-            print(f"[get_ping_data] No hay datos para IP: {ip}")
-            return jsonify({
-                'success': False,
-                'error': 'No hay datos disponibles',
-                'valid': False,
-                'latencies': [],
-                'loss': 100,
-                'current_latency': -1,
-                'status': 'offline',
-                'stats': {
-                    'total_pings': 0,
-                    'successful_pings': 0,
-                    'failed_pings': 0,
-                    'packet_loss': 100,
-                    'min_latency': 0,
-                    'max_latency': 0,
-                    'avg_latency': 0,
-                    'last_update': datetime.now().isoformat()
-                }
-            })
-        
-        # Obtener datos básicos directamente del último resultado
-        current_latency = ip_data.get('current_latency', -1)
-        status = ip_data.get('status', 'unknown')
-        packet_loss = ip_data.get('packet_loss', 100)
-        
-        # Obtener estadísticas de latencia
-        latencies = ip_data.get('latencies', [])
-        valid_latencies = [l for l in latencies if l > 0]
-        
-        # Calcular estadísticas
-        if valid_latencies:
-            min_latency = min(valid_latencies)
-            max_latency = max(valid_latencies)
-            avg_latency = sum(valid_latencies) / len(valid_latencies)
-            
-            # Redondear valores para mejor presentación
-            min_latency = round(min_latency, 2)
-            max_latency = round(max_latency, 2)
-            avg_latency = round(avg_latency, 2)
-        else:
-            min_latency = 0
-            max_latency = 0
-            avg_latency = 0
-        
-        # Obtener contadores de pings
-        total_pings = ip_data.get('total_pings', 0)
-        successful_pings = ip_data.get('successful_pings', 0)
-        failed_pings = max(0, total_pings - successful_pings)
-        
-        # Asegurarse de que la pérdida de paquetes esté en un rango válido
-        packet_loss = max(0, min(100, packet_loss))
-        
-        # Si no hay latencias válidas, forzar la pérdida de paquetes al 100%
-        if not valid_latencies and total_pings > 0:
-            packet_loss = 100
-        else:
-            min_latency = max_latency = avg_latency = 0
-        
-        # Si nunca tuvimos éxito, forzar un valor de latencia alto
-        if not valid_latencies and status != 'success':
-            latencies = [1000] * min(total_pings, 10)  # Máximo 10 muestras de fallo
-            min_latency = max_latency = avg_latency = 1000
-        
-        # Preparar la respuesta
-        response = {
-            'success': True,
-            'ip': ip,
-            'latency': current_latency if current_latency > 0 else -1,
-            'current_latency': current_latency if current_latency > 0 else -1,
-            'status': status,
-            'latencies': latencies[-100:],  # Últimas 100 muestras
-            'loss': packet_loss,
-            'total_pings': total_pings,
-            'successful_pings': successful_pings,
-            'failed_pings': failed_pings,
-            'valid': True,
-            'timestamp': ip_data.get('timestamp', datetime.now().isoformat()),
-            'stats': {
-                'min': min_latency,
-                'max': max_latency,
-                'avg': avg_latency,
-                'packet_loss': packet_loss,
-                'total_pings': total_pings,
-                'successful_pings': successful_pings,
-                'failed_pings': failed_pings,
-                'min_latency': min_latency if min_latency > 0 else None,
-                'max_latency': max_latency if max_latency > 0 else None,
-                'avg_latency': avg_latency if avg_latency > 0 else None,
-                'last_update': ip_data.get('timestamp'),
-                'consecutive_errors': ip_data.get('stats', {}).get('consecutive_errors', 0)
-            }
-        }
-        
-        print(f"[get_ping_data] Enviando respuesta para {ip}")
-        return jsonify(response)
+        response = jsonify(build_ping_data(ip, ip_data))
+        if ip_data:
+            response.set_etag(etag)
+        return response
         
     except Exception as e:
         error_msg = f"Error en get_ping_data para {ip}: {str(e)}"
@@ -2676,6 +3113,98 @@ def get_ping_data(ip):
             }
         }), 500
 
+@app.route('/api/ping_data', methods=['GET', 'POST'])
+def api_ping_data():
+    """
+    Datos de ping de varias IPs en una sola respuesta.
+    
+    GET: ?ips=10.0.0.1,10.0.0.2
+    POST: {"ips": [...], "versions": {"10.0.0.1": 42}}
+    
+    Devuelve {ip: datos} con la misma estructura que /get_ping_data/<ip>. Las
+    IPs cuya versión coincide con la enviada en `versions` se devuelven como
+    {"unchanged": true, "version": n} sin recalcular nada.
+    """
+    try:
+        if request.method == 'POST':
+            payload = request.get_json(silent=True) or {}
+            ips = payload.get('ips') or []
+            versions = payload.get('versions') or {}
+        else:
+            ips = [ip.strip() for ip in request.args.get('ips', '').split(',') if ip.strip()]
+            versions = {}
+        
+        if not isinstance(ips, list) or not isinstance(versions, dict):
+            return jsonify({'error': 'Formato de solicitud inválido'}), 400
+        
+        # Una sola lectura de todos los snapshots publicados
+        snapshot = ping_cache.snapshot()
+        result = {}
+        for ip in dict.fromkeys(ips):
+            ip_data = snapshot.get(ip) or {}
+            version = ip_data.get('version', 0)
+            if ip_data and versions.get(ip) == version:
+                result[ip] = {'unchanged': True, 'version': version}
+            else:
+                result[ip] = build_ping_data(ip, ip_data)
+        return jsonify(result)
+        
+    except Exception as e:
+        print(f"Error en api_ping_data: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def parse_time_arg(value):
+    """Convierte un parámetro de tiempo (epoch o fecha ISO) a epoch. None si no se indicó."""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+@app.route('/api/ping_history/<ip>', methods=['GET'])
+def api_ping_history(ip):
+    """
+    Histórico de sondeos de una IP.
+    
+    Parámetros: from / to (epoch o fecha ISO, por defecto la última hora),
+    resolution (raw, 60, 3600, 86400 o auto), max_points (para auto, por
+    defecto 500) y limit (máximo de puntos, por defecto 10000). Con auto se
+    usa la resolución más fina que cubre el rango sin superar max_points.
+    """
+    try:
+        end = parse_time_arg(request.args.get('to'))
+        start = parse_time_arg(request.args.get('from'))
+        if start is None:
+            start = (end or time.time()) - 3600
+        limit = min(request.args.get('limit', 10000, type=int), 100000)
+        max_points = max(1, request.args.get('max_points', 500, type=int))
+        resolution = request.args.get('resolution', 'auto')
+        if resolution == 'auto':
+            resolution = None
+        elif resolution == 'raw':
+            resolution = PING_HISTORY_RAW
+        elif int(resolution) in PING_HISTORY_RESOLUTIONS:
+            resolution = int(resolution)
+        else:
+            raise ValueError(f'resolución no soportada: {resolution}')
+    except ValueError as e:
+        return jsonify({'error': f'Parámetro inválido: {str(e)}'}), 400
+    
+    try:
+        resolution, points = ping_history.history(ip, start, end, resolution, max_points, limit)
+        return jsonify({
+            'ip': ip,
+            'from': start,
+            'to': end,
+            'resolution': 'raw' if resolution == PING_HISTORY_RAW else resolution,
+            'summary': ping_history.summary(ip, start, end, resolution),
+            'points': points
+        })
+    except Exception as e:
+        print(f"Error en api_ping_history para {ip}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/stop_monitor/<ip>', methods=['POST'])
 def stop_monitor(ip):
     """Detiene el monitoreo para una IP específica.
@@ -2700,66 +3229,24 @@ def stop_monitor(ip):
         
         message = f"Monitoreo detenido para {ip}"
         
-        # Verificar si hay un evento de monitoreo activo
-        if ip in monitoring_events:
-            print(f"Deteniendo hilo de monitoreo para IP: {ip}")
-            try:
-                monitoring_events[ip].set()  # Señalizar al hilo que debe detenerse
-                
-                # Esperar a que el hilo termine (máximo 2 segundos)
-                if ip in monitoring_threads:
-                    monitoring_threads[ip].join(timeout=2)
-                    if monitoring_threads[ip].is_alive():
-                        print(f"Advertencia: El hilo de monitoreo para {ip} no terminó correctamente")
-                    
-                    # Limpiar referencias
-                    del monitoring_threads[ip]
-                
-                # Limpiar el evento
-                del monitoring_events[ip]
-                print(f"Hilo de monitoreo para {ip} detenido correctamente")
-            except Exception as e:
-                print(f"Error al detener el hilo de monitoreo para {ip}: {str(e)}")
-                # Continuar con la limpieza a pesar del error
-        
         # Limpiar la caché y todos los recursos asociados a esta IP
         try:
-            with ping_cache.lock:
-                if hasattr(ping_cache, 'data') and ip in ping_cache.data:
-                    print(f"Eliminando datos de caché para IP: {ip}")
-                    # Guardar estadísticas finales antes de eliminar
-                    final_stats = {
-                        'total_pings': ping_cache.data[ip].get('total_pings', 0),
-                        'successful_pings': ping_cache.data[ip].get('successful_pings', 0),
-                        'failed_pings': ping_cache.data[ip].get('failed_pings', 0),
-                        'packet_loss': ping_cache.data[ip].get('packet_loss', 0)
-                    }
-                    print(f"Estadísticas finales para {ip}: {final_stats}")
-                    
-                    # Eliminar los datos de la caché
-                    del ping_cache.data[ip]
-                    print(f"Datos de caché para IP {ip} eliminados correctamente")
-                else:
-                    print(f"No se encontraron datos de monitoreo para IP: {ip}")
-                    message = f"No se estaba monitoreando la IP {ip}"
-                    
-                # Asegurarse de limpiar cualquier referencia restante
-                if ip in monitoring_threads:
-                    try:
-                        if monitoring_threads[ip].is_alive():
-                            monitoring_threads[ip].join(timeout=1)
-                        del monitoring_threads[ip]
-                        print(f"Hilo de monitoreo para {ip} eliminado")
-                    except Exception as e:
-                        print(f"Error al eliminar el hilo de monitoreo para {ip}: {str(e)}")
-                
-                if ip in monitoring_events:
-                    try:
-                        monitoring_events[ip].set()
-                        del monitoring_events[ip]
-                        print(f"Evento de monitoreo para {ip} eliminado")
-                    except Exception as e:
-                        print(f"Error al eliminar el evento de monitoreo para {ip}: {str(e)}")
+            # Eliminar los datos de la caché (devuelve el último snapshot publicado)
+            last_snapshot = ping_cache.remove(ip)
+            if last_snapshot is not None:
+                print(f"Eliminando datos de caché para IP: {ip}")
+                # Mostrar estadísticas finales del último snapshot
+                final_stats = {
+                    'total_pings': last_snapshot.get('total_pings', 0),
+                    'successful_pings': last_snapshot.get('successful_pings', 0),
+                    'failed_pings': last_snapshot.get('failed_pings', 0),
+                    'packet_loss': last_snapshot.get('packet_loss', 0)
+                }
+                print(f"Estadísticas finales para {ip}: {final_stats}")
+                print(f"Datos de caché para IP {ip} eliminados correctamente")
+            else:
+                print(f"No se encontraron datos de monitoreo para IP: {ip}")
+                message = f"No se estaba monitoreando la IP {ip}"
                         
         except Exception as e:
             error_msg = f"Error al limpiar los recursos para {ip}: {str(e)}"
@@ -2768,6 +3255,10 @@ def stop_monitor(ip):
             traceback.print_exc()
             # No es un error crítico, continuamos
         
+        # Detener la tarea de monitoreo en el planificador (espera máximo 2 segundos)
+        if monitor_scheduler.stop(ip, timeout=2):
+            print(f"Tarea de monitoreo para {ip} detenida correctamente")
+        
         return jsonify({
             "status": "success",
             "message": message,
@@ -2785,6 +3276,15 @@ def stop_monitor(ip):
             "timestamp": datetime.now().isoformat()
         }), 500
 
+@app.before_request
+def start_job_queue():
+    """
+    Arranca los hilos de la cola con el primer request (servidores WSGI). No se
+    hace al importar: con el reloader de Flask el proceso vigilante también
+    importa app.py y quedaría ejecutando trabajos con código viejo.
+    """
+    job_queue.start()
+
 if __name__ == '__main__':
     print("Iniciando aplicación...")
     try:
@@ -2796,6 +3296,9 @@ if __name__ == '__main__':
         debug_env = os.environ.get('FLASK_DEBUG', '1')
         debug = True if str(debug_env).lower() in ('1', 'true', 'yes', 'y') else False
         print(f"[INIT] host={host} port={port} debug={debug}")
+        if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            # Con el reloader sólo el proceso hijo (el que atiende) ejecuta trabajos
+            job_queue.start()
         app.run(host=host, port=port, debug=debug)
     except Exception as e:
         print(f"Error al iniciar la aplicación: {e}")
\ No newline at end of file
@@ -1,7 +1,7 @@
-import sqlite3
+from db import connect as connect_db
 
 def clean_database():
-    conn = sqlite3.connect('tickets.db')
+    conn = connect_db()
     c = conn.cursor()
     
     print("Iniciando limpieza de tickets corruptos...")
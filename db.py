@@ -0,0 +1,120 @@
+import os
+import sqlite3
+import threading
+from collections import deque
+
+DB_PATH = os.environ.get('TICKETS_DB', 'tickets.db')
+
+# Ajustes aplicados a cada conexión nueva
+PRAGMAS = (
+    ('journal_mode', 'WAL'),  # Los lectores no se bloquean detrás de las escrituras del escáner
+    ('synchronous', 'NORMAL'),  # Seguro con WAL y mucho más rápido que FULL
+    ('cache_size', -20000),  # ~20 MB de caché de páginas por conexión
+    ('mmap_size', 268435456),  # Lecturas vía mmap de hasta 256 MB
+    ('temp_store', 'MEMORY'),
+    ('busy_timeout', 5000),  # Esperar hasta 5 s un lock en lugar de fallar
+)
+
+STATEMENT_CACHE_SIZE = 256  # Sentencias preparadas que se reutilizan por conexión
+
+
+def apply_pragmas(conn, pragmas=PRAGMAS):
+    for name, value in pragmas:
+        conn.execute(f'PRAGMA {name}={value}')
+    return conn
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    Conexión que vuelve a su pool al cerrarla.
+
+    `close()` descarta lo que no se haya confirmado (igual que cerrar una
+    conexión real) y la devuelve al pool, así que el código existente que
+    abre y cierra conexiones sigue funcionando sin cambios. `lease` cambia en
+    cada préstamo para detectar referencias a un préstamo ya devuelto.
+    """
+
+    pool = None
+    lease = 0
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.release(self)
+        else:
+            super().close()
+
+    def discard(self):
+        """Cierra la conexión de verdad."""
+        super().close()
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones SQLite reutilizables entre hilos.
+
+    Cada conexión se abre una sola vez con los PRAGMAs de rendimiento y
+    conserva su caché de sentencias preparadas; se presta a un hilo por vez.
+    """
+
+    def __init__(self, path=DB_PATH, max_idle=8):
+        self.path = path
+        self.max_idle = max_idle
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._leases = 0
+
+    def acquire(self):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+            self._leases += 1
+            lease = self._leases
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False,
+                                   factory=PooledConnection, cached_statements=STATEMENT_CACHE_SIZE)
+            apply_pragmas(conn)
+            conn.pool = self
+        conn.lease = lease
+        return conn
+
+    def release(self, conn):
+        if conn.lease == 0:
+            return  # Ya devuelta
+        conn.lease = 0
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = None
+        except sqlite3.Error:
+            conn.discard()
+            return
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.discard()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn in idle:
+            conn.discard()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path=DB_PATH):
+    pool = _pools.get(path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(path, ConnectionPool(path))
+    return pool
+
+
+def connect(path=DB_PATH):
+    """
+    Conexión configurada a la base de tickets tomada del pool.
+    Llamar a `close()` al terminar la devuelve al pool.
+    """
+    return get_pool(path).acquire()
@@ -4,6 +4,7 @@ import email.utils
 from email.header import decode_header
 import re
 import sqlite3
+from db import connect as connect_db
 from datetime import datetime
 import os
 from dotenv import load_dotenv
@@ -17,8 +18,8 @@ PASSWORD = os.getenv('EMAIL_PASS')
 IMAP_SERVER = os.getenv('IMAP_SERVER')
 
 def get_db():
-    """Conecta a la base de datos SQLite"""
-    return sqlite3.connect('tickets.db')
+    """Conexión a la base de datos SQLite del pool compartido (close() la devuelve al pool)"""
+    return connect_db()
 
 def decode_email_subject(subject):
     """Decodifica el asunto del correo"""
@@ -282,8 +283,11 @@ def process_emails_from_folder(mail, folder_name):
         print(f"[ERROR] Error en carpeta {folder_name}: {e}")
         return 0
 
-def scan_emails():
-    """Función principal que escanea los correos y extrae tickets"""
+def scan_emails(raise_errors=False):
+    """
+    Función principal que escanea los correos y extrae tickets.
+    Con raise_errors=True un error de conexión se propaga (la cola de trabajos lo reintenta).
+    """
     print("="*60)
     print("INICIANDO ESCANEO DE CORREOS PARA TICKETS")
     print("="*60)
@@ -316,6 +320,8 @@ def scan_emails():
         
     except Exception as e:
         print(f"\n[ERROR CRÍTICO] {e}")
+        if raise_errors:
+            raise
         return 0
 
 if __name__ == "__main__":
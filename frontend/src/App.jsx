@@ -26,6 +26,7 @@ const LatencyChart = ({ data, colorClass }) => {
 function App() {
   const [stats, setStats] = useState(null);
   const [tickets, setTickets] = useState([]);
+  const [ticketsTotal, setTicketsTotal] = useState(0);
   const [servers, setServers] = useState([]);
   const [serverMonitoring, setServerMonitoring] = useState({});
   const [loading, setLoading] = useState(true);
@@ -33,6 +34,7 @@ function App() {
   const [pingResults, setPingResults] = useState({}); // { [ip]: { msg, timestamp } }
   const [currentPage, setCurrentPage] = useState(1);
   const [uploadStatus, setUploadStatus] = useState({ loading: false, message: '', type: '' });
+  const [updateExisting, setUpdateExisting] = useState(false);
   const [viewMode, setViewMode] = useState('list'); // 'list', 'view', 'edit'
   const [selectedTicket, setSelectedTicket] = useState(null);
   const [showAddServerModal, setShowAddServerModal] = useState(false);
@@ -49,6 +51,9 @@ function App() {
   const fileInputRef = useRef(null);
   const ticketsPerPage = 50;
   const scrollPos = useRef(0);
+  const statusVersion = useRef(0);
+  const pageCursors = useRef([null]); // Cursor de cada página de tickets (keyset)
+  const loadedPage = useRef(1);
 
   // Efecto para scroll al cambiar de pestaña
   useEffect(() => {
@@ -137,21 +142,42 @@ function App() {
   useEffect(() => {
     if (activeTab === 'servers' && !showEditServerModal && !showAddServerModal) {
       fetchServersData();
-      const interval = setInterval(fetchServersStatus, 2000);
-      return () => clearInterval(interval);
+      // Preferir el stream SSE; el sondeo cada 2 s sólo corre mientras no hay conexión
+      let interval = null;
+      const startPolling = () => {
+        if (!interval) interval = setInterval(fetchServersStatus, 2000);
+      };
+      const stopPolling = () => {
+        clearInterval(interval);
+        interval = null;
+      };
+      let source = null;
+      if (window.EventSource) {
+        source = new EventSource('http://127.0.0.1:5002/api/servers/stream');
+        source.onopen = stopPolling;
+        source.onerror = startPolling;
+        source.addEventListener('snapshot', (e) => {
+          const data = JSON.parse(e.data);
+          applyServersStatus({ version: data.version, full: true, changed: data.servers, removed: [] });
+        });
+        source.addEventListener('update', (e) => applyServersStatus(JSON.parse(e.data)));
+      } else {
+        startPolling();
+      }
+      return () => {
+        stopPolling();
+        if (source) source.close();
+      };
     }
   }, [activeTab, showEditServerModal, showAddServerModal]);
 
   const fetchData = async () => {
     try {
-      const responses = await Promise.all([
+      const [response] = await Promise.all([
         fetch('http://127.0.0.1:5002/api/dashboard/stats'),
-        fetch('http://127.0.0.1:5002/api/tickets')
+        fetchTickets(loadedPage.current)
       ]);
-      const statsData = await responses[0].json();
-      const ticketsData = await responses[1].json();
-      setStats(statsData);
-      setTickets(ticketsData);
+      setStats(await response.json());
     } catch (error) {
       console.error('Error fetching data:', error);
     } finally {
@@ -159,6 +185,24 @@ function App() {
     }
   };
 
+  // Trae una página de tickets usando el cursor que dejó la página anterior
+  const fetchTickets = async (page) => {
+    const cursor = pageCursors.current[page - 1];
+    const params = new URLSearchParams({ limit: ticketsPerPage });
+    if (cursor !== null && cursor !== undefined) params.set('cursor', cursor);
+    const response = await fetch(`http://127.0.0.1:5002/api/tickets?${params}`);
+    const data = await response.json();
+    pageCursors.current[page] = data.next_cursor;
+    if (data.total !== null) setTicketsTotal(data.total);
+    setTickets(data.tickets);
+  };
+
+  useEffect(() => {
+    if (loadedPage.current === currentPage) return;
+    loadedPage.current = currentPage;
+    fetchTickets(currentPage).catch(error => console.error('Error fetching tickets:', error));
+  }, [currentPage]);
+
   const fetchServersData = async () => {
     try {
       const response = await fetch('http://127.0.0.1:5002/api/servers');
@@ -171,14 +215,29 @@ function App() {
 
   const fetchServersStatus = async () => {
     try {
-      const response = await fetch('http://127.0.0.1:5002/api/servers/status');
-      const data = await response.json();
-      setServerMonitoring(data);
+      // Pedir sólo lo que cambió desde la última versión recibida
+      const response = await fetch(`http://127.0.0.1:5002/api/servers/status?since=${statusVersion.current}`);
+      if (response.status === 304) return;
+      applyServersStatus(await response.json());
     } catch (error) {
       console.error('Error fetching server status:', error);
     }
   };
 
+  // Aplica un cambio de estado {version, full, changed, removed} (sondeo o stream SSE)
+  const applyServersStatus = (data) => {
+    statusVersion.current = data.version;
+    if (data.full) {
+      setServerMonitoring(data.changed);
+    } else {
+      setServerMonitoring(prev => {
+        const next = { ...prev, ...data.changed };
+        data.removed.forEach(ip => delete next[ip]);
+        return next;
+      });
+    }
+  };
+
   const startAllMonitors = async () => {
     try {
       await fetch('http://127.0.0.1:5002/api/servers/monitor/start-all', { method: 'POST' });
@@ -187,21 +246,44 @@ function App() {
     }
   };
 
+  // Consulta el avance de una importación en segundo plano hasta que termina
+  const pollUpload = async (statusUrl) => {
+    while (true) {
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+      const job = await (await fetch(`http://127.0.0.1:5002${statusUrl}`)).json();
+      if (job.status === 'done') {
+        const { new_tickets, updated_tickets } = job.result;
+        return { status: 'success', message: `Se procesaron los datos. ${new_tickets} nuevos tickets agregados, ${updated_tickets} actualizados.` };
+      }
+      if (job.status === 'error' || job.status === 'cancelled') {
+        return { status: 'error', message: job.error || job.message };
+      }
+      const { rows = 0, total_rows: totalRows } = job.data;
+      const total = totalRows ? ` de ${totalRows}` : '';
+      const message = job.status === 'queued' ? 'En cola...' : `Importando... ${rows} filas${total}`;
+      setUploadStatus({ loading: true, message, type: 'info' });
+    }
+  };
+
   const handleUpload = async (e) => {
     const file = e.target.files[0];
     if (!file) return;
 
-    setUploadStatus({ loading: true, message: 'Procesando Excel...', type: 'info' });
+    setUploadStatus({ loading: true, message: 'Subiendo archivo...', type: 'info' });
 
     const formData = new FormData();
     formData.append('file', file);
+    if (updateExisting) formData.append('update', '1');
 
     try {
       const response = await fetch('http://127.0.0.1:5002/api/tickets/upload', {
         method: 'POST',
         body: formData,
       });
-      const data = await response.json();
+      let data = await response.json();
+      if (data.status === 'accepted') {
+        data = await pollUpload(data.status_url);
+      }
 
       if (data.status === 'success') {
         setUploadStatus({ loading: false, message: data.message, type: 'success' });
@@ -351,14 +433,15 @@ function App() {
     }
   };
 
-  // Lógica de Paginación
-  const indexOfLastTicket = currentPage * ticketsPerPage;
-  const indexOfFirstTicket = indexOfLastTicket - ticketsPerPage;
-  const currentTickets = tickets.slice(indexOfFirstTicket, indexOfLastTicket);
-  const totalPages = Math.ceil(tickets.length / ticketsPerPage);
+  // Lógica de Paginación (el servidor devuelve sólo la página actual)
+  const indexOfFirstTicket = (currentPage - 1) * ticketsPerPage;
+  const indexOfLastTicket = indexOfFirstTicket + tickets.length;
+  const currentTickets = tickets;
+  const totalPages = Math.max(Math.ceil(ticketsTotal / ticketsPerPage), 1);
+  const hasNextPage = Boolean(pageCursors.current[currentPage]);
 
   const Pagination = () => (
-    totalPages > 1 ? (
+    (totalPages > 1 || hasNextPage) ? (
       <div className="pagination" style={{ margin: '1rem 0' }}>
         <button
           className="pagination-btn"
@@ -374,10 +457,10 @@ function App() {
         <button
           className="pagination-btn"
           onClick={() => {
-            setCurrentPage(prev => Math.min(prev + 1, totalPages));
+            setCurrentPage(prev => prev + 1);
             window.scrollTo({ top: 0, behavior: 'smooth' });
           }}
-          disabled={currentPage === totalPages}
+          disabled={!hasNextPage}
         >
           Siguiente <i className="fas fa-chevron-right"></i>
         </button>
@@ -1070,7 +1153,7 @@ function App() {
               <div>
                 <h2 style={{ fontSize: '1.8rem', fontWeight: '800' }}>Gestión de Tickets</h2>
                 <p style={{ color: 'var(--text-muted)', fontSize: '0.9rem' }}>
-                  Mostrando {tickets.length > 0 ? indexOfFirstTicket + 1 : 0} - {Math.min(indexOfLastTicket, tickets.length)} de {tickets.length} tickets
+                  Mostrando {tickets.length > 0 ? indexOfFirstTicket + 1 : 0} - {indexOfLastTicket} de {ticketsTotal} tickets
                 </p>
               </div>
               <div style={{ display: 'flex', gap: '10px' }}>
@@ -1186,13 +1269,23 @@ function App() {
                 type="file"
                 ref={fileInputRef}
                 onChange={handleUpload}
-                accept=".xlsx,.xls"
+                accept=".xlsx,.xls,.csv"
                 style={{ position: 'absolute', width: '100%', height: '100%', top: 0, left: 0, opacity: 0, cursor: 'pointer' }}
               />
               <i className="fas fa-cloud-upload-alt" style={{ fontSize: '3rem', color: 'var(--primary)', marginBottom: '1rem', display: 'block' }}></i>
               <span style={{ fontWeight: 600 }}>{uploadStatus.loading ? 'Cargando...' : 'Haz clic o arrastra el archivo aquí'}</span>
             </div>
 
+            <label style={{ display: 'block', marginTop: '1rem', color: 'var(--text-muted)', cursor: 'pointer' }}>
+              <input
+                type="checkbox"
+                checked={updateExisting}
+                onChange={(e) => setUpdateExisting(e.target.checked)}
+                style={{ marginRight: '8px' }}
+              />
+              Actualizar también los tickets existentes que cambiaron (estado, cierre, SLA, colaboradores)
+            </label>
+
             {uploadStatus.message && (
               <div style={{
                 marginTop: '1.5rem',
@@ -0,0 +1,321 @@
+import asyncio
+import os
+import socket
+import struct
+import select
+import threading
+import time
+
+# Constantes para el ping personalizado
+ICMP_ECHO_REPLY = 0
+ICMP_DEST_UNREACHABLE = 3
+ICMP_ECHO_REQUEST = 8
+ICMP_TIME_EXCEEDED = 11
+DEFAULT_TIMEOUT = 10  # segundos
+DEFAULT_COUNT = 1
+
+# Carga útil fija de los paquetes de eco
+PAYLOAD = b'SommierCenter-Monitoreo-ICMP-v1!'
+
+
+def checksum(source_string):
+    """
+    Calcula el checksum de la cabecera ICMP
+    """
+    sum = 0
+    count_to = (len(source_string) // 2) * 2
+    count = 0
+    while count < count_to:
+        this_val = source_string[count + 1] * 256 + source_string[count]
+        sum = sum + this_val
+        sum = sum & 0xffffffff
+        count = count + 2
+
+    if count_to < len(source_string):
+        sum = sum + source_string[-1]
+        sum = sum & 0xffffffff
+
+    sum = (sum >> 16) + (sum & 0xffff)
+    sum = sum + (sum >> 16)
+    answer = ~sum
+    answer = answer & 0xffff
+    answer = answer >> 8 | (answer << 8 & 0xff00)
+    return answer
+
+
+def build_echo_request(ident, seq, payload=PAYLOAD):
+    """Construye un paquete ICMP Echo Request con su checksum."""
+    header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+    # checksum() ya devuelve el valor en orden de red
+    cksum = checksum(header + payload)
+    header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, cksum, ident, seq)
+    return header + payload
+
+
+def _ipv4_literal(host):
+    """Devuelve `host` si ya es una IPv4 en notación decimal (no hace falta resolverlo)."""
+    try:
+        socket.inet_aton(host)
+    except OSError:
+        return None
+    return host if host.count('.') == 3 else None
+
+
+def _strip_ip_header(packet):
+    """Quita la cabecera IPv4 si el socket la entrega (raw, o DGRAM en macOS)."""
+    if len(packet) >= 20 and packet[0] >> 4 == 4:
+        ihl = (packet[0] & 0x0f) * 4
+        return packet[ihl:]
+    return packet
+
+
+class ICMPEngine:
+    """
+    Motor de ping ICMP nativo que multiplexa todos los destinos sobre un único socket.
+
+    Intenta primero un socket ICMP no privilegiado (SOCK_DGRAM, Linux con
+    net.ipv4.ping_group_range) y si no está permitido usa un socket raw.
+    Un hilo receptor empareja las respuestas por identificador/secuencia y
+    resuelve los timeouts, por lo que ningún ping lanza procesos del sistema.
+    """
+
+    def __init__(self):
+        self.sock, self.raw = self._open_socket()
+        self.ident = os.getpid() & 0xffff
+        self._seq = 0
+        self._pending = {}  # seq -> (ip, send_time, deadline, callback)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._receiver = threading.Thread(target=self._receive_loop, daemon=True, name="ICMPEngine-rx")
+        self._receiver.start()
+
+    @staticmethod
+    def _open_socket():
+        """Abre el socket ICMP. Devuelve (socket, es_raw)."""
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+            raw = False
+        except (PermissionError, OSError):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+            raw = True
+        sock.setblocking(False)
+        return sock, raw
+
+    def _next_seq(self):
+        with self._lock:
+            # Buscar una secuencia libre (hay 65536 posibles)
+            for _ in range(0x10000):
+                self._seq = (self._seq + 1) & 0xffff
+                if self._seq not in self._pending:
+                    return self._seq
+        raise RuntimeError("No hay números de secuencia ICMP disponibles")
+
+    def send(self, ip, timeout, callback):
+        """
+        Envía un Echo Request a `ip`.
+
+        `callback(result)` se invoca desde el hilo receptor con un dict
+        {'success', 'latency', 'error'} con el mismo formato que el ping por
+        subprocess (latencia en ms, -1 si falla).
+
+        Si `ip` es un nombre de host se resuelve aquí con una consulta DNS
+        bloqueante; desde un event loop usar ping_async(), que resuelve con
+        loop.getaddrinfo().
+        """
+        address = _ipv4_literal(ip)
+        if address is None:
+            try:
+                address = socket.gethostbyname(ip)
+            except socket.error:
+                callback({'success': False, 'error': 'Nombre de host desconocido', 'latency': -1})
+                return
+        self._send_to(address, timeout, callback)
+
+    def _send_to(self, address, timeout, callback):
+        """Envía el Echo Request a una dirección IPv4 ya resuelta, sin bloquear."""
+        seq = self._next_seq()
+        packet = build_echo_request(self.ident, seq)
+        now = time.perf_counter()
+        with self._lock:
+            self._pending[seq] = (address, now, now + timeout, callback)
+        try:
+            self.sock.sendto(packet, (address, 0))
+        except OSError as e:
+            with self._lock:
+                self._pending.pop(seq, None)
+            if e.errno in (101, 10051):  # ENETUNREACH / WSAENETUNREACH
+                error_msg = "Red inalcanzable"
+            else:
+                error_msg = f"Error al enviar: {str(e)}"
+            callback({'success': False, 'error': error_msg, 'latency': -1})
+
+    def ping(self, ip, timeout=2):
+        """Ping bloqueante a una IP. Devuelve el dict de resultado."""
+        done = threading.Event()
+        box = {}
+
+        def on_result(result):
+            box['result'] = result
+            done.set()
+
+        self.send(ip, timeout, on_result)
+        done.wait(timeout + 1)
+        return box.get('result', {'success': False, 'error': 'Tiempo de espera agotado', 'latency': -1})
+
+    async def ping_async(self, ip, timeout=2):
+        """Versión asyncio de ping(): no bloquea el event loop ni al resolver ni mientras espera."""
+        loop = asyncio.get_running_loop()
+        address = _ipv4_literal(ip)
+        if address is None:
+            try:
+                infos = await loop.getaddrinfo(ip, None, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+                address = infos[0][4][0]
+            except (OSError, IndexError):
+                return {'success': False, 'error': 'Nombre de host desconocido', 'latency': -1}
+
+        future = loop.create_future()
+
+        def set_result(result):
+            if not future.done():
+                future.set_result(result)
+
+        self._send_to(address, timeout, lambda result: loop.call_soon_threadsafe(set_result, result))
+        return await future
+
+    def ping_many(self, ips, timeout=2):
+        """Envía un ping a cada IP en paralelo sobre el mismo socket y espera todos."""
+        results = {}
+        remaining = len(ips)
+        done = threading.Event()
+        results_lock = threading.Lock()
+
+        if not ips:
+            return results
+
+        def make_callback(ip):
+            def on_result(result):
+                nonlocal remaining
+                with results_lock:
+                    results[ip] = result
+                    remaining -= 1
+                    if remaining == 0:
+                        done.set()
+            return on_result
+
+        for ip in ips:
+            self.send(ip, timeout, make_callback(ip))
+        done.wait(timeout + 1)
+        for ip in ips:
+            results.setdefault(ip, {'success': False, 'error': 'Tiempo de espera agotado', 'latency': -1})
+        return results
+
+    def _resolve(self, seq, address, result):
+        """Completa una solicitud pendiente si coincide la secuencia y la dirección."""
+        with self._lock:
+            entry = self._pending.get(seq)
+            if entry is None or entry[0] != address:
+                return
+            del self._pending[seq]
+        ip, send_time, _, callback = entry
+        if result.get('success'):
+            result['latency'] = (time.perf_counter() - send_time) * 1000
+        self._safe_callback(callback, result)
+
+    @staticmethod
+    def _safe_callback(callback, result):
+        try:
+            callback(result)
+        except Exception as e:
+            print(f"[ICMP] Error en callback: {str(e)}")
+
+    def _handle_packet(self, packet, address):
+        icmp = _strip_ip_header(packet)
+        if len(icmp) < 8:
+            return
+        icmp_type, code, _, ident, seq = struct.unpack('!BBHHH', icmp[:8])
+
+        if icmp_type == ICMP_ECHO_REPLY:
+            # En sockets DGRAM el kernel reescribe el identificador, sólo en raw se valida
+            if self.raw and ident != self.ident:
+                return
+            self._resolve(seq, address, {'success': True, 'latency': -1})
+
+        elif icmp_type in (ICMP_DEST_UNREACHABLE, ICMP_TIME_EXCEEDED) and self.raw:
+            # El mensaje de error contiene la cabecera IP + 8 bytes del paquete original
+            inner = _strip_ip_header(icmp[8:])
+            if len(inner) < 8 or len(icmp) < 28:
+                return
+            inner_type, _, _, inner_ident, inner_seq = struct.unpack('!BBHHH', inner[:8])
+            if inner_type != ICMP_ECHO_REQUEST or inner_ident != self.ident:
+                return
+            original_dst = socket.inet_ntoa(icmp[8 + 16:8 + 20])
+            if icmp_type == ICMP_DEST_UNREACHABLE:
+                error_msg = "Red inalcanzable" if code == 0 else "Destino inalcanzable"
+            else:
+                error_msg = "TTL excedido en tránsito"
+            self._resolve(inner_seq, original_dst, {'success': False, 'error': error_msg, 'latency': -1})
+
+    def _expire(self):
+        """Resuelve como timeout todas las solicitudes vencidas."""
+        now = time.perf_counter()
+        expired = []
+        with self._lock:
+            for seq, entry in list(self._pending.items()):
+                if entry[2] <= now:
+                    expired.append(entry[3])
+                    del self._pending[seq]
+        for callback in expired:
+            self._safe_callback(callback, {'success': False, 'error': 'Tiempo de espera agotado', 'latency': -1})
+
+    def _receive_loop(self):
+        while not self._closed:
+            try:
+                readable, _, _ = select.select([self.sock], [], [], 0.05)
+            except (OSError, ValueError):
+                break
+            if readable:
+                # Vaciar todo lo disponible antes de volver a select
+                while True:
+                    try:
+                        packet, (address, _) = self.sock.recvfrom(2048)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    except OSError:
+                        break
+                    try:
+                        self._handle_packet(packet, address)
+                    except Exception as e:
+                        print(f"[ICMP] Error procesando respuesta de {address}: {str(e)}")
+            self._expire()
+
+    def close(self):
+        self._closed = True
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+_engine = None
+_engine_error = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """
+    Devuelve el motor ICMP compartido, creándolo la primera vez.
+    Devuelve None si el sistema no permite abrir sockets ICMP (sin privilegios).
+    """
+    global _engine, _engine_error
+    if _engine is not None or _engine_error is not None:
+        return _engine
+    with _engine_lock:
+        if _engine is None and _engine_error is None:
+            try:
+                _engine = ICMPEngine()
+                mode = 'raw' if _engine.raw else 'dgram'
+                print(f"[ICMP] Motor de ping nativo iniciado (socket {mode})")
+            except OSError as e:
+                _engine_error = str(e)
+                print(f"[ICMP] No se pudo abrir un socket ICMP ({e}). Se usará el comando ping del sistema.")
+    return _engine
@@ -0,0 +1,452 @@
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+# Estados de un trabajo: queued -> running -> done | error | cancelled (un reintento vuelve a queued)
+JOB_COLUMNS = ('id', 'kind', 'status', 'payload', 'progress', 'message', 'data', 'result', 'error', 'attempts',
+               'max_attempts', 'cancel_requested', 'run_after', 'worker', 'heartbeat_at', 'created_at',
+               'started_at', 'finished_at')
+
+
+def _now(offset=0):
+    return (datetime.now() + timedelta(seconds=offset)).isoformat(timespec='seconds')
+
+
+class JobCancelled(Exception):
+    """Se pidió cancelar el trabajo; lo lanza Job.progress() para cortar el handler."""
+
+
+class Job:
+    """
+    Trabajo en ejecución, tal como lo recibe su handler.
+
+    `progress()` guarda el avance (porcentaje, mensaje y datos libres) y es el
+    punto donde se atiende un pedido de cancelación.
+    """
+
+    def __init__(self, queue, row):
+        self.queue = queue
+        self.id = row['id']
+        self.kind = row['kind']
+        self.payload = json.loads(row['payload'] or '{}')
+        self.attempt = row['attempts']
+        self.max_attempts = row['max_attempts']
+
+    def progress(self, percent=None, message=None, **data):
+        cancelled = self.queue._report(self.id, percent, message, data or None)
+        if cancelled:
+            raise JobCancelled()
+
+    def check_cancelled(self):
+        if self.queue._cancel_requested(self.id):
+            raise JobCancelled()
+
+
+class JobKind:
+    def __init__(self, handler, max_attempts=1, retry_delay=30, concurrency=None, on_finish=None):
+        self.handler = handler
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.concurrency = concurrency
+        self.on_finish = on_finish
+
+
+class JobQueue:
+    """
+    Cola de trabajos persistida en la tabla jobs (ver migrations.py).
+
+    Los trabajos largos (importaciones, informes, escaneo de correo) se
+    encolan y los ejecuta un pool de hilos propio, así los hilos de Flask
+    responden enseguida. Como el estado vive en SQLite, varios procesos (la
+    app y ticket_service.py) comparten la cola: cada trabajo se toma dentro de
+    una transacción BEGIN IMMEDIATE, así nunca lo ejecutan dos a la vez.
+
+    - Reintentos: un trabajo que falla vuelve a la cola tras `retry_delay`
+      segundos (multiplicado por el intento) hasta `max_attempts`.
+    - Cancelación: uno en cola se cancela al instante; uno en ejecución se
+      corta en su próximo `job.progress()`.
+    - Concurrencia: `workers` hilos en total y, por tipo, `concurrency`
+      trabajos a la vez contando todos los procesos.
+    - Los trabajos en ejecución renuevan heartbeat_at; si un proceso muere, sus
+      trabajos se reencolan (o fallan) pasados `stale_after` segundos.
+
+    Args:
+        connect: función que devuelve una conexión a la base
+        workers: hilos que ejecutan trabajos
+        poll_interval: segundos entre consultas a la tabla cuando no hay avisos
+        stale_after: segundos sin heartbeat para dar por muerto un trabajo
+        keep_days: días que se conservan los trabajos terminados
+    """
+
+    def __init__(self, connect, workers=2, poll_interval=2.0, stale_after=300, keep_days=7):
+        self.connect = connect
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.keep_days = keep_days
+        self.kinds = {}
+        self.schedules = {}  # tipo -> (intervalo en segundos, payload)
+        self.worker_name = f"{socket.gethostname()}:{os.getpid()}"
+        self._running = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    # --- Registro y planificación ---
+
+    def register(self, kind, max_attempts=1, retry_delay=30, concurrency=None, on_finish=None):
+        """
+        Decorador que registra el handler de un tipo de trabajo: `handler(job)`
+        devuelve el resultado (serializable a JSON). `on_finish(info)` se llama
+        cuando el trabajo llega a un estado final en este proceso.
+        """
+        def decorator(handler):
+            self.kinds[kind] = JobKind(handler, max_attempts, retry_delay, concurrency, on_finish)
+            return handler
+        return decorator
+
+    def schedule(self, kind, every, payload=None):
+        """Encola `kind` cada `every` segundos si no hay uno pendiente o en ejecución."""
+        self.schedules[kind] = (every, payload)
+
+    # --- API ---
+
+    def enqueue(self, kind, payload=None, max_attempts=None, delay=0):
+        """Agrega un trabajo a la cola y devuelve su id."""
+        if max_attempts is None:
+            max_attempts = self.kinds[kind].max_attempts if kind in self.kinds else 1
+        conn = self.connect()
+        try:
+            now = _now()
+            cursor = conn.execute(
+                "INSERT INTO jobs (kind, status, payload, max_attempts, run_after, created_at) "
+                "VALUES (?, 'queued', ?, ?, ?, ?)",
+                (kind, json.dumps(payload or {}), max_attempts, _now(delay), now)
+            )
+            conn.commit()
+            job_id = cursor.lastrowid
+        finally:
+            conn.close()
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id):
+        """Estado de un trabajo como dict (None si no existe)."""
+        conn = self.connect()
+        try:
+            row = conn.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return self._info(row) if row else None
+
+    def list(self, kind=None, status=None, limit=50):
+        conditions, params = [], []
+        if kind:
+            conditions.append("kind = ?")
+            params.append(kind)
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        conn = self.connect()
+        try:
+            rows = conn.execute(
+                f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs {where} ORDER BY id DESC LIMIT ?", params + [limit]
+            ).fetchall()
+        finally:
+            conn.close()
+        return [self._info(row, with_result=False) for row in rows]
+
+    def cancel(self, job_id):
+        """
+        Cancela un trabajo. Devuelve el estado resultante: 'cancelled' si estaba
+        en cola, 'running' si se pidió cortarlo, o el estado final que ya tenía.
+        """
+        conn = self.connect()
+        try:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                (_now(), job_id)
+            )
+            if cursor.rowcount:
+                conn.commit()
+                self._finished(job_id)
+                return 'cancelled'
+            conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+            conn.commit()
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    def stats(self):
+        conn = self.connect()
+        try:
+            rows = conn.execute("SELECT kind, status, COUNT(*) FROM jobs GROUP BY kind, status").fetchall()
+        finally:
+            conn.close()
+        counts = {}
+        for kind, status, count in rows:
+            counts.setdefault(kind, {})[status] = count
+        return {'workers': self.workers, 'running_here': len(self._running), 'jobs': counts}
+
+    # --- Hilos ---
+
+    def start(self):
+        """Arranca los hilos de trabajo y el de mantenimiento (una sola vez)."""
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for n in range(self.workers):
+                thread = threading.Thread(target=self._work, daemon=True, name=f"JobWorker-{n + 1}")
+                self._threads.append(thread)
+            self._threads.append(threading.Thread(target=self._maintain, daemon=True, name="JobMaintenance"))
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def run_forever(self):
+        """Arranca los hilos y bloquea hasta Ctrl+C (para procesos dedicados como ticket_service.py)."""
+        self.start()
+        try:
+            while not self._stop.wait(1):
+                pass
+        except KeyboardInterrupt:
+            self.stop()
+            raise
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                row = self._claim()
+            except Exception as e:
+                print(f"[JobQueue] Error al tomar un trabajo: {e}")
+                row = None
+            if row is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self._execute(row)
+
+    def _claim(self):
+        """Toma el próximo trabajo ejecutable de un tipo registrado aquí, o None."""
+        if not self.kinds:
+            return None
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            running = dict(conn.execute(
+                "SELECT kind, COUNT(*) FROM jobs WHERE status = 'running' GROUP BY kind"
+            ).fetchall())
+            kinds = [name for name, kind in self.kinds.items()
+                     if kind.concurrency is None or running.get(name, 0) < kind.concurrency]
+            row = None
+            if kinds:
+                row = conn.execute(
+                    f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE status = 'queued' AND run_after <= ? "
+                    "AND kind IN (SELECT value FROM json_each(?)) ORDER BY run_after, id LIMIT 1",
+                    (_now(), json.dumps(kinds))
+                ).fetchone()
+            if row is None:
+                conn.rollback()
+                return None
+            now = _now()
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?, started_at = ?, "
+                "heartbeat_at = ?, error = NULL WHERE id = ?",
+                (self.worker_name, now, now, row[0])
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        row = dict(zip(JOB_COLUMNS, row))
+        row['attempts'] += 1
+        return row
+
+    def _execute(self, row):
+        kind = self.kinds[row['kind']]
+        job = Job(self, row)
+        with self._lock:
+            self._running.add(job.id)
+        try:
+            result = kind.handler(job)
+        except JobCancelled:
+            self._close(job.id, 'cancelled', message='Cancelado')
+        except Exception as e:
+            traceback.print_exc()
+            if job.attempt < job.max_attempts:
+                self._retry(job.id, str(e), kind.retry_delay * job.attempt)
+            else:
+                self._close(job.id, 'error', error=str(e))
+        else:
+            self._close(job.id, 'done', result=result, progress=100)
+        finally:
+            with self._lock:
+                self._running.discard(job.id)
+
+    def _maintain(self):
+        """Heartbeat de los trabajos propios, rescate de los abandonados, limpieza y planificación."""
+        last_purge = 0
+        while True:
+            try:
+                self._heartbeat()
+                self._recover_stale()
+                self._enqueue_scheduled()
+                if time.monotonic() - last_purge > 3600:
+                    self._purge()
+                    last_purge = time.monotonic()
+            except Exception as e:
+                print(f"[JobQueue] Error de mantenimiento: {e}")
+            if self._stop.wait(min(self.poll_interval * 5, 30)):
+                break
+
+    # --- Escrituras internas ---
+
+    def _write(self, sql, params):
+        conn = self.connect()
+        try:
+            cursor = conn.execute(sql, params)
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+    def _report(self, job_id, percent, message, data):
+        conn = self.connect()
+        try:
+            conn.execute(
+                "UPDATE jobs SET progress = coalesce(?, progress), message = coalesce(?, message), "
+                "data = coalesce(?, data), heartbeat_at = ? WHERE id = ?",
+                (percent, message, json.dumps(data, default=str) if data else None, _now(), job_id)
+            )
+            conn.commit()
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return bool(row and row[0])
+
+    def _cancel_requested(self, job_id):
+        conn = self.connect()
+        try:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return bool(row and row[0])
+
+    def _retry(self, job_id, error, delay):
+        self._write(
+            "UPDATE jobs SET status = 'queued', error = ?, run_after = ?, worker = NULL WHERE id = ?",
+            (error, _now(delay), job_id)
+        )
+        print(f"[JobQueue] Trabajo {job_id} falló ({error}); se reintenta en {delay} s")
+
+    def _close(self, job_id, status, result=None, error=None, message=None, progress=None):
+        self._write(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, message = coalesce(?, message), "
+            "progress = coalesce(?, progress), finished_at = ? WHERE id = ?",
+            (status, json.dumps(result, default=str) if result is not None else None, error, message,
+             progress, _now(), job_id)
+        )
+        self._finished(job_id)
+
+    def _finished(self, job_id):
+        info = self.get(job_id)
+        kind = self.kinds.get(info['kind']) if info else None
+        if kind and kind.on_finish:
+            try:
+                kind.on_finish(info)
+            except Exception as e:
+                print(f"[JobQueue] Error en on_finish del trabajo {job_id}: {e}")
+
+    def _heartbeat(self):
+        with self._lock:
+            running = list(self._running)
+        if running:
+            self._write(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id IN (SELECT value FROM json_each(?))",
+                (_now(), json.dumps(running))
+            )
+
+    def _recover_stale(self):
+        """Reencola (o da por fallidos si no quedan intentos) los trabajos cuyo proceso dejó de latir."""
+        conn = self.connect()
+        try:
+            stale = conn.execute(
+                "SELECT id, attempts, max_attempts FROM jobs WHERE status = 'running' AND heartbeat_at < ?",
+                (_now(-self.stale_after),)
+            ).fetchall()
+            for job_id, attempts, max_attempts in stale:
+                if attempts < max_attempts:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'queued', worker = NULL, error = 'Interrumpido' "
+                        "WHERE id = ? AND status = 'running'", (job_id,)
+                    )
+                else:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'error', error = 'Interrumpido', finished_at = ? "
+                        "WHERE id = ? AND status = 'running'", (_now(), job_id)
+                    )
+            conn.commit()
+        finally:
+            conn.close()
+        for job_id, attempts, max_attempts in stale:
+            if attempts >= max_attempts:
+                self._finished(job_id)
+        if stale:
+            self._wake.set()
+
+    def _enqueue_scheduled(self):
+        for kind, (every, payload) in self.schedules.items():
+            conn = self.connect()
+            try:
+                # En la misma transacción que el INSERT: otro proceso con el mismo plan no lo duplica
+                conn.execute("BEGIN IMMEDIATE")
+                pending = conn.execute(
+                    "SELECT 1 FROM jobs WHERE kind = ? AND (status IN ('queued', 'running') OR created_at > ?) LIMIT 1",
+                    (kind, _now(-every))
+                ).fetchone()
+                if pending is None:
+                    now = _now()
+                    conn.execute(
+                        "INSERT INTO jobs (kind, status, payload, max_attempts, run_after, created_at) "
+                        "VALUES (?, 'queued', ?, ?, ?, ?)",
+                        (kind, json.dumps(payload or {}), self.kinds[kind].max_attempts, now, now)
+                    )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+            if pending is None:
+                self._wake.set()
+
+    def _purge(self):
+        self._write(
+            "DELETE FROM jobs WHERE status IN ('done', 'error', 'cancelled') AND finished_at < ?",
+            (_now(-self.keep_days * 86400),)
+        )
+
+    @staticmethod
+    def _info(row, with_result=True):
+        info = dict(zip(JOB_COLUMNS, row))
+        info['payload'] = json.loads(info['payload'] or '{}')
+        info['data'] = json.loads(info['data']) if info['data'] else {}
+        info['result'] = json.loads(info['result']) if with_result and info['result'] else None
+        info['cancel_requested'] = bool(info['cancel_requested'])
+        return info
@@ -0,0 +1,134 @@
+import math
+from array import array
+from collections import deque
+
+
+class LatencyRing:
+    """
+    Buffer circular de latencias con estadísticas móviles en O(1).
+
+    Guarda las últimas `capacity` muestras en un array de doubles de tamaño
+    fijo y mantiene incrementalmente la cantidad, la suma y la suma de
+    cuadrados. El mínimo y el máximo de la ventana se obtienen de dos colas
+    monótonas, así que agregar una muestra y leer las estadísticas no recorre
+    ni copia el historial.
+    """
+
+    __slots__ = ('capacity', '_buf', '_head', '_count', '_seq', '_sum', '_sumsq',
+                 '_min_q', '_max_q', '_evictions')
+
+    def __init__(self, capacity=60):
+        if capacity <= 0:
+            raise ValueError("La capacidad debe ser mayor a 0")
+        self.capacity = capacity
+        self._buf = array('d', bytes(8 * capacity))
+        self.clear()
+
+    def clear(self):
+        self._head = 0  # Posición donde se escribirá la próxima muestra
+        self._count = 0
+        self._seq = 0  # Cantidad total de muestras agregadas (índice lógico)
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self._min_q = deque()  # (seq, valor) con valores crecientes
+        self._max_q = deque()  # (seq, valor) con valores decrecientes
+        self._evictions = 0
+
+    def append(self, value):
+        value = float(value)
+        if self._count == self.capacity:
+            old = self._buf[self._head]
+            self._sum -= old
+            self._sumsq -= old * old
+            self._evictions += 1
+        else:
+            self._count += 1
+
+        self._buf[self._head] = value
+        self._head = (self._head + 1) % self.capacity
+        self._sum += value
+        self._sumsq += value * value
+
+        # Descartar de las colas las muestras que salieron de la ventana
+        oldest_seq = self._seq - self._count + 1
+        while self._min_q and self._min_q[0][0] < oldest_seq:
+            self._min_q.popleft()
+        while self._max_q and self._max_q[0][0] < oldest_seq:
+            self._max_q.popleft()
+
+        while self._min_q and self._min_q[-1][1] >= value:
+            self._min_q.pop()
+        self._min_q.append((self._seq, value))
+        while self._max_q and self._max_q[-1][1] <= value:
+            self._max_q.pop()
+        self._max_q.append((self._seq, value))
+        self._seq += 1
+
+        # Recalcular las sumas una vez por vuelta completa para que el error
+        # de punto flotante no se acumule (O(1) amortizado)
+        if self._evictions >= self.capacity:
+            self._evictions = 0
+            self._sum = math.fsum(self._buf)
+            self._sumsq = math.fsum(v * v for v in self._buf)
+
+    def __len__(self):
+        return self._count
+
+    def __bool__(self):
+        return self._count > 0
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def total(self):
+        return self._sum
+
+    @property
+    def last(self):
+        return self._buf[(self._head - 1) % self.capacity] if self._count else None
+
+    @property
+    def min(self):
+        return self._min_q[0][1] if self._count else None
+
+    @property
+    def max(self):
+        return self._max_q[0][1] if self._count else None
+
+    @property
+    def avg(self):
+        return self._sum / self._count if self._count else None
+
+    @property
+    def stddev(self):
+        if not self._count:
+            return None
+        mean = self._sum / self._count
+        return math.sqrt(max(0.0, self._sumsq / self._count - mean * mean))
+
+    def stats(self):
+        """Estadísticas de la ventana sin copiar las muestras."""
+        return {
+            'count': self._count,
+            'min': self.min,
+            'max': self.max,
+            'avg': self.avg,
+            'last': self.last,
+            'stddev': self.stddev
+        }
+
+    def values(self, last=None):
+        """Devuelve las muestras en orden cronológico (las `last` más recientes si se indica)."""
+        n = self._count if last is None else max(0, min(last, self._count))
+        start = (self._head - n) % self.capacity
+        if start + n <= self.capacity:
+            return self._buf[start:start + n].tolist()
+        return self._buf[start:].tolist() + self._buf[:(start + n) % self.capacity].tolist()
+
+    def __iter__(self):
+        return iter(self.values())
+
+    def __repr__(self):
+        return f"LatencyRing(capacity={self.capacity}, count={self._count})"
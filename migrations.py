@@ -0,0 +1,527 @@
+"""
+Migraciones versionadas del esquema de tickets.db.
+
+Cada migración se aplica una sola vez, dentro de una transacción, y queda
+registrada en la tabla schema_migrations. Para agregar un cambio de esquema
+se suma una función al final de MIGRATIONS con el siguiente número.
+
+Uso:
+    python migrations.py            # aplica las migraciones pendientes
+    python migrations.py status     # versiones aplicadas y pendientes
+    python migrations.py schema     # columnas e índices de cada tabla
+    python migrations.py check      # verifica que las consultas frecuentes usen índices
+    python migrations.py counters   # recalcula los contadores del dashboard
+"""
+import sys
+from datetime import datetime
+
+from db import connect as connect_db
+
+
+def add_column_if_missing(conn, table, column, definition):
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in existing:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def baseline_schema(conn):
+    """Tablas originales de la aplicación y sucursales por defecto."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS tickets (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ticket_number INTEGER UNIQUE,
+                    creation_date TEXT,
+                    agent TEXT,
+                    status TEXT,
+                    collaborators TEXT,
+                    first_response TEXT,
+                    sla_resolution TEXT,
+                    close_date TEXT,
+                    delay TEXT,
+                    user TEXT,
+                    details TEXT,
+                    priority TEXT,
+                    type TEXT,
+                    branch TEXT
+                )''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS branches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL
+        )
+    ''')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE NOT NULL
+    )''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS servers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            branch TEXT NOT NULL UNIQUE,
+            branch_code TEXT NOT NULL,
+            dyndns TEXT,
+            primary_service_provider TEXT,
+            primary_service_ip TEXT,
+            primary_service_speed TEXT,
+            secondary_service_provider TEXT,
+            secondary_service_ip TEXT,
+            secondary_service_speed TEXT
+        )
+    ''')
+
+    # Insertar sucursales por defecto
+    default_branches = sorted(['Casa Central', 'Sucursal Norte', 'Sucursal Sur'])
+    for branch in default_branches:
+        conn.execute('INSERT OR IGNORE INTO branches (name) VALUES (?)', (branch,))
+
+
+def ticket_details_column(conn):
+    """Columna details en bases creadas antes de que existiera (ex add_column.py)."""
+    add_column_if_missing(conn, 'tickets', 'details', 'TEXT')
+
+
+def server_monitor_columns(conn):
+    """Intervalos de monitoreo adaptativo por servidor (NULL = valor global)."""
+    for column in ('monitor_healthy_interval', 'monitor_degraded_interval', 'monitor_max_backoff'):
+        add_column_if_missing(conn, 'servers', column, 'REAL')
+
+
+def ticket_indexes(conn):
+    """Índices para los filtros, agrupaciones y órdenes frecuentes sobre tickets."""
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tickets_status_creation ON tickets (status, creation_date)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tickets_creation_date ON tickets (creation_date)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tickets_agent ON tickets (agent)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tickets_branch ON tickets (branch)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tickets_user ON tickets (user)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tickets_sla_resolution ON tickets (sla_resolution)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_servers_primary_ip ON servers (primary_service_ip)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_servers_secondary_ip ON servers (secondary_service_ip)')
+    # Estadísticas para que el planificador elija bien entre los índices
+    conn.execute('ANALYZE')
+
+
+def iso_datetime_sql(column):
+    """
+    Expresión SQL que normaliza una fecha de texto a 'YYYY-MM-DD HH:MM:SS'.
+
+    Acepta ISO (YYYY-MM-DD, también con mes o día de un dígito, hora opcional)
+    y día/mes/año con '/' o '-' (un o dos dígitos, hora opcional). Devuelve
+    NULL si no es una fecha válida.
+    """
+    # Día/mes/año: se separa por la primera y segunda barra (los guiones se tratan igual)
+    dmy = f"replace(trim({column}), '-', '/')"
+    rest = f"substr({dmy}, instr({dmy}, '/') + 1)"
+    day = f"CAST(substr({dmy}, 1, instr({dmy}, '/') - 1) AS INTEGER)"
+    month = f"CAST(substr({rest}, 1, instr({rest}, '/') - 1) AS INTEGER)"
+    year = f"CAST(substr({rest}, instr({rest}, '/') + 1, 4) AS INTEGER)"
+    clock = f"trim(substr(trim({column}), instr(trim({column}), ' ') + 1))"
+    # Hora de un dígito (9:05): time() sólo acepta HH:MM
+    time_part = (f"CASE WHEN instr(trim({column}), ' ') > 0 "
+                 f"THEN time(CASE WHEN instr({clock}, ':') = 2 THEN '0' || {clock} ELSE {clock} END) END")
+    # Año-mes-día con mes o día de un dígito (2024-3-6): se rellenan como en día/mes/año
+    ymd = f"substr(trim({column}), 6)"
+    iso_month = f"CAST(substr({ymd}, 1, instr({ymd}, '-') - 1) AS INTEGER)"
+    iso_day = f"CAST(substr({ymd}, instr({ymd}, '-') + 1) AS INTEGER)"
+    iso_year = f"CAST(substr(trim({column}), 1, 4) AS INTEGER)"
+    parsed = f"""(CASE
+        WHEN {column} GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*' THEN datetime(substr(trim({column}), 1, 19))
+        WHEN {column} GLOB '[0-9]*[/-][0-9]*[/-][0-9][0-9][0-9][0-9]*' THEN
+            datetime(printf('%04d-%02d-%02d', {year}, {month}, {day}) || ' ' || coalesce({time_part}, '00:00:00'))
+        WHEN trim({column}) GLOB '[0-9][0-9][0-9][0-9]-[0-9]*-[0-9]*' THEN
+            datetime(printf('%04d-%02d-%02d', {iso_year}, {iso_month}, {iso_day}) || ' ' || coalesce({time_part}, '00:00:00'))
+    END)"""
+    # SQLite acepta días inexistentes (31/02): descartar lo que no sobrevive a la normalización
+    return f"CASE WHEN date({parsed}, '+0 days') = substr({parsed}, 1, 10) THEN {parsed} END"
+
+
+def ticket_iso_dates(conn):
+    """
+    Columnas created_at / closed_at con las fechas normalizadas a ISO-8601.
+
+    Las columnas de texto originales se mantienen para mostrar; los triggers
+    recalculan las normalizadas en cada INSERT/UPDATE, sea cual sea el escritor.
+    """
+    add_column_if_missing(conn, 'tickets', 'created_at', 'TEXT')
+    add_column_if_missing(conn, 'tickets', 'closed_at', 'TEXT')
+    conn.execute(f"""UPDATE tickets SET created_at = {iso_datetime_sql('creation_date')},
+                                         closed_at = {iso_datetime_sql('close_date')}""")
+    for event, when in (('INSERT', 'AFTER INSERT'), ('UPDATE', 'AFTER UPDATE OF creation_date, close_date')):
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_tickets_iso_dates_{event.lower()}")
+        conn.execute(f"""
+            CREATE TRIGGER trg_tickets_iso_dates_{event.lower()} {when} ON tickets
+            BEGIN
+                UPDATE tickets SET created_at = {iso_datetime_sql('NEW.creation_date')},
+                                   closed_at = {iso_datetime_sql('NEW.close_date')}
+                WHERE id = NEW.id;
+            END
+        """)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tickets_created_at ON tickets (created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tickets_status_created_at ON tickets (status, created_at)')
+    # Los índices sobre el texto original quedan reemplazados por los de created_at
+    conn.execute('DROP INDEX IF EXISTS idx_tickets_status_creation')
+    conn.execute('DROP INDEX IF EXISTS idx_tickets_creation_date')
+    conn.execute('ANALYZE')
+
+
+# Dimensiones de ticket_counters y la expresión que da el valor de cada fila
+COUNTER_DIMENSIONS = (
+    ('status', "coalesce({row}.status, '')"),
+    ('branch', "coalesce({row}.branch, '')"),
+    ('agent', "coalesce({row}.agent, '')"),
+    ('sla', "coalesce({row}.sla_resolution, '')"),
+    # Se calcula desde creation_date: el trigger de fechas ISO puede no haber corrido todavía
+    ('month', "coalesce(substr({iso}, 1, 7), '')"),
+)
+
+
+def _counter_upserts(row, sign):
+    """Sentencias que suman (sign=1) o restan (sign=-1) la fila OLD/NEW a cada contador."""
+    exceeded = f"(CASE WHEN {row}.sla_resolution = 'Excedido' THEN {sign} ELSE 0 END)"
+    statements = []
+    for dimension, expression in COUNTER_DIMENSIONS:
+        value = expression.format(row=row, iso=iso_datetime_sql(f'{row}.creation_date'))
+        statements.append(f"""
+            INSERT INTO ticket_counters (dimension, value, total, sla_exceeded)
+            VALUES ('{dimension}', {value}, {sign}, {exceeded})
+            ON CONFLICT (dimension, value) DO UPDATE SET
+                total = total + excluded.total,
+                sla_exceeded = sla_exceeded + excluded.sla_exceeded;""")
+    return ''.join(statements)
+
+
+def rebuild_ticket_counters(conn):
+    """Recalcula ticket_counters desde cero a partir de tickets."""
+    conn.execute('DELETE FROM ticket_counters')
+    for dimension, expression in COUNTER_DIMENSIONS:
+        value = expression.format(row='tickets', iso=iso_datetime_sql('tickets.creation_date'))
+        conn.execute(f"""
+            INSERT INTO ticket_counters (dimension, value, total, sla_exceeded)
+            SELECT '{dimension}', {value}, COUNT(*), COUNT(CASE WHEN sla_resolution = 'Excedido' THEN 1 END)
+            FROM tickets GROUP BY 2
+        """)
+
+
+def ticket_counters(conn):
+    """
+    Contadores del dashboard materializados en ticket_counters.
+
+    Una fila por (dimensión, valor) con el total de tickets y cuántos
+    excedieron el SLA. Los triggers los ajustan en cada INSERT/DELETE/UPDATE,
+    así el dashboard lee unas pocas filas en lugar de recorrer tickets.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ticket_counters (
+            dimension TEXT NOT NULL,
+            value TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            sla_exceeded INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, value)
+        ) WITHOUT ROWID
+    ''')
+    rebuild_ticket_counters(conn)
+    triggers = (
+        ('insert', 'AFTER INSERT', _counter_upserts('NEW', 1)),
+        ('delete', 'AFTER DELETE', _counter_upserts('OLD', -1)),
+        ('update', 'AFTER UPDATE OF status, branch, agent, sla_resolution, creation_date',
+         _counter_upserts('OLD', -1) + _counter_upserts('NEW', 1)),
+    )
+    for event, when, body in triggers:
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_ticket_counters_{event}")
+        conn.execute(f"CREATE TRIGGER trg_ticket_counters_{event} {when} ON tickets BEGIN {body} END")
+
+
+# Columnas de tickets indexadas en tickets_fts (en este orden)
+FTS_COLUMNS = ('ticket_number', 'agent', 'status', 'user', 'details', 'branch')
+
+
+def ticket_search_index(conn):
+    """
+    Índice de texto completo tickets_fts (FTS5) sobre las columnas de búsqueda.
+
+    Es una tabla de contenido externo: guarda sólo el índice y lee el texto de
+    tickets. unicode61 con remove_diacritics hace que 'nunez' encuentre 'Núñez'.
+    Los triggers la mantienen al día con cualquier escritor.
+    """
+    columns = ', '.join(FTS_COLUMNS)
+    old_values = ', '.join(f'OLD.{c}' for c in FTS_COLUMNS)
+    new_values = ', '.join(f'NEW.{c}' for c in FTS_COLUMNS)
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS tickets_fts USING fts5(
+            {columns}, content='tickets', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    conn.execute("INSERT INTO tickets_fts (tickets_fts) VALUES ('rebuild')")
+    delete = f"INSERT INTO tickets_fts (tickets_fts, rowid, {columns}) VALUES ('delete', OLD.id, {old_values});"
+    insert = f"INSERT INTO tickets_fts (rowid, {columns}) VALUES (NEW.id, {new_values});"
+    triggers = (
+        ('insert', 'AFTER INSERT', insert),
+        ('delete', 'AFTER DELETE', delete),
+        ('update', f'AFTER UPDATE OF {columns}', delete + insert),
+    )
+    for event, when, body in triggers:
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_tickets_fts_{event}")
+        conn.execute(f"CREATE TRIGGER trg_tickets_fts_{event} {when} ON tickets BEGIN {body} END")
+
+
+def import_ledger(conn):
+    """
+    Registro de importaciones de Excel.
+
+    import_ledger guarda una fila por archivo importado (hash del contenido,
+    filas, tickets nuevos, rechazados y duración); import_chunks el hash de
+    cada rango de filas ya procesado, para que un archivo re-subido con pocos
+    cambios sólo procese los rangos nuevos.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS import_ledger (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_hash TEXT NOT NULL,
+            filename TEXT,
+            sheet TEXT,
+            rows INTEGER NOT NULL DEFAULT 0,
+            processed_rows INTEGER NOT NULL DEFAULT 0,
+            new_tickets INTEGER NOT NULL DEFAULT 0,
+            existing_tickets INTEGER NOT NULL DEFAULT 0,
+            rejected INTEGER NOT NULL DEFAULT 0,
+            rejected_rows TEXT,
+            duration_ms REAL,
+            imported_at TEXT NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_import_ledger_file_hash ON import_ledger (file_hash)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS import_chunks (
+            chunk_hash TEXT PRIMARY KEY,
+            import_id INTEGER NOT NULL,
+            first_row INTEGER NOT NULL,
+            last_row INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+
+def import_ledger_status(conn):
+    """
+    Estado de cada importación ('running', 'done', 'error').
+
+    Las importaciones en streaming confirman bloque por bloque: una que se
+    cortó a mitad de camino no cuenta como archivo ya importado, pero los
+    rangos que alcanzó a guardar en import_chunks sí se saltean al reintentar.
+    """
+    add_column_if_missing(conn, 'import_ledger', 'status', "TEXT NOT NULL DEFAULT 'done'")
+
+
+def ticket_changes(conn):
+    """
+    Historial de cambios de tickets hechos por importaciones con actualización.
+
+    Una fila por campo modificado (valor anterior y nuevo). import_ledger
+    registra además el modo de cada importación ('insert' o 'upsert') y
+    cuántos tickets actualizó.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ticket_changes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ticket_id INTEGER NOT NULL,
+            ticket_number INTEGER,
+            field TEXT NOT NULL,
+            old_value TEXT,
+            new_value TEXT,
+            import_id INTEGER,
+            changed_at TEXT NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_ticket_changes_ticket_id ON ticket_changes (ticket_id, id)')
+    add_column_if_missing(conn, 'import_ledger', 'mode', "TEXT NOT NULL DEFAULT 'insert'")
+    add_column_if_missing(conn, 'import_ledger', 'updated_tickets', 'INTEGER NOT NULL DEFAULT 0')
+
+
+def job_queue(conn):
+    """
+    Cola de trabajos en segundo plano (ver job_queue.py).
+
+    Cada fila es un trabajo con su tipo, parámetros (payload JSON), avance,
+    resultado, reintentos y heartbeat del proceso que lo ejecuta.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            payload TEXT,
+            progress REAL,
+            message TEXT,
+            data TEXT,
+            result TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 1,
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            run_after TEXT NOT NULL,
+            worker TEXT,
+            heartbeat_at TEXT,
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            finished_at TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status_run_after ON jobs (status, run_after)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_kind ON jobs (kind, id)')
+
+
+def ticket_iso_dates_padded(conn):
+    """
+    Vuelve a normalizar las fechas con la expresión que acepta '2024-3-6'.
+    Recrea los triggers de fechas y de contadores (ambos usan iso_datetime_sql)
+    y recalcula created_at/closed_at y ticket_counters.
+    """
+    ticket_iso_dates(conn)
+    ticket_counters(conn)
+
+
+MIGRATIONS = [
+    (1, 'Esquema base', baseline_schema),
+    (2, 'Columna tickets.details', ticket_details_column),
+    (3, 'Intervalos de monitoreo en servers', server_monitor_columns),
+    (4, 'Índices de tickets y servers', ticket_indexes),
+    (5, 'Fechas ISO normalizadas en tickets', ticket_iso_dates),
+    (6, 'Contadores materializados del dashboard', ticket_counters),
+    (7, 'Índice de búsqueda de texto completo', ticket_search_index),
+    (8, 'Registro de importaciones', import_ledger),
+    (9, 'Estado de las importaciones', import_ledger_status),
+    (10, 'Historial de cambios por importación', ticket_changes),
+    (11, 'Cola de trabajos en segundo plano', job_queue),
+    (12, 'Fechas ISO con mes o día de un dígito', ticket_iso_dates_padded),
+]
+
+# Consultas frecuentes y el índice que deben usar (EXPLAIN QUERY PLAN)
+QUERY_PLAN_CHECKS = [
+    ("SELECT status, COUNT(*) FROM tickets GROUP BY status", 'idx_tickets_status_created_at'),
+    ("SELECT COUNT(*) FROM tickets WHERE status = 'Abierto'", 'idx_tickets_status_created_at'),
+    ("SELECT id, ticket_number, creation_date, agent, status FROM tickets "
+     "WHERE status = 'Abierto' ORDER BY created_at DESC LIMIT 5", 'idx_tickets_status_created_at'),
+    ("SELECT id, ticket_number, creation_date, agent, status FROM tickets "
+     "ORDER BY created_at DESC LIMIT 5", 'idx_tickets_created_at'),
+    ("SELECT COUNT(*) FROM tickets WHERE created_at >= '2024-01-01' AND created_at < '2024-02-01'",
+     'idx_tickets_created_at'),
+    ("SELECT DISTINCT agent FROM tickets WHERE agent IS NOT NULL AND agent != '' ORDER BY agent", 'idx_tickets_agent'),
+    ("SELECT DISTINCT user FROM tickets WHERE user IS NOT NULL AND user != ''", 'idx_tickets_user'),
+    ("SELECT branch, COUNT(*) FROM tickets WHERE branch IS NOT NULL AND branch != '' GROUP BY branch", 'idx_tickets_branch'),
+    ("SELECT COUNT(CASE WHEN sla_resolution = 'Excedido' THEN 1 END) FROM tickets", 'idx_tickets_sla_resolution'),
+    ("SELECT 1 FROM tickets WHERE ticket_number = 1", 'sqlite_autoindex_tickets_1'),
+    ("SELECT * FROM tickets WHERE ticket_number < 1000 ORDER BY ticket_number DESC LIMIT 51",
+     'sqlite_autoindex_tickets_1'),
+    ("SELECT * FROM servers WHERE primary_service_ip = '10.0.0.1' OR secondary_service_ip = '10.0.0.1'",
+     'idx_servers_primary_ip'),
+    ("SELECT * FROM ticket_changes WHERE ticket_id = 1 ORDER BY id DESC", 'idx_ticket_changes_ticket_id'),
+    ("SELECT * FROM jobs WHERE status = 'queued' AND run_after <= '2024-01-01T00:00:00' ORDER BY run_after, id LIMIT 1",
+     'idx_jobs_status_run_after'),
+]
+
+
+def ensure_migrations_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    ''')
+    conn.commit()
+
+
+def applied_versions(conn):
+    ensure_migrations_table(conn)
+    return {row[0] for row in conn.execute('SELECT version FROM schema_migrations')}
+
+
+def migrate(conn=None, verbose=False):
+    """Aplica las migraciones pendientes en orden. Devuelve las versiones aplicadas."""
+    own_conn = conn is None
+    conn = conn or connect_db()
+    try:
+        done = applied_versions(conn)
+        applied = []
+        for version, name, migration in MIGRATIONS:
+            if version in done:
+                continue
+            # BEGIN explícito: sqlite3 no abre transacción por sí solo antes de un DDL
+            conn.execute('BEGIN')
+            try:
+                migration(conn)
+                conn.execute(
+                    'INSERT INTO schema_migrations (version, name, applied_at) VALUES (?, ?, ?)',
+                    (version, name, datetime.now().isoformat())
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            applied.append(version)
+            if verbose:
+                print(f"[MIGRACIÓN] {version}: {name} aplicada")
+        return applied
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def query_plan(conn, sql):
+    """Plan de `sql` según EXPLAIN QUERY PLAN, con sus pasos separados por ' | '."""
+    return ' | '.join(row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}'))
+
+
+def check_query_plans(conn):
+    """Devuelve las consultas cuyo plan no usa el índice esperado: [(sql, índice, plan)]."""
+    failures = []
+    for sql, index in QUERY_PLAN_CHECKS:
+        plan = query_plan(conn, sql)
+        if index not in plan:
+            failures.append((sql, index, plan))
+    return failures
+
+
+def main(args):
+    command = args[0] if args else 'migrate'
+    conn = connect_db()
+    try:
+        if command == 'migrate':
+            applied = migrate(conn, verbose=True)
+            print(f"{len(applied)} migraciones aplicadas." if applied else "El esquema está al día.")
+        elif command == 'status':
+            done = applied_versions(conn)
+            for version, name, _ in MIGRATIONS:
+                print(f"{'[x]' if version in done else '[ ]'} {version}: {name}")
+        elif command == 'schema':
+            tables = [row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+            for table in tables:
+                print(f"\n{table}")
+                for row in conn.execute(f"PRAGMA table_info({table})"):
+                    print(f"  {row[1]} {row[2]}")
+                for row in conn.execute(f"PRAGMA index_list({table})"):
+                    columns = [info[2] for info in conn.execute(f"PRAGMA index_info({row[1]})")]
+                    print(f"  índice {row[1]} ({', '.join(columns)})")
+        elif command == 'check':
+            failures = check_query_plans(conn)
+            for sql, index, plan in failures:
+                print(f"[FALLA] Se esperaba {index}\n  {sql}\n  plan: {plan}")
+            print(f"{len(QUERY_PLAN_CHECKS) - len(failures)}/{len(QUERY_PLAN_CHECKS)} consultas usan el índice esperado.")
+            return 1 if failures else 0
+        elif command == 'counters':
+            conn.execute('BEGIN')
+            rebuild_ticket_counters(conn)
+            conn.commit()
+            print("Contadores del dashboard recalculados.")
+        else:
+            print(__doc__)
+            return 2
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,264 @@
+import asyncio
+import random
+import threading
+import time
+from datetime import datetime
+
+
+class AdaptivePolicy:
+    """
+    Intervalo de sondeo adaptativo según la salud del enlace.
+
+    - healthy: tras `stable_after` sondeos sin pérdida ni latencia alta se
+      sondea cada `healthy_interval` segundos.
+    - degraded: con pérdida parcial, latencia sobre `degraded_latency` ms o
+      fallos aislados se sondea cada `degraded_interval` para detectar rápido.
+    - down: tras `down_after` sondeos fallidos seguidos el intervalo crece de
+      forma exponencial desde `degraded_interval` hasta `max_backoff`.
+
+    Recibe el resultado del sondeo tal como lo devuelve el probe: una lista de
+    intentos {'success', 'latency'}.
+    """
+
+    def __init__(self, healthy_interval=5.0, degraded_interval=1.0, max_backoff=60.0,
+                 stable_after=10, down_after=3, degraded_latency=None):
+        self.healthy_interval = healthy_interval
+        self.degraded_interval = degraded_interval
+        self.max_backoff = max(max_backoff, degraded_interval)
+        self.stable_after = stable_after
+        self.down_after = down_after
+        self.degraded_latency = degraded_latency
+
+    def next_interval(self, state, attempts):
+        """Actualiza el estado de salud con un sondeo y devuelve el próximo intervalo."""
+        attempts = attempts or []
+        latencies = [a['latency'] for a in attempts if a.get('success')]
+
+        if not latencies:
+            state['failures'] = state.get('failures', 0) + 1
+            state['stable'] = 0
+            if state['failures'] >= self.down_after:
+                state['health'] = 'down'
+                backoff = self.degraded_interval * 2 ** (state['failures'] - self.down_after + 1)
+                return min(self.max_backoff, backoff)
+            state['health'] = 'degraded'
+            return self.degraded_interval
+
+        state['failures'] = 0
+        slow = (self.degraded_latency is not None
+                and sum(latencies) / len(latencies) > self.degraded_latency)
+        if len(latencies) < len(attempts) or slow:
+            state['stable'] = 0
+            state['health'] = 'degraded'
+            return self.degraded_interval
+
+        state['stable'] = state.get('stable', 0) + 1
+        if state['stable'] >= self.stable_after:
+            state['health'] = 'healthy'
+            return self.healthy_interval
+        # Recuperándose: seguir sondeando rápido hasta confirmar estabilidad
+        state['health'] = 'degraded' if state.get('health') in ('degraded', 'down') else 'unknown'
+        return self.degraded_interval
+
+    def info(self):
+        return {
+            'healthy_interval': self.healthy_interval,
+            'degraded_interval': self.degraded_interval,
+            'max_backoff': self.max_backoff,
+            'stable_after': self.stable_after,
+            'down_after': self.down_after,
+            'degraded_latency': self.degraded_latency
+        }
+
+
+class MonitorTarget:
+    """Estado de planificación de una IP monitoreada."""
+
+    def __init__(self, ip, interval, policy=None):
+        self.ip = ip
+        self.interval = interval
+        self.policy = policy  # AdaptivePolicy opcional; sin ella el intervalo es fijo
+        self.policy_state = {'health': 'unknown'}
+        self.current_interval = interval
+        self.task = None
+        self.state = {}  # Estado propio del callback (contadores, latencias...)
+        self.started_at = time.time()
+        self.last_run = None
+        self.runs = 0
+        self.last_result = None
+        self.first_result = threading.Event()
+
+    def info(self):
+        return {
+            'ip': self.ip,
+            'interval': self.interval,
+            'started_at': datetime.fromtimestamp(self.started_at).isoformat(),
+            'last_run': datetime.fromtimestamp(self.last_run).isoformat() if self.last_run else None,
+            'runs': self.runs,
+            'current_interval': self.current_interval,
+            'health': self.policy_state.get('health'),
+            'policy': self.policy.info() if self.policy else None
+        }
+
+
+class MonitorScheduler:
+    """
+    Planificador único de monitoreo basado en asyncio.
+
+    Un solo event loop (en un hilo en segundo plano) ejecuta una corrutina
+    liviana por IP en lugar de un hilo del sistema por IP. Cada objetivo tiene
+    su propio intervalo (fijo o adaptativo, ver AdaptivePolicy), con jitter para
+    no disparar todos los pings a la vez, y un semáforo limita cuántos sondeos
+    corren en paralelo.
+
+    Args:
+        probe: corrutina `probe(ip)` que realiza el sondeo y devuelve su resultado
+        on_result: función `on_result(ip, state, result)` llamada en el loop con
+            cada resultado; su valor de retorno queda en `target.last_result`
+        on_stop: función opcional `on_stop(ip)` llamada al detener un objetivo
+        max_concurrency: máximo de sondeos simultáneos
+        jitter: fracción del intervalo usada como variación aleatoria
+    """
+
+    def __init__(self, probe, on_result, on_stop=None, max_concurrency=64, jitter=0.1):
+        self.probe = probe
+        self.on_result = on_result
+        self.on_stop = on_stop
+        self.max_concurrency = max_concurrency
+        self.jitter = jitter
+        self.targets = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._semaphore = None
+
+    def _ensure_loop(self):
+        """Arranca el event loop en segundo plano la primera vez que se necesita."""
+        with self._lock:
+            if self._loop is not None:
+                return self._loop
+            ready = threading.Event()
+
+            def run():
+                self._loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(self._loop)
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                ready.set()
+                self._loop.run_forever()
+
+            self._thread = threading.Thread(target=run, daemon=True, name="MonitorScheduler")
+            self._thread.start()
+            ready.wait()
+            return self._loop
+
+    def _next_delay(self, interval):
+        return max(0.05, interval * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    async def _run_target(self, target):
+        try:
+            # Desfase inicial aleatorio para repartir los objetivos dentro del intervalo
+            await asyncio.sleep(random.uniform(0, min(target.interval, 1.0)))
+            while True:
+                started = time.monotonic()
+                interval = target.interval
+                try:
+                    async with self._semaphore:
+                        result = await self.probe(target.ip)
+                    target.last_result = self.on_result(target.ip, target.state, result)
+                    if target.policy is not None:
+                        interval = target.policy.next_interval(target.policy_state, result)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"[MonitorScheduler] Error en el sondeo de {target.ip}: {str(e)}")
+                target.current_interval = interval
+                target.runs += 1
+                target.last_run = time.time()
+                target.first_result.set()
+
+                # Programación a ritmo fijo: descontar lo que tardó el sondeo
+                elapsed = time.monotonic() - started
+                await asyncio.sleep(max(0, self._next_delay(interval) - elapsed))
+        finally:
+            if self.on_stop:
+                try:
+                    self.on_stop(target.ip)
+                except Exception as e:
+                    print(f"[MonitorScheduler] Error al finalizar {target.ip}: {str(e)}")
+
+    def start(self, ip, interval=1.0, policy=None):
+        """
+        Comienza a monitorear una IP. Devuelve False si ya estaba en curso.
+        Con `policy` el intervalo se adapta a la salud del enlace; `interval`
+        sólo se usa si el sondeo falla con una excepción.
+        """
+        loop = self._ensure_loop()
+        with self._lock:
+            if ip in self.targets:
+                return False
+            target = MonitorTarget(ip, interval, policy)
+            self.targets[ip] = target
+
+        def create_task():
+            target.task = loop.create_task(self._run_target(target))
+
+        loop.call_soon_threadsafe(create_task)
+        return True
+
+    def stop(self, ip, timeout=2):
+        """Detiene el monitoreo de una IP y espera a que su tarea termine."""
+        with self._lock:
+            target = self.targets.pop(ip, None)
+        if target is None or self._loop is None:
+            return False
+
+        async def cancel():
+            # La tarea puede no haberse creado todavía si start() fue inmediato
+            while target.task is None:
+                await asyncio.sleep(0)
+            target.task.cancel()
+            try:
+                await target.task
+            except asyncio.CancelledError:
+                pass
+
+        future = asyncio.run_coroutine_threadsafe(cancel(), self._loop)
+        try:
+            future.result(timeout=timeout)
+        except Exception as e:
+            print(f"[MonitorScheduler] La tarea de {ip} no terminó correctamente: {str(e)}")
+        return True
+
+    def stop_all(self):
+        for ip in list(self.targets):
+            self.stop(ip)
+
+    def list(self):
+        """Lista los objetivos monitoreados con su estado de planificación."""
+        with self._lock:
+            targets = list(self.targets.values())
+        return [target.info() for target in targets]
+
+    def get(self, ip):
+        return self.targets.get(ip)
+
+    def set_policy(self, ip, policy):
+        """Cambia la política de una IP en curso; rige desde el próximo sondeo."""
+        target = self.targets.get(ip)
+        if target is None:
+            return False
+        target.policy = policy
+        return True
+
+    def wait_first_result(self, ip, timeout=10):
+        """Espera el primer resultado de una IP. Devuelve None si no llegó a tiempo."""
+        target = self.targets.get(ip)
+        if target is None or not target.first_result.wait(timeout):
+            return None
+        return target.last_result
+
+    def __contains__(self, ip):
+        return ip in self.targets
+
+    def __len__(self):
+        return len(self.targets)
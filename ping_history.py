@@ -0,0 +1,423 @@
+import atexit
+import math
+import sqlite3
+import threading
+import time
+from array import array
+from collections import deque
+
+from db import apply_pragmas, get_pool
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS ping_samples (
+        ip TEXT NOT NULL,
+        ts REAL NOT NULL,
+        latency REAL,
+        sent INTEGER NOT NULL,
+        received INTEGER NOT NULL,
+        error TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_ping_samples_ip_ts ON ping_samples (ip, ts);
+    CREATE INDEX IF NOT EXISTS idx_ping_samples_ts ON ping_samples (ts);
+
+    CREATE TABLE IF NOT EXISTS ping_rollups (
+        ip TEXT NOT NULL,
+        resolution INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        samples INTEGER NOT NULL,
+        sent INTEGER NOT NULL,
+        received INTEGER NOT NULL,
+        latency_count INTEGER NOT NULL,
+        latency_sum REAL NOT NULL,
+        min REAL,
+        max REAL,
+        p95 REAL,
+        histogram BLOB NOT NULL,
+        PRIMARY KEY (ip, resolution, bucket)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_ping_rollups_resolution_bucket ON ping_rollups (resolution, bucket);
+'''
+
+# Resoluciones de los rollups en segundos (0 representa las muestras crudas)
+RAW = 0
+RESOLUTIONS = (60, 3600, 86400)
+
+# Segundos que se conserva cada resolución (None = sin límite)
+DEFAULT_RETENTION = {
+    RAW: 2 * 86400,
+    60: 14 * 86400,
+    3600: 180 * 86400,
+    86400: None
+}
+
+# Histograma logarítmico de latencias: de 0.01 ms a ~10 s con bins de 10%
+HISTOGRAM_MIN = 0.01
+HISTOGRAM_RATIO = 1.1
+HISTOGRAM_BINS = int(math.log(1e6) / math.log(HISTOGRAM_RATIO)) + 2
+
+
+def _histogram_bin(latency):
+    if latency <= HISTOGRAM_MIN:
+        return 0
+    return min(HISTOGRAM_BINS - 1, int(math.log(latency / HISTOGRAM_MIN) / math.log(HISTOGRAM_RATIO)) + 1)
+
+
+def histogram_percentile(counts, fraction, low=None, high=None):
+    """Percentil aproximado (error < 10%) a partir de los conteos del histograma."""
+    total = sum(counts)
+    if not total:
+        return None
+    target = fraction * total
+    cumulative = 0
+    for index, count in enumerate(counts):
+        cumulative += count
+        if count and cumulative >= target:
+            # Punto medio geométrico del bin, acotado por los extremos reales
+            value = HISTOGRAM_MIN * HISTOGRAM_RATIO ** (index - 0.5) if index else HISTOGRAM_MIN
+            if low is not None:
+                value = max(low, value)
+            if high is not None:
+                value = min(high, value)
+            return value
+    return high
+
+
+class RollupBucket:
+    """Acumulador de un intervalo (IP, resolución, inicio) con estadísticas combinables."""
+
+    __slots__ = ('samples', 'sent', 'received', 'latency_count', 'latency_sum', 'min', 'max', 'counts')
+
+    def __init__(self):
+        self.samples = 0
+        self.sent = 0
+        self.received = 0
+        self.latency_count = 0
+        self.latency_sum = 0.0
+        self.min = None
+        self.max = None
+        self.counts = array('I', bytes(4 * HISTOGRAM_BINS))
+
+    @classmethod
+    def from_row(cls, row):
+        bucket = cls()
+        (bucket.samples, bucket.sent, bucket.received, bucket.latency_count,
+         bucket.latency_sum, bucket.min, bucket.max, histogram) = row
+        bucket.counts = array('I', histogram)
+        return bucket
+
+    def add(self, latency, sent, received):
+        self.samples += 1
+        self.sent += sent
+        self.received += received
+        if latency is not None:
+            self.latency_count += 1
+            self.latency_sum += latency
+            self.min = latency if self.min is None else min(self.min, latency)
+            self.max = latency if self.max is None else max(self.max, latency)
+            self.counts[_histogram_bin(latency)] += 1
+
+    def merge(self, other):
+        self.samples += other.samples
+        self.sent += other.sent
+        self.received += other.received
+        self.latency_count += other.latency_count
+        self.latency_sum += other.latency_sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+
+    @property
+    def avg(self):
+        return self.latency_sum / self.latency_count if self.latency_count else None
+
+    @property
+    def loss(self):
+        return (self.sent - self.received) / self.sent * 100 if self.sent else None
+
+    @property
+    def p95(self):
+        return histogram_percentile(self.counts, 0.95, self.min, self.max)
+
+    def to_row(self, ip, resolution, start):
+        return (ip, resolution, start, self.samples, self.sent, self.received, self.latency_count,
+                self.latency_sum, self.min, self.max, self.p95, self.counts.tobytes())
+
+
+class PingHistoryStore:
+    """
+    Histórico persistente de sondeos de ping en SQLite (modo WAL).
+
+    `record()` sólo agrega la muestra a un buffer en memoria, así que el loop
+    de monitoreo nunca espera al disco. Un hilo escritor vacía el buffer cada
+    `flush_interval` segundos con un único INSERT masivo por transacción. Si
+    el disco no da abasto, el buffer descarta las muestras más antiguas en
+    lugar de crecer sin límite (ver `dropped`).
+
+    En la misma transacción se actualizan incrementalmente los rollups de 1
+    minuto, 1 hora y 1 día (min/avg/max/p95 y pérdida). Los intervalos abiertos
+    viven en memoria y se reescriben en cada vaciado; al cerrarse se liberan.
+    Cada resolución se purga según `retention` y las consultas eligen la
+    resolución más fina que cubra el rango sin superar `max_points`.
+
+    Sólo el hilo escritor vacía el buffer y escribe, con su propia conexión.
+    Las consultas leen lo ya confirmado (hasta `flush_interval` segundos de
+    atraso) con conexiones del pool de db.py, así su cantidad queda acotada
+    sin importar cuántos hilos atiendan requests; con WAL los lectores no
+    bloquean al escritor ni viceversa.
+    """
+
+    def __init__(self, path='ping_history.db', flush_interval=1.0, max_buffer=100000,
+                 retention=None, sample_interval=1.0, prune_interval=600):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.retention = {**DEFAULT_RETENTION, **(retention or {})}
+        self.sample_interval = sample_interval  # Intervalo típico entre muestras crudas
+        self.prune_interval = prune_interval
+        self.dropped = 0
+        self._buffer = deque(maxlen=max_buffer)
+        self._retry = []  # Muestras de un vaciado fallido (anteriores a las del buffer)
+        self._buckets = {}  # (ip, resolución, inicio) -> RollupBucket de los intervalos abiertos
+        self._flush_lock = threading.Lock()  # Serializa los vaciados del buffer
+        self._closed = threading.Event()
+        self._pool = get_pool(path)
+
+        # Conexión del escritor (flush y prune), siempre bajo _flush_lock
+        self._write_conn = conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+        self._writer = threading.Thread(target=self._writer_loop, daemon=True, name="PingHistory-writer")
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        return apply_pragmas(conn)
+
+    def _read(self, sql, params):
+        """Ejecuta una consulta de lectura con una conexión prestada del pool."""
+        conn = self._pool.acquire()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def record(self, ip, latency, sent, received, error=None, ts=None):
+        """
+        Encola el resultado de un sondeo sin tocar el disco.
+
+        Args:
+            ip (str): IP sondeada
+            latency (float): latencia promedio en ms, None si el sondeo falló
+            sent (int): paquetes enviados
+            received (int): respuestas recibidas
+            error (str): último error si no hubo respuesta
+            ts (float): marca de tiempo epoch (por defecto, ahora)
+        """
+        if len(self._buffer) == self.max_buffer:
+            self.dropped += 1
+        self._buffer.append((ip, ts if ts is not None else time.time(), latency, sent, received, error))
+
+    def _bucket(self, conn, key):
+        """Acumulador de un intervalo; si no está en memoria se retoma desde la base."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            row = conn.execute(
+                '''SELECT samples, sent, received, latency_count, latency_sum, min, max, histogram
+                   FROM ping_rollups WHERE ip = ? AND resolution = ? AND bucket = ?''', key
+            ).fetchone()
+            bucket = self._buckets[key] = RollupBucket.from_row(row) if row else RollupBucket()
+        return bucket
+
+    def flush(self):
+        """Escribe en disco todo lo pendiente. Devuelve la cantidad de muestras escritas."""
+        with self._flush_lock:
+            rows, self._retry = self._retry, []
+            while self._buffer:
+                rows.append(self._buffer.popleft())
+            # Tras vaciados fallidos lo pendiente puede superar el límite: se descartan las más antiguas
+            overflow = len(rows) - self.max_buffer
+            if overflow > 0:
+                del rows[:overflow]
+                self.dropped += overflow
+                print(f"[PingHistory] Se descartaron {overflow} muestras antiguas pendientes de escribir")
+            if not rows:
+                return 0
+            conn = self._write_conn
+            touched = set()
+            try:
+                with conn:
+                    conn.executemany(
+                        'INSERT INTO ping_samples (ip, ts, latency, sent, received, error) VALUES (?, ?, ?, ?, ?, ?)',
+                        rows
+                    )
+                    for ip, ts, latency, sent, received, _ in rows:
+                        for resolution in RESOLUTIONS:
+                            key = (ip, resolution, int(ts // resolution) * resolution)
+                            self._bucket(conn, key).add(latency, sent, received)
+                            touched.add(key)
+                    conn.executemany(
+                        'INSERT OR REPLACE INTO ping_rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        [self._buckets[key].to_row(*key) for key in touched]
+                    )
+            except sqlite3.Error as e:
+                # La transacción se revirtió: descartar los acumuladores tocados (se
+                # retoman desde la base) y guardar las muestras para el próximo vaciado.
+                # No vuelven al buffer: en un deque lleno extendleft() descartaría las más nuevas
+                for key in touched:
+                    self._buckets.pop(key, None)
+                self._retry = rows
+                print(f"[PingHistory] Error escribiendo {len(rows)} muestras (se reintentan): {str(e)}")
+                return 0
+
+            # Liberar los intervalos ya cerrados (con margen para muestras demoradas)
+            horizon = time.time() - 5 * self.flush_interval
+            for key in [key for key in self._buckets if key[2] + key[1] < horizon]:
+                del self._buckets[key]
+            return len(rows)
+
+    def prune(self):
+        """Elimina los datos que superaron la retención de cada resolución."""
+        now = time.time()
+        conn = self._write_conn
+        deleted = 0
+        with self._flush_lock, conn:
+            keep = self.retention.get(RAW)
+            if keep is not None:
+                deleted += conn.execute('DELETE FROM ping_samples WHERE ts < ?', (now - keep,)).rowcount
+            for resolution in RESOLUTIONS:
+                keep = self.retention.get(resolution)
+                if keep is not None:
+                    deleted += conn.execute(
+                        'DELETE FROM ping_rollups WHERE resolution = ? AND bucket < ?',
+                        (resolution, now - keep - resolution)
+                    ).rowcount
+        return deleted
+
+    def _writer_loop(self):
+        last_prune = 0
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+            if time.monotonic() - last_prune >= self.prune_interval:
+                last_prune = time.monotonic()
+                try:
+                    self.prune()
+                except sqlite3.Error as e:
+                    print(f"[PingHistory] Error aplicando la retención: {str(e)}")
+
+    def choose_resolution(self, start, end, max_points=500):
+        """Resolución más fina que tenga datos para `start` y no supere `max_points` puntos."""
+        now = time.time()
+        span = max(1.0, (end if end is not None else now) - start)
+        for resolution in (RAW,) + RESOLUTIONS:
+            keep = self.retention.get(resolution)
+            if keep is not None and start < now - keep:
+                continue
+            if span / max(resolution, self.sample_interval) <= max_points:
+                return resolution
+        return RESOLUTIONS[-1]
+
+    @staticmethod
+    def _range(column, start, end):
+        sql, params = '', []
+        if start is not None:
+            sql += f' AND {column} >= ?'
+            params.append(start)
+        if end is not None:
+            sql += f' AND {column} <= ?'
+            params.append(end)
+        return sql, params
+
+    def query(self, ip, start=None, end=None, limit=10000):
+        """
+        Muestras crudas de una IP en el rango [start, end] (epoch), en orden cronológico.
+        Sólo las ya escritas: las del buffer aparecen tras el próximo vaciado.
+        """
+        where, params = self._range('ts', start, end)
+        rows = self._read(
+            f'SELECT ts, latency, sent, received, error FROM ping_samples WHERE ip = ?{where} ORDER BY ts LIMIT ?',
+            [ip] + params + [limit]
+        )
+        return [
+            {'ts': ts, 'latency': latency, 'sent': sent, 'received': received, 'error': error}
+            for ts, latency, sent, received, error in rows
+        ]
+
+    def _rollups(self, ip, resolution, start, end, limit=None):
+        # Incluir el intervalo que contiene a `start` aunque empiece antes
+        where, params = self._range('bucket', start - resolution if start is not None else None, end)
+        sql = f'''SELECT bucket, samples, sent, received, latency_count, latency_sum, min, max, histogram
+                  FROM ping_rollups WHERE ip = ? AND resolution = ?{where} ORDER BY bucket'''
+        params = [ip, resolution] + params
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        rows = self._read(sql, params)
+        return [(row[0], RollupBucket.from_row(row[1:])) for row in rows
+                if start is None or row[0] + resolution > start]
+
+    def history(self, ip, start, end=None, resolution=None, max_points=500, limit=10000):
+        """
+        Serie de una IP con la resolución indicada o, si es None, la elegida por
+        `choose_resolution`. Devuelve (resolución, puntos) donde cada punto tiene
+        ts, samples, min, avg, max, p95 y loss.
+        """
+        if resolution is None:
+            resolution = self.choose_resolution(start, end, max_points)
+        if resolution == RAW:
+            points = [{
+                'ts': sample['ts'],
+                'samples': 1,
+                'min': sample['latency'],
+                'avg': sample['latency'],
+                'max': sample['latency'],
+                'p95': sample['latency'],
+                'loss': (sample['sent'] - sample['received']) / sample['sent'] * 100 if sample['sent'] else None,
+                'error': sample['error']
+            } for sample in self.query(ip, start, end, limit)]
+            return resolution, points
+
+        points = [{
+            'ts': bucket_start,
+            'samples': bucket.samples,
+            'min': bucket.min,
+            'avg': bucket.avg,
+            'max': bucket.max,
+            'p95': bucket.p95,
+            'loss': bucket.loss
+        } for bucket_start, bucket in self._rollups(ip, resolution, start, end, limit)]
+        return resolution, points
+
+    def summary(self, ip, start=None, end=None, resolution=None):
+        """Totales del rango: muestras, pérdida y latencia mínima/promedio/máxima/p95."""
+        if resolution is None:
+            resolution = self.choose_resolution(start, end) if start is not None else RESOLUTIONS[-1]
+        total = RollupBucket()
+        if resolution == RAW:
+            where, params = self._range('ts', start, end)
+            for latency, sent, received in self._read(
+                    f'SELECT latency, sent, received FROM ping_samples WHERE ip = ?{where}', [ip] + params):
+                total.add(latency, sent, received)
+        else:
+            for _, bucket in self._rollups(ip, resolution, start, end):
+                total.merge(bucket)
+        return {
+            'samples': total.samples,
+            'sent': total.sent,
+            'received': total.received,
+            'loss': total.loss,
+            'min': total.min,
+            'avg': total.avg,
+            'max': total.max,
+            'p95': total.p95
+        }
+
+    def close(self):
+        if not self._closed.is_set():
+            self._closed.set()
+            self._writer.join(self.flush_interval + 5)
+            self.flush()
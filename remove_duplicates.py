@@ -1,8 +1,8 @@
-import sqlite3
+from db import connect as connect_db
 import sys
 
 def get_duplicates():
-    conn = sqlite3.connect('tickets.db')
+    conn = connect_db()
     cursor = conn.cursor()
     
     # Encontrar tickets duplicados (mismo ticket_number)
@@ -18,7 +18,7 @@ def get_duplicates():
     return duplicates
 
 def remove_duplicates():
-    conn = sqlite3.connect('tickets.db')
+    conn = connect_db()
     cursor = conn.cursor()
     
     # Obtener los duplicados
@@ -0,0 +1,115 @@
+import threading
+import time
+from functools import wraps
+
+from flask import Response, current_app, request
+
+
+class ResponseCache:
+    """
+    Caché en memoria de respuestas GET completas.
+
+    Cada entrada se guarda por endpoint y parámetros de la consulta, con una
+    o más etiquetas ('tickets', ...). Las rutas que escriben llaman a
+    `invalidate(tag)` y las entradas de esa etiqueta se descartan al instante;
+    el TTL es la red de seguridad para escritores fuera del proceso (el
+    escáner de correo corre en ticket_service.py). Cada etiqueta lleva un
+    contador de generación: una respuesta calculada mientras se invalidaba
+    su etiqueta no se guarda, para no volver a cachear datos viejos.
+
+    Args:
+        ttl: segundos que vive una entrada si nadie la invalida
+        max_entries: entradas máximas; al llenarse se descarta la más vieja
+    """
+
+    def __init__(self, ttl=60, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = {}  # clave -> (expira, etiquetas, body, status, mimetype)
+        self.generations = {}  # etiqueta -> invalidaciones (None = invalidaciones totales)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(endpoint, args):
+        return (endpoint, tuple(sorted(args.items(multi=True))))
+
+    def get(self, key):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def generation(self, tags):
+        """Marca de las invalidaciones de `tags` hasta ahora; se pasa a set() para descartar datos viejos."""
+        with self._lock:
+            return tuple(self.generations.get(tag, 0) for tag in (None, *tags))
+
+    def set(self, key, tags, body, status, mimetype, ttl=None, generation=None):
+        """Guarda una respuesta; no hace nada si sus etiquetas se invalidaron después de `generation`."""
+        expires = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            if generation is not None and generation != tuple(self.generations.get(tag, 0) for tag in (None, *tags)):
+                return False
+            if key not in self.entries and len(self.entries) >= self.max_entries:
+                del self.entries[min(self.entries, key=lambda k: self.entries[k][0])]
+            self.entries[key] = (expires, frozenset(tags), body, status, mimetype)
+            return True
+
+    def invalidate(self, tag=None):
+        """Descarta las entradas con la etiqueta dada (todas si tag es None)."""
+        with self._lock:
+            self.generations[tag] = self.generations.get(tag, 0) + 1
+            if tag is None:
+                self.entries.clear()
+            else:
+                for key in [k for k, entry in self.entries.items() if tag in entry[1]]:
+                    del self.entries[key]
+            self.invalidations += 1
+
+    def cached(self, *tags, ttl=None):
+        """
+        Decorador para vistas GET. Sólo se guardan respuestas 200; el header
+        X-Cache indica si la respuesta salió de la caché.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method != 'GET':
+                    return view(*args, **kwargs)
+                key = self.make_key(request.endpoint, request.args)
+                entry = self.get(key)
+                if entry is not None:
+                    _, _, body, status, mimetype = entry
+                    response = Response(body, status=status, mimetype=mimetype)
+                    response.headers['X-Cache'] = 'HIT'
+                    return response
+
+                generation = self.generation(tags)  # Antes de leer: una escritura durante la vista la invalida
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.is_streamed:
+                    self.set(key, tags, response.get_data(), response.status_code, response.mimetype, ttl,
+                             generation)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0,
+                'invalidations': self.invalidations,
+                'ttl': self.ttl,
+            }
@@ -0,0 +1,208 @@
+import json
+import threading
+import time
+from datetime import date
+
+
+def _json_default(value):
+    # Las entradas de la caché guardan fechas como datetime
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class StatusSubscriber:
+    """
+    Cola acotada de un cliente del stream de estado.
+
+    Los cambios se coalescen por IP: si llegan varias actualizaciones de la
+    misma IP antes de enviarlas, sólo se conserva la última. Si el cliente
+    acumula más de `max_pending` IPs distintas se descarta todo y se le
+    reenvía el estado completo en lugar de crecer sin límite.
+    """
+
+    def __init__(self, max_pending=1000):
+        self.max_pending = max_pending
+        self.pending = {}  # IP -> JSON del snapshot (None si se eliminó)
+        self.version = 0
+        self.overflow = False
+        self.closed = False
+        self._cond = threading.Condition()
+
+    def push(self, ip, data, version):
+        with self._cond:
+            if not self.overflow:
+                if ip not in self.pending and len(self.pending) >= self.max_pending:
+                    self.overflow = True
+                    self.pending.clear()
+                else:
+                    self.pending[ip] = data
+            self.version = max(self.version, version)
+            self._cond.notify()
+
+    def wait(self, timeout):
+        """Espera cambios hasta `timeout` segundos. Devuelve (pendientes, desborde, versión)."""
+        with self._cond:
+            if not self.pending and not self.overflow and not self.closed:
+                self._cond.wait(timeout)
+            pending, self.pending = self.pending, {}
+            overflow, self.overflow = self.overflow, False
+            return pending, overflow, self.version
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+
+
+class StatusBroadcaster:
+    """
+    Difusión en proceso de los cambios de la caché de pings por Server-Sent Events.
+
+    El monitoreo llama a `publish()` en cada actualización desde su event loop:
+    sólo se anota el cambio (el último por IP) y un hilo propio lo serializa
+    una sola vez, lo publica en Redis y lo reparte a la cola de cada cliente
+    conectado, así un Redis lento no frena los sondeos.
+    Cada stream envía como mucho un evento cada `min_interval` segundos con
+    todos los cambios acumulados, y un comentario de heartbeat si no hubo
+    cambios en `heartbeat` segundos.
+
+    Con `attach_redis()` los cambios se publican en un canal de Redis y cada
+    proceso reparte a sus clientes lo que recibe del canal (despliegues con
+    varios procesos). Sin Redis todo funciona dentro del proceso.
+
+    Args:
+        snapshot: función que devuelve (versión, {ip: snapshot}) con el estado completo
+        expand: función expand(ip, snapshot) que completa un snapshot antes de
+            enviarlo (se llama desde el hilo de salida)
+        min_interval: separación mínima entre eventos de un mismo cliente
+        heartbeat: segundos sin eventos tras los cuales se envía un heartbeat
+        max_pending: IPs distintas acumuladas por cliente antes de reenviar todo
+    """
+
+    def __init__(self, snapshot, min_interval=0.25, heartbeat=15, max_pending=1000, expand=None):
+        self.snapshot = snapshot
+        self.expand = expand
+        self.min_interval = min_interval
+        self.heartbeat = heartbeat
+        self.max_pending = max_pending
+        self.subscribers = set()
+        self._lock = threading.Lock()
+        self._redis = None
+        self._channel = None
+        self._outbox = {}  # IP -> (snapshot, versión) a publicar por el hilo de salida
+        self._outbox_cond = threading.Condition()
+        self._publisher = None
+
+    def subscribe(self):
+        subscriber = StatusSubscriber(self.max_pending)
+        with self._lock:
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self.subscribers.discard(subscriber)
+        subscriber.close()
+
+    def publish(self, ip, snapshot, version):
+        """
+        Notifica el cambio de una IP (`snapshot` None si dejó de monitorearse).
+        No bloquea: el envío lo hace el hilo de salida (ver _publish_loop).
+        """
+        if self._redis is None and not self.subscribers:
+            return
+        with self._outbox_cond:
+            self._outbox[ip] = (snapshot, version)
+            if self._publisher is None:
+                self._publisher = threading.Thread(target=self._publish_loop, daemon=True,
+                                                   name="StatusBroadcaster-publisher")
+                self._publisher.start()
+            self._outbox_cond.notify()
+
+    def _publish_loop(self):
+        """Serializa y envía los cambios anotados; los de una misma IP que se acumulen se coalescen."""
+        while True:
+            with self._outbox_cond:
+                while not self._outbox:
+                    self._outbox_cond.wait()
+                outbox, self._outbox = self._outbox, {}
+            for ip, (snapshot, version) in outbox.items():
+                try:
+                    self._send(ip, snapshot, version)
+                except Exception as e:
+                    print(f"[SSE] Error difundiendo el estado de {ip}: {str(e)}")
+
+    def _send(self, ip, snapshot, version):
+        if snapshot is not None and self.expand is not None:
+            snapshot = self.expand(ip, snapshot)
+        data = json.dumps(snapshot, default=_json_default) if snapshot is not None else None
+        if self._redis is not None:
+            try:
+                self._redis.publish(self._channel, json.dumps({'ip': ip, 'data': data, 'version': version}))
+                return
+            except Exception as e:
+                print(f"[SSE] Error publicando en Redis, se reparte sólo localmente: {str(e)}")
+        self._dispatch(ip, data, version)
+
+    def _dispatch(self, ip, data, version):
+        with self._lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.push(ip, data, version)
+
+    def attach_redis(self, client, channel='status:ping_cache'):
+        """Usa Redis como canal de difusión entre procesos."""
+        self._redis = client
+        self._channel = channel
+        threading.Thread(target=self._redis_listener, daemon=True, name="StatusBroadcaster-redis").start()
+
+    def _redis_listener(self):
+        while self._redis is not None:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._channel)
+                for message in pubsub.listen():
+                    payload = json.loads(message['data'])
+                    self._dispatch(payload['ip'], payload['data'], payload['version'])
+            except Exception as e:
+                print(f"[SSE] Conexión con Redis perdida ({e}). Reintentando en 5 segundos...")
+                time.sleep(5)
+
+    @staticmethod
+    def _event(name, data, event_id=None):
+        lines = [f"event: {name}"]
+        if event_id is not None:
+            lines.append(f"id: {event_id}")
+        lines.append(f"data: {data}")
+        return '\n'.join(lines) + '\n\n'
+
+    def _snapshot_event(self):
+        version, servers = self.snapshot()
+        return self._event('snapshot', json.dumps({'version': version, 'servers': servers}, default=_json_default), version)
+
+    def stream(self, subscriber):
+        """Generador de eventos SSE para un cliente; lo desuscribe al terminar."""
+        try:
+            yield "retry: 3000\n\n"
+            yield self._snapshot_event()
+            while not subscriber.closed:
+                pending, overflow, version = subscriber.wait(self.heartbeat)
+                if overflow:
+                    yield self._snapshot_event()
+                elif pending:
+                    # Los snapshots ya vienen serializados: sólo se arma el sobre
+                    changed = ','.join(f"{json.dumps(ip)}:{data}" for ip, data in pending.items() if data is not None)
+                    removed = ','.join(json.dumps(ip) for ip, data in pending.items() if data is None)
+                    yield self._event('update', f'{{"version":{version},"changed":{{{changed}}},"removed":[{removed}]}}', version)
+                else:
+                    yield ": heartbeat\n\n"
+                    continue
+
+                # Limitar la frecuencia de eventos: lo que llegue mientras tanto se coalesce
+                time.sleep(self.min_interval)
+        finally:
+            self.unsubscribe(subscriber)
+
+    def __len__(self):
+        return len(self.subscribers)
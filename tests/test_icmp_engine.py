@@ -0,0 +1,43 @@
+import asyncio
+import socket
+
+import pytest
+
+from icmp_engine import ICMPEngine
+
+
+def _icmp_allowed():
+    for kind in (socket.SOCK_DGRAM, socket.SOCK_RAW):
+        try:
+            socket.socket(socket.AF_INET, kind, socket.IPPROTO_ICMP).close()
+            return True
+        except OSError:
+            pass
+    return False
+
+
+pytestmark = pytest.mark.skipif(not _icmp_allowed(), reason="sin permiso para sockets ICMP (ni DGRAM ni raw)")
+
+
+@pytest.fixture
+def engine():
+    engine = ICMPEngine()
+    yield engine
+    engine.close()
+
+
+def test_ping_loopback(engine):
+    result = engine.ping('127.0.0.1', timeout=2)
+    assert result['success'], result
+    assert result['latency'] >= 0
+
+
+def test_ping_async_resolves_hostname(engine):
+    result = asyncio.run(engine.ping_async('localhost', timeout=2))
+    assert result['success'], result
+
+
+def test_ping_async_unknown_host(engine):
+    result = asyncio.run(engine.ping_async('host-inexistente.invalid', timeout=1))
+    assert not result['success']
+    assert result['error'] == 'Nombre de host desconocido'
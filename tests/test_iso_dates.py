@@ -0,0 +1,33 @@
+import sqlite3
+
+import pytest
+
+from migrations import iso_datetime_sql, migrate
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2024-03-06', '2024-03-06 00:00:00'),
+    ('2024-03-06T10:30:00', '2024-03-06 10:30:00'),
+    ('2024-3-6', '2024-03-06 00:00:00'),
+    ('2024-3-06 10:30', '2024-03-06 10:30:00'),
+    ('06/03/2024', '2024-03-06 00:00:00'),
+    ('6-3-2024 08:00', '2024-03-06 08:00:00'),
+    ('2024-2-30', None),
+    ('31/02/2024', None),
+    ('abc', None),
+])
+def test_iso_datetime_sql(value, expected):
+    conn = sqlite3.connect(':memory:')
+    assert conn.execute(f"SELECT {iso_datetime_sql('?1')}", (value,)).fetchone()[0] == expected
+
+
+def test_single_digit_iso_dates_are_normalized(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'tickets.db')
+    migrate(conn)
+    conn.execute("INSERT INTO tickets (ticket_number, creation_date, close_date) VALUES (1, '2024-3-6', '2024-3-16 9:05')")
+    conn.commit()
+    assert conn.execute("SELECT created_at, closed_at FROM tickets").fetchone() == \
+        ('2024-03-06 00:00:00', '2024-03-16 09:05:00')
+    assert conn.execute(
+        "SELECT total FROM ticket_counters WHERE dimension = 'month' AND value = '2024-03'"
+    ).fetchone() == (1,)
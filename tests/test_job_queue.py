@@ -0,0 +1,145 @@
+import sqlite3
+import threading
+from functools import partial
+
+import pytest
+
+from db import connect
+from job_queue import JobQueue, _now
+from migrations import migrate
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    conn.close()
+    return path
+
+
+def make_queue(db_path, **kwargs):
+    return JobQueue(partial(connect, db_path), **kwargs)
+
+
+def job_row(db_path, job_id):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return dict(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+    finally:
+        conn.close()
+
+
+def test_concurrent_claimers_never_share_a_job(db_path):
+    queues = [make_queue(db_path) for _ in range(2)]
+    for queue in queues:
+        queue.register('noop')(lambda job: None)
+    ids = [queues[0].enqueue('noop') for _ in range(40)]
+
+    claimed = []
+    lock = threading.Lock()
+
+    def claim_all(queue):
+        while True:
+            row = queue._claim()
+            if row is None:
+                return
+            with lock:
+                claimed.append(row['id'])
+
+    threads = [threading.Thread(target=claim_all, args=(queues[n % 2],)) for n in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(claimed) == ids
+    assert all(job_row(db_path, job_id)['status'] == 'running' for job_id in ids)
+
+
+def test_failure_is_retried_later_until_max_attempts(db_path):
+    queue = make_queue(db_path)
+
+    @queue.register('flaky', max_attempts=2, retry_delay=30)
+    def flaky(job):
+        raise RuntimeError('falla')
+
+    job_id = queue.enqueue('flaky')
+    queue._execute(queue._claim())
+
+    row = job_row(db_path, job_id)
+    assert row['status'] == 'queued'
+    assert row['attempts'] == 1
+    assert row['error'] == 'falla'
+    assert row['run_after'] > _now(20)
+    assert queue._claim() is None  # Todavía no venció run_after
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE jobs SET run_after = ? WHERE id = ?", (_now(-1), job_id))
+    conn.commit()
+    conn.close()
+    queue._execute(queue._claim())
+
+    row = job_row(db_path, job_id)
+    assert row['status'] == 'error'
+    assert row['attempts'] == 2
+
+
+@pytest.mark.parametrize('max_attempts, expected', [(2, 'queued'), (1, 'error')])
+def test_stale_heartbeat_is_recovered(db_path, max_attempts, expected):
+    queue = make_queue(db_path, stale_after=60)
+    queue.register('slow', max_attempts=max_attempts)(lambda job: None)
+    job_id = queue.enqueue('slow')
+    assert queue._claim()['id'] == job_id
+
+    # Un heartbeat reciente no se toca
+    queue._recover_stale()
+    assert job_row(db_path, job_id)['status'] == 'running'
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (_now(-120), job_id))
+    conn.commit()
+    conn.close()
+    queue._recover_stale()
+
+    row = job_row(db_path, job_id)
+    assert row['status'] == expected
+    assert row['error'] == 'Interrumpido'
+
+
+def test_cancel_queued_job(db_path):
+    queue = make_queue(db_path)
+    queue.register('noop')(lambda job: None)
+    job_id = queue.enqueue('noop')
+
+    assert queue.cancel(job_id) == 'cancelled'
+    assert queue._claim() is None
+    assert queue.get(job_id)['status'] == 'cancelled'
+
+
+def test_cancel_requested_stops_running_job(db_path):
+    queue = make_queue(db_path)
+    started = threading.Event()
+    steps = []
+
+    @queue.register('long')
+    def long_job(job):
+        started.set()
+        for step in range(500):
+            job.progress(step / 5)
+            steps.append(step)
+            threading.Event().wait(0.01)
+
+    job_id = queue.enqueue('long')
+    worker = threading.Thread(target=queue._execute, args=(queue._claim(),))
+    worker.start()
+    assert started.wait(5)
+    assert queue.cancel(job_id) == 'running'
+    worker.join(10)
+
+    assert not worker.is_alive()
+    info = queue.get(job_id)
+    assert info['status'] == 'cancelled'
+    assert info['cancel_requested']
+    assert len(steps) < 500
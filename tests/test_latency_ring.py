@@ -0,0 +1,53 @@
+import math
+import random
+import statistics
+
+import pytest
+
+from latency_ring import LatencyRing
+
+
+def assert_matches(ring, window):
+    stats = ring.stats()
+    assert stats['count'] == len(window)
+    assert ring.values() == window
+    if not window:
+        assert stats['min'] is None and stats['max'] is None and stats['avg'] is None
+        assert ring.last is None
+        return
+    assert stats['min'] == min(window)
+    assert stats['max'] == max(window)
+    assert stats['last'] == window[-1]
+    assert math.isclose(stats['avg'], statistics.fmean(window), rel_tol=1e-9, abs_tol=1e-9)
+    assert math.isclose(stats['stddev'], statistics.pstdev(window), rel_tol=1e-6, abs_tol=1e-6)
+
+
+@pytest.mark.parametrize('capacity', [1, 2, 7, 60])
+@pytest.mark.parametrize('seed', range(5))
+def test_ring_matches_brute_force(capacity, seed):
+    rng = random.Random(seed)
+    ring = LatencyRing(capacity)
+    samples = []
+    # Varias vueltas completas para ejercitar el descarte y el recálculo de las sumas
+    for _ in range(capacity * 5 + 13):
+        samples.append(rng.choice([rng.uniform(0.1, 500), float(rng.randint(1, 5))]))
+        ring.append(samples[-1])
+        window = samples[-capacity:]
+        assert_matches(ring, window)
+        last = rng.randint(0, capacity + 2)
+        assert ring.values(last) == (window[-last:] if last else [])
+
+
+def test_clear_empties_the_window():
+    ring = LatencyRing(3)
+    for value in (5, 1, 9, 4):
+        ring.append(value)
+    ring.clear()
+    assert_matches(ring, [])
+    ring.append(2)
+    assert_matches(ring, [2.0])
+
+
+def test_capacity_must_be_positive():
+    with pytest.raises(ValueError):
+        LatencyRing(0)
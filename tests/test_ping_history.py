@@ -0,0 +1,37 @@
+import sqlite3
+
+from ping_history import PingHistoryStore
+
+
+class BrokenConnection:
+    """Conexión cuyas escrituras fallan, como un disco lleno."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, *args):
+        raise sqlite3.OperationalError('disk I/O error')
+
+    executemany = execute
+
+
+def test_failed_flush_keeps_the_newest_samples(tmp_path):
+    store = PingHistoryStore(str(tmp_path / 'history.db'), flush_interval=3600, max_buffer=10)
+    try:
+        for n in range(8):
+            store.record('10.0.0.1', float(n), 1, 1, ts=1000 + n)
+        conn, store._write_conn = store._write_conn, BrokenConnection()
+        assert store.flush() == 0
+
+        for n in range(8, 14):
+            store.record('10.0.0.1', float(n), 1, 1, ts=1000 + n)
+        store._write_conn = conn
+        assert store.flush() == 10
+
+        assert store.dropped == 4
+        assert [sample['latency'] for sample in store.query('10.0.0.1')] == [float(n) for n in range(4, 14)]
+    finally:
+        store.close()
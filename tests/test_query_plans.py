@@ -0,0 +1,19 @@
+import sqlite3
+
+import pytest
+
+from migrations import QUERY_PLAN_CHECKS, migrate, query_plan
+
+
+@pytest.fixture(scope='module')
+def conn(tmp_path_factory):
+    conn = sqlite3.connect(tmp_path_factory.mktemp('db') / 'tickets.db')
+    migrate(conn)
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize('sql, index', QUERY_PLAN_CHECKS, ids=[sql[:60] for sql, _ in QUERY_PLAN_CHECKS])
+def test_query_uses_index(conn, sql, index):
+    plan = query_plan(conn, sql)
+    assert index in plan, f"se esperaba {index}; plan: {plan}"
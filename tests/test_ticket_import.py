@@ -0,0 +1,69 @@
+import sqlite3
+
+import openpyxl
+import pytest
+
+from migrations import migrate
+from ticket_import import LEDGER_CHUNK_ROWS, import_file
+
+ROWS = LEDGER_CHUNK_ROWS * 2 + 200  # Tres rangos del registro; el último incompleto
+EDITED = LEDGER_CHUNK_ROWS * 2 + 50  # Fila editada, dentro del último rango
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'tickets.db')
+    migrate(conn)
+    yield conn
+    conn.close()
+
+
+def write_workbook(path, edited_status=None):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(['Ticket', 'Fecha de creacion', 'Agente', 'Estado'])
+    for n in range(ROWS):
+        status = edited_status if n == EDITED and edited_status else 'Abierto'
+        sheet.append([1000 + n, f"{n % 28 + 1:02d}/03/2024", f"Agente {n % 5}", status])
+    workbook.save(path)
+    return str(path)
+
+
+def count(conn, table):
+    return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_reimport_skips_unchanged_chunks_and_logs_field_changes(conn, tmp_path):
+    original = write_workbook(tmp_path / 'original.xlsx')
+    first = import_file(conn, original, update=True)
+    assert first['new_tickets'] == ROWS
+    assert first['processed_rows'] == ROWS
+    assert count(conn, 'ticket_changes') == 0
+
+    # Mismo archivo: se reconoce por su hash sin leerlo
+    again = import_file(conn, original, update=True)
+    assert again['duplicate']
+
+    # Mismo contenido con otro hash de archivo: todos los rangos ya se vieron
+    same = import_file(conn, original, file_hash='otro-archivo', update=True)
+    assert not same['duplicate']
+    assert same['rows'] == ROWS
+    assert same['processed_rows'] == 0
+    assert same['new_tickets'] == same['updated_tickets'] == same['changed_fields'] == 0
+    assert count(conn, 'ticket_changes') == 0
+
+    # Una fila editada: sólo se reprocesa su rango y se registra el campo que cambió
+    edited = write_workbook(tmp_path / 'edited.xlsx', edited_status='Cerrado')
+    result = import_file(conn, edited, update=True)
+    assert result['processed_rows'] == ROWS - 2 * LEDGER_CHUNK_ROWS
+    assert result['new_tickets'] == 0
+    assert result['updated_tickets'] == 1
+    assert result['changed_fields'] == 1
+
+    changes = conn.execute(
+        "SELECT ticket_number, field, old_value, new_value, import_id FROM ticket_changes"
+    ).fetchall()
+    assert changes == [(1000 + EDITED, 'status', 'Abierto', 'Cerrado', result['import_id'])]
+    assert conn.execute(
+        "SELECT status FROM tickets WHERE ticket_number = ?", (1000 + EDITED,)
+    ).fetchone() == ('Cerrado',)
@@ -0,0 +1,662 @@
+"""
+Ingesta de exportaciones de tickets (Excel) a la tabla tickets.
+
+Todo el archivo se normaliza con operaciones vectorizadas de pandas (fechas,
+separación del campo Agente, demora), se descartan en una sola consulta los
+tickets que ya existen y el resto se escribe con un único executemany dentro
+de una transacción. Cada archivo subido queda en el registro de importaciones
+(import_ledger), que permite saltear archivos y rangos de filas ya importados.
+Las subidas se leen en streaming (openpyxl read-only o CSV por bloques) y se
+procesan como trabajo de la cola (job_queue.py), que informa su progreso.
+
+También sirve para reconstruir la base desde el archivo de exportaciones
+diarias (carpeta "BD Excel"):
+
+    python ticket_import.py "BD Excel"                # sólo agrega tickets nuevos
+    python ticket_import.py "BD Excel" --update       # además actualiza los existentes
+    python ticket_import.py "BD Excel" --workers 8 --batch-size 10000
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+import openpyxl
+import pandas as pd
+
+# Columnas de la exportación -> columnas de tickets
+COLUMN_MAP = {
+    'Ticket': 'ticket_number',
+    'Fecha de creacion': 'creation_date',
+    'Agente': 'agent',
+    'Estado': 'status',
+    'Colaboradores': 'collaborators',
+    'Primera Respuesta': 'first_response',
+    'SLA de resolucion': 'sla_resolution',
+    'Fecha de cierre': 'close_date',
+    'Demora': 'delay',
+    'Usuario': 'user',
+    'Detalle del billete': 'details',
+    'Sucursal': 'branch',
+    'Prioridad': 'priority',
+}
+
+# Columnas que se escriben en tickets, en el orden del INSERT
+TICKET_FIELDS = ('ticket_number', 'creation_date', 'agent', 'status', 'collaborators', 'first_response',
+                 'sla_resolution', 'close_date', 'delay', 'user', 'details', 'branch', 'priority')
+
+DATE_FORMAT = '%d/%m/%Y'
+
+
+class StageTimer:
+    """Acumula la duración en milisegundos de cada etapa de una importación."""
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.timings[name] = round(self.timings.get(name, 0) + elapsed, 2)
+
+
+def _blank(series):
+    """Valores vacíos: NaN/None o texto en blanco."""
+    return series.isna() | (series.astype(str).str.strip() == '')
+
+
+def _text(series):
+    """Serie como texto, con None en los vacíos."""
+    return series.astype(str).where(series.notna(), None)
+
+
+def _parse_dates(series):
+    """Fechas dd/mm/aaaa (texto) o celdas de fecha de Excel; NaT si no se pueden leer."""
+    return pd.to_datetime(series.astype(object), format=DATE_FORMAT, errors='coerce')
+
+
+def normalize_frame(data):
+    """
+    Convierte una exportación en un DataFrame con TICKET_FIELDS listo para insertar.
+
+    - Descarta filas sin número de ticket y repetidos dentro del archivo (queda el primero).
+    - Si Agente trae "| Sucursal, Usuario" (exportaciones del lado del cliente) completa
+      sucursal y usuario con esos datos y deja el agente como "S/A".
+    - La demora se calcula en días entre creación y cierre; si no hay fechas válidas se
+      usa la columna Demora del archivo o "0 días".
+    """
+    if 'Ticket' not in data.columns:
+        raise ValueError("El archivo no tiene la columna 'Ticket'")
+    frame = data.rename(columns=COLUMN_MAP)
+    for field in TICKET_FIELDS:
+        if field not in frame.columns:
+            frame[field] = None
+
+    frame['ticket_number'] = pd.to_numeric(frame['ticket_number'], errors='coerce')
+    frame = frame[frame['ticket_number'].notna() & (frame['ticket_number'] != 0)]
+    frame = frame.assign(ticket_number=frame['ticket_number'].astype('int64'))
+    frame = frame.drop_duplicates('ticket_number', keep='first')
+
+    # Agente "| Sucursal, Usuario": la info del cliente va a sucursal/usuario
+    agent = frame['agent'].astype(object).where(frame['agent'].notna(), '').astype(str)
+    from_client = agent.str.contains('|', regex=False)
+    info = agent.str.split('|', n=1).str[1].fillna('').str.split(',')
+    has_info = from_client & (info.str.len() > 1)
+    client_branch = info.str[0].fillna('').str.strip()
+    client_user = info.str[1].fillna('').str.strip()
+    branch_blank, user_blank = _blank(frame['branch']), _blank(frame['user'])
+    frame['branch'] = frame['branch'].astype(object).mask(has_info & branch_blank, client_branch)
+    frame['user'] = frame['user'].astype(object).mask(has_info & user_blank, client_user)
+    frame['agent'] = agent.mask(from_client, 'S/A')
+    for field in ('agent', 'user', 'branch'):
+        frame[field] = _text(frame[field]).fillna('')
+
+    # Demora en días entre creación y cierre
+    days = (_parse_dates(frame['close_date']) - _parse_dates(frame['creation_date'])).dt.days
+    fallback = _text(frame['delay']).fillna('0 días')
+    frame['delay'] = days.map(lambda d: f"{int(d)} días", na_action='ignore').fillna(fallback)
+
+    frame['details'] = _text(frame['details']).fillna('')
+    frame['priority'] = _text(frame['priority']).fillna('Normal') if 'Prioridad' in data.columns else 'Normal'
+    for field in ('creation_date', 'status', 'collaborators', 'first_response', 'sla_resolution', 'close_date'):
+        frame[field] = _text(frame[field])
+
+    return frame[list(TICKET_FIELDS)].astype(object).where(frame[list(TICKET_FIELDS)].notna(), None)
+
+
+def existing_ticket_numbers(conn, numbers):
+    """Números de ticket de `numbers` que ya están en la base (una sola consulta indexada)."""
+    rows = conn.execute(
+        "SELECT ticket_number FROM tickets WHERE ticket_number IN (SELECT value FROM json_each(?))",
+        (json.dumps([int(n) for n in numbers]),)
+    )
+    return {row[0] for row in rows}
+
+
+def insert_tickets(conn, frame):
+    """Inserta las filas de `frame` con un executemany; ignora números ya existentes."""
+    columns = ', '.join(TICKET_FIELDS)
+    placeholders = ', '.join('?' for _ in TICKET_FIELDS)
+    cursor = conn.executemany(
+        f"INSERT INTO tickets ({columns}) VALUES ({placeholders}) ON CONFLICT (ticket_number) DO NOTHING",
+        frame.itertuples(index=False, name=None)
+    )
+    return cursor.rowcount
+
+
+def update_fields(columns):
+    """Campos de tickets que trae una exportación con estas columnas: los únicos que una actualización toca."""
+    present = {COLUMN_MAP[column] for column in columns if column in COLUMN_MAP}
+    if 'agent' in present:
+        present |= {'user', 'branch'}  # Agente "| Sucursal, Usuario"
+    if present & {'creation_date', 'close_date'}:
+        present.add('delay')  # Se recalcula con las fechas
+    return [field for field in TICKET_FIELDS[1:] if field in present]
+
+
+def stored_tickets(conn, numbers):
+    """Tickets guardados de `numbers` (id y TICKET_FIELDS), indexados por número (una sola consulta)."""
+    cursor = conn.execute(
+        f"SELECT id, {', '.join(TICKET_FIELDS)} FROM tickets "
+        "WHERE ticket_number IN (SELECT value FROM json_each(?))",
+        (json.dumps([int(n) for n in numbers]),)
+    )
+    stored = pd.DataFrame.from_records(cursor.fetchall(), columns=('id',) + TICKET_FIELDS)
+    return stored.set_index('ticket_number')
+
+
+def _comparable(frame):
+    """Campos como texto, con '' en los vacíos, para comparar el archivo con la base."""
+    return frame.astype(object).where(frame.notna(), '').astype(str)
+
+
+def update_changed_tickets(conn, frame, stored, fields, import_id=None):
+    """
+    Actualiza los tickets existentes de `frame` cuyos `fields` cambiaron y registra cada cambio.
+
+    Se comparan en bloque el hash de los campos normalizados de cada fila del
+    archivo con el de la fila guardada; sólo las filas distintas se revisan
+    campo por campo. Los vacíos del archivo (y el "S/A" de las exportaciones de
+    colaborador) no pisan lo guardado. Todas las filas cambiadas se escriben con
+    un único executemany que asigna sólo sus columnas cambiadas (el resto queda
+    en NULL y coalesce conserva el valor) y el historial va a ticket_changes.
+
+    Devuelve (tickets actualizados, campos cambiados).
+    """
+    if not fields or frame.empty:
+        return 0, 0
+    incoming = frame.set_index('ticket_number')[fields]
+    current = stored.loc[incoming.index, fields]
+    keep = incoming.isna() | (_comparable(incoming).apply(lambda column: column.str.strip()) == '')
+    if 'agent' in fields:
+        keep['agent'] |= incoming['agent'] == 'S/A'
+    incoming = incoming.mask(keep, current)
+
+    old, new = _comparable(current), _comparable(incoming)
+    changed = (pd.util.hash_pandas_object(old, index=False).to_numpy()
+               != pd.util.hash_pandas_object(new, index=False).to_numpy())
+    if not changed.any():
+        return 0, 0
+    old, new, incoming = old[changed], new[changed], incoming[changed]
+    differs = old != new
+
+    ids = stored.loc[incoming.index, 'id']
+    assignments = ', '.join(f"{field} = coalesce(?, {field})" for field in fields)
+    updates = incoming.astype(object).where(differs, None).where(incoming.notna(), None)
+    conn.executemany(
+        f"UPDATE tickets SET {assignments} WHERE id = ?",
+        [(*values, int(ticket_id)) for values, ticket_id in zip(updates.itertuples(index=False, name=None), ids)]
+    )
+
+    changed_at = datetime.now().isoformat(timespec='seconds')
+    cells = differs.stack()
+    cells = cells[cells].index
+    conn.executemany(
+        "INSERT INTO ticket_changes (ticket_id, ticket_number, field, old_value, new_value, import_id, changed_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(int(ids[number]), int(number), field, stored.at[number, field], incoming.at[number, field],
+          import_id, changed_at) for number, field in cells]
+    )
+    return len(incoming), len(cells)
+
+
+def rejected_rows(data):
+    """Filas del archivo (numeradas como en Excel) sin un número de ticket válido."""
+    if 'Ticket' not in data.columns:
+        return [int(i) + 2 for i in data.index]
+    numbers = pd.to_numeric(data['Ticket'], errors='coerce')
+    invalid = numbers.isna() | (numbers == 0)
+    return [int(i) + 2 for i in data.index[invalid]]  # +2: encabezado y base 1
+
+
+def import_frame(conn, data, timer=None, commit=True, update=False, import_id=None):
+    """
+    Normaliza `data` e inserta los tickets nuevos en una sola transacción.
+
+    Devuelve {'rows', 'new_tickets', 'existing', 'updated_tickets',
+    'changed_fields', 'skipped', 'timings'} donde `skipped` son las filas sin
+    número de ticket o repetidas en el archivo y `timings` los milisegundos de
+    cada etapa. Con update=True los tickets existentes que cambiaron se
+    actualizan (update_changed_tickets) y el historial queda asociado a
+    `import_id`. Con commit=False la transacción queda abierta para que el
+    llamador agregue sus propias escrituras.
+    """
+    timer = timer or StageTimer()
+    with timer.stage('normalize'):
+        frame = normalize_frame(data)
+    with timer.stage('dedupe'):
+        if update:
+            stored = stored_tickets(conn, frame['ticket_number'])
+            existing = set(stored.index)
+        else:
+            existing = existing_ticket_numbers(conn, frame['ticket_number'])
+        is_new = ~frame['ticket_number'].isin(existing)
+    with timer.stage('write'):
+        try:
+            inserted = insert_tickets(conn, frame[is_new])
+            updated = changed_fields = 0
+            if update:
+                updated, changed_fields = update_changed_tickets(
+                    conn, frame[~is_new], stored, update_fields(data.columns), import_id
+                )
+            if commit:
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return {
+        'rows': len(data),
+        'new_tickets': inserted,
+        'existing': len(existing),
+        'updated_tickets': updated,
+        'changed_fields': changed_fields,
+        'skipped': len(data) - len(frame),
+        'timings': timer.timings,
+    }
+
+
+# --- Registro de importaciones (import_ledger / import_chunks) ---
+
+LEDGER_CHUNK_ROWS = 500  # Filas por rango con hash propio
+STREAM_CHUNK_ROWS = LEDGER_CHUNK_ROWS * 4  # Filas que se leen, validan e insertan por vez
+MAX_REJECTED_LISTED = 1000  # Números de fila rechazados que se guardan en el registro
+UPLOAD_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+
+
+def chunk_digests(data, size=LEDGER_CHUNK_ROWS, mode='insert'):
+    """
+    Hash del contenido de cada rango de `size` filas: [(primera, última, hash)] (posiciones 0..n-1).
+    El modo entra en el hash: un rango importado sólo con inserción se vuelve a procesar para actualizar.
+    """
+    # Una celda vacía convierte la columna a float (1 -> 1.0): se vuelve a enteros
+    # para que ese cambio no altere el hash de las demás filas
+    canonical = data.copy()
+    for column in canonical.columns:
+        values = canonical[column]
+        if values.dtype.kind == 'f' and (values.dropna() % 1 == 0).all():
+            canonical[column] = values.astype('Int64')
+    row_hashes = pd.util.hash_pandas_object(canonical.astype(str), index=False).to_numpy()
+    columns = '\x1f'.join(map(str, data.columns)).encode('utf-8')
+    if mode != 'insert':
+        columns = mode.encode('utf-8') + b'\x1e' + columns
+    digests = []
+    for start in range(0, len(data), size):
+        block = row_hashes[start:start + size]
+        digests.append((start, start + len(block) - 1, hashlib.sha256(columns + block.tobytes()).hexdigest()))
+    return digests
+
+
+def find_import(conn, file_hash, mode='insert'):
+    """
+    Última importación completa de un archivo con ese contenido, o None.
+    Para una actualización ('upsert') sólo cuentan las importaciones que también actualizaron.
+    """
+    modes = ('insert', 'upsert') if mode == 'insert' else (mode,)
+    return conn.execute(
+        "SELECT id, rows, existing_tickets, rejected, imported_at FROM import_ledger "
+        "WHERE file_hash = ? AND status = 'done' AND mode IN (SELECT value FROM json_each(?)) "
+        "ORDER BY id DESC LIMIT 1", (file_hash, json.dumps(modes))
+    ).fetchone()
+
+
+def known_chunks(conn, digests):
+    """Hashes de `digests` que ya se importaron antes."""
+    rows = conn.execute(
+        "SELECT chunk_hash FROM import_chunks WHERE chunk_hash IN (SELECT value FROM json_each(?))",
+        (json.dumps([digest for _, _, digest in digests]),)
+    )
+    return {row[0] for row in rows}
+
+
+def start_import(conn, file_hash, filename, mode='insert'):
+    """Abre la entrada del registro (status 'running') y devuelve su id."""
+    cursor = conn.execute(
+        "INSERT INTO import_ledger (file_hash, filename, mode, status, imported_at) VALUES (?, ?, ?, 'running', ?)",
+        (file_hash, filename, mode, datetime.now().isoformat(timespec='seconds'))
+    )
+    conn.commit()
+    return cursor.lastrowid
+
+
+def finish_import(conn, import_id, result, status='done'):
+    conn.execute(
+        "UPDATE import_ledger SET status = ?, sheet = ?, rows = ?, processed_rows = ?, new_tickets = ?, "
+        "existing_tickets = ?, updated_tickets = ?, rejected = ?, rejected_rows = ?, duration_ms = ? WHERE id = ?",
+        (status, result.get('sheet'), result['rows'], result['processed_rows'], result['new_tickets'],
+         result['existing'], result['updated_tickets'], result['rejected'], json.dumps(result['rejected_rows']),
+         result.get('duration_ms'), import_id)
+    )
+    conn.commit()
+
+
+def save_upload(file, directory):
+    """
+    Guarda un archivo subido en `directory` de a bloques, calculando su sha256
+    en el camino. Devuelve (ruta, hash).
+    """
+    extension = os.path.splitext(file.filename or '')[1].lower()
+    digest = hashlib.sha256()
+    handle, path = tempfile.mkstemp(suffix=extension, prefix='import-', dir=directory)
+    with os.fdopen(handle, 'wb') as out:
+        for block in iter(lambda: file.stream.read(1024 * 1024), b''):
+            digest.update(block)
+            out.write(block)
+    return path, digest.hexdigest()
+
+
+def iter_file_chunks(path, chunk_rows=STREAM_CHUNK_ROWS):
+    """
+    Lee una exportación de a `chunk_rows` filas sin cargarla entera.
+
+    Genera (hoja, total estimado de filas, DataFrame) por bloque; el
+    índice de cada DataFrame es la posición de la fila en el archivo. Los .xlsx
+    se leen con openpyxl en modo read-only, los .csv con pandas por bloques y
+    los .xls (sin lectura incremental) completos.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        # Total estimado contando saltos de línea (un detalle con saltos de línea suma de más)
+        with open(path, 'rb') as source:
+            total = sum(block.count(b'\n') for block in iter(lambda: source.read(1024 * 1024), b'')) - 1
+        for chunk in pd.read_csv(path, chunksize=chunk_rows, encoding='utf-8-sig'):
+            yield None, max(total, 0), chunk
+        return
+    if extension == '.xls':
+        data = pd.read_excel(path)
+        for start in range(0, len(data), chunk_rows):
+            yield None, len(data), data.iloc[start:start + chunk_rows]
+        return
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)  # openpyxl avisa por extensiones que no soporta
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        total = sheet.max_row - 1 if sheet.max_row else None
+        rows = sheet.iter_rows(values_only=True)
+        header = [str(value).strip() if value is not None else '' for value in next(rows, ())]
+        batch, positions = [], []
+        for position, row in enumerate(rows):
+            if not any(value is not None for value in row):
+                continue  # read-only puede devolver filas vacías al final de la hoja
+            batch.append(row[:len(header)])
+            positions.append(position)
+            if len(batch) == chunk_rows:
+                yield sheet.title, total, pd.DataFrame.from_records(batch, columns=header, index=positions)
+                batch, positions = [], []
+        if batch:
+            yield sheet.title, total, pd.DataFrame.from_records(batch, columns=header, index=positions)
+    finally:
+        workbook.close()
+
+
+def import_file(conn, path, filename=None, file_hash=None, force=False, update=False, progress=None):
+    """
+    Importa una exportación (.xlsx, .xls o .csv) en streaming, con memoria acotada.
+
+    - Si ya se importó un archivo con el mismo contenido (sha256) se devuelve
+      enseguida, sin leerlo (`duplicate: True`).
+    - El archivo se recorre de a STREAM_CHUNK_ROWS filas; de cada bloque sólo
+      se procesan los rangos de LEDGER_CHUNK_ROWS filas cuyo hash no se vio
+      antes. Cada bloque se confirma junto con sus hashes, así una importación
+      interrumpida retoma donde quedó.
+    - Con `update` los tickets existentes que cambiaron se actualizan campo
+      por campo y cada cambio queda en ticket_changes (ver import_frame).
+    - `progress(resultado_parcial)` se llama después de cada bloque.
+
+    `force` ignora el registro y procesa todo el archivo.
+    """
+    timer = StageTimer()
+    started = time.perf_counter()
+    if file_hash is None:
+        digest = hashlib.sha256()
+        with timer.stage('hash'), open(path, 'rb') as source:
+            for block in iter(lambda: source.read(1024 * 1024), b''):
+                digest.update(block)
+        file_hash = digest.hexdigest()
+    mode = 'upsert' if update else 'insert'
+    previous = None if force else find_import(conn, file_hash, mode)
+    if previous is not None:
+        return {
+            'duplicate': True,
+            'import_id': previous[0],
+            'imported_at': previous[4],
+            'rows': previous[1],
+            'processed_rows': 0,
+            'new_tickets': 0,
+            'existing': previous[2],
+            'updated_tickets': 0,
+            'rejected': previous[3],
+            'skipped': 0,
+            'timings': timer.timings,
+        }
+
+    import_id = start_import(conn, file_hash, filename or os.path.basename(path), mode)
+    result = {'duplicate': False, 'import_id': import_id, 'sheet': None, 'total_rows': None, 'rows': 0,
+              'processed_rows': 0, 'new_tickets': 0, 'existing': 0, 'updated_tickets': 0, 'changed_fields': 0,
+              'skipped': 0, 'rejected': 0, 'rejected_rows': [], 'timings': timer.timings}
+    try:
+        chunks = iter_file_chunks(path)
+        while True:
+            with timer.stage('read'):
+                sheet, total, data = next(chunks, (None, None, None))
+            if data is None:
+                break
+            with timer.stage('hash'):
+                digests = chunk_digests(data, mode=mode)
+                seen = set() if force else known_chunks(conn, digests)
+                fresh = [(first, last, digest) for first, last, digest in digests if digest not in seen]
+                pending = data.iloc[[i for first, last, _ in fresh for i in range(first, last + 1)]]
+
+            part = import_frame(conn, pending, timer, commit=False, update=update, import_id=import_id)
+            try:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO import_chunks (chunk_hash, import_id, first_row, last_row) "
+                    "VALUES (?, ?, ?, ?)",
+                    [(digest, import_id, int(data.index[first]), int(data.index[last])) for first, last, digest in fresh]
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+            rejected = rejected_rows(pending)
+            result['sheet'], result['total_rows'] = sheet, total
+            result['rows'] += len(data)
+            result['processed_rows'] += len(pending)
+            for key in ('new_tickets', 'existing', 'updated_tickets', 'changed_fields', 'skipped'):
+                result[key] += part[key]
+            result['rejected'] += len(rejected)
+            result['rejected_rows'].extend(rejected[:MAX_REJECTED_LISTED - len(result['rejected_rows'])])
+            if progress:
+                progress(result)
+    except Exception:
+        result['duration_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        finish_import(conn, import_id, result, status='error')
+        raise
+
+    result['duration_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    finish_import(conn, import_id, result)
+    return result
+
+
+# --- Reconstrucción desde el archivo de exportaciones ---
+
+# Exportaciones de colaborador: "Colaborador102", "colabora1612", "C1410", "143C2", "212Colaboradores"...
+COLLABORATOR_NAME = re.compile(r'colab|^c\d|\dc\d*$')
+BACKFILL_BATCH_SIZE = 5000
+
+
+def export_kind(path):
+    """'collaborator' o 'agent' según el nombre del archivo (sin marca se toma como de agente)."""
+    stem = os.path.splitext(os.path.basename(path))[0].lower()
+    return 'collaborator' if COLLABORATOR_NAME.search(stem) else 'agent'
+
+
+def discover_workbooks(folder):
+    """Libros .xlsx de la carpeta (sin los temporales de Excel "~$..."), ordenados por nombre."""
+    return sorted(
+        os.path.join(folder, name) for name in os.listdir(folder)
+        if name.lower().endswith('.xlsx') and not name.startswith('~$')
+    )
+
+
+def parse_workbook(path):
+    """
+    Lee y normaliza una exportación (corre en un proceso del pool).
+
+    La fecha de la exportación es la fecha más reciente que aparece en ella
+    (creación o cierre): los nombres de archivo no siguen un formato fijo.
+    Devuelve (ruta, tipo, fecha, DataFrame normalizado, filas leídas, campos que trae).
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)  # openpyxl avisa por extensiones que no soporta
+        data = pd.read_excel(path)
+    frame = normalize_frame(data)
+    dates = pd.concat([_parse_dates(frame['creation_date']), _parse_dates(frame['close_date'])])
+    file_date = dates.max()
+    if pd.isna(file_date):
+        file_date = pd.Timestamp(datetime.fromtimestamp(os.path.getmtime(path)))
+    return path, export_kind(path), file_date, frame, len(data), update_fields(data.columns)
+
+
+def merge_exports(parsed):
+    """
+    Une todas las exportaciones en una fila por ticket.
+
+    Un mismo ticket aparece en la exportación del agente y en la del
+    colaborador, y en varios días. Se toma, campo por campo, el último valor
+    no vacío ordenando por fecha de exportación (a igual fecha gana la de
+    agente). El "S/A" de las exportaciones de colaborador no pisa al agente real.
+    """
+    frames = []
+    for _, kind, file_date, frame, *_ in parsed:
+        frames.append(frame.assign(_file_date=file_date, _agent_export=kind == 'agent'))
+    if not frames:
+        return pd.DataFrame(columns=list(TICKET_FIELDS))
+    combined = pd.concat(frames, ignore_index=True)
+    combined = combined.sort_values(['_file_date', '_agent_export'], kind='stable')
+    combined = combined.replace('', None)
+    combined['agent'] = combined['agent'].mask(combined['agent'] == 'S/A')
+    # GroupBy.last() toma el último valor no nulo de cada columna
+    merged = combined.groupby('ticket_number', sort=True)[list(TICKET_FIELDS[1:])].last().reset_index()
+    merged['agent'] = merged['agent'].fillna('S/A')
+    return merged[list(TICKET_FIELDS)].astype(object).where(merged[list(TICKET_FIELDS)].notna(), None)
+
+
+def backfill(conn, folder, workers=None, batch_size=BACKFILL_BATCH_SIZE, update=False, log=print):
+    """
+    Importa todas las exportaciones de `folder`.
+
+    Los libros se parsean en paralelo en un pool de procesos (openpyxl usa
+    CPU), se unen por ticket y se escriben en transacciones de `batch_size`
+    filas. Volver a correrlo no duplica nada: sin `update` sólo agrega
+    tickets nuevos; con `update` también corrige los que cambiaron
+    (update_changed_tickets, con su historial en ticket_changes).
+    """
+    timer = StageTimer()
+    paths = discover_workbooks(folder)
+    with timer.stage('parse'):
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = list(pool.map(parse_workbook, paths))
+    rows_read = sum(item[4] for item in parsed)
+    log(f"{len(paths)} libros leídos ({rows_read} filas)")
+
+    with timer.stage('merge'):
+        merged = merge_exports(parsed)
+        fields = [field for field in TICKET_FIELDS[1:] if any(field in item[5] for item in parsed)]
+    with timer.stage('dedupe'):
+        existing = existing_ticket_numbers(conn, merged['ticket_number'])
+        new_numbers = merged['ticket_number'][~merged['ticket_number'].isin(existing)]
+        pending = merged if update else merged[merged['ticket_number'].isin(new_numbers)]
+        pending = pending.assign(**{
+            field: pending[field].where(pending[field].notna(), '') for field in ('agent', 'user', 'branch', 'details')
+        })
+
+    inserted = changed = 0
+    with timer.stage('write'):
+        for start in range(0, len(pending), batch_size):
+            batch = pending.iloc[start:start + batch_size]
+            batch_new = batch['ticket_number'].isin(new_numbers)
+            try:
+                inserted += insert_tickets(conn, batch[batch_new])
+                if update:
+                    stored = stored_tickets(conn, batch['ticket_number'][~batch_new])
+                    changed += update_changed_tickets(conn, batch[~batch_new], stored, fields)[0]
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            log(f"  {min(start + batch_size, len(pending))}/{len(pending)} filas escritas")
+
+    elapsed = sum(timer.timings.values()) / 1000
+    return {
+        'files': len(paths),
+        'rows': rows_read,
+        'tickets': len(merged),
+        'new_tickets': inserted,
+        'updated_tickets': changed,
+        'seconds': round(elapsed, 2),
+        'rows_per_second': round(rows_read / elapsed, 1) if elapsed else None,
+        'timings': timer.timings,
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Importa todas las exportaciones de tickets de una carpeta.")
+    parser.add_argument('folder', help='carpeta con las exportaciones .xlsx (por ejemplo "BD Excel")')
+    parser.add_argument('--workers', type=int, default=None, help='procesos para parsear (por defecto, uno por CPU)')
+    parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE, help='filas por transacción')
+    parser.add_argument('--update', action='store_true', help='actualizar también los tickets existentes')
+    args = parser.parse_args(argv)
+
+    from db import connect as connect_db
+    from migrations import migrate
+
+    conn = connect_db()
+    try:
+        migrate(conn)
+        result = backfill(conn, args.folder, args.workers, args.batch_size, args.update)
+    finally:
+        conn.close()
+    print(f"{result['tickets']} tickets en {result['files']} libros: {result['new_tickets']} nuevos, "
+          f"{result['updated_tickets']} actualizados.")
+    print(f"{result['rows']} filas en {result['seconds']} s ({result['rows_per_second']} filas/s). "
+          f"Etapas (ms): {result['timings']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -1,33 +1,41 @@
-import time
-import schedule
+import os
 from email_ticket_scanner import scan_emails
-from datetime import datetime
+from db import connect as connect_db
+from job_queue import JobQueue
+from migrations import migrate
 
-def job():
-    """Tarea que se ejecuta cada 10 minutos"""
+# Minutos entre escaneos automáticos
+SCAN_INTERVAL_MINUTES = float(os.environ.get('EMAIL_SCAN_INTERVAL_MINUTES') or 10)
+
+# Comparte la tabla jobs con la app: un escaneo pedido desde la web o planificado aquí
+# lo ejecuta un solo proceso por vez (concurrency=1 cuenta los trabajos de ambos)
+job_queue = JobQueue(connect_db, workers=1)
+
+@job_queue.register('email_scan', max_attempts=3, retry_delay=60, concurrency=1)
+def scan_job(job):
+    """Escaneo de correos como trabajo de la cola"""
     print(f"\n{'='*60}")
-    print(f"[{datetime.now().strftime('%H:%M:%S')}] Ejecutando escaneo automático de tickets...")
+    print(f"[Trabajo {job.id}, intento {job.attempt}] Ejecutando escaneo automático de tickets...")
     print(f"{'='*60}")
-    scan_emails()
+    return {'new_tickets': scan_emails(raise_errors=True)}
 
 def run_scheduler():
     """Inicia el planificador de tareas"""
     print("="*60)
     print("SERVICIO AUTOMÁTICO DE TICKETS INICIADO")
-    print("Escaneando correos cada 10 minutos")
+    print(f"Escaneando correos cada {SCAN_INTERVAL_MINUTES:g} minutos")
     print("Presiona Ctrl+C para detener")
     print("="*60)
-    
-    # Ejecutar inmediatamente al inicio
-    job()
-    
-    # Programar ejecución cada 10 minutos
-    schedule.every(10).minutes.do(job)
-    
-    # Mantener el servicio corriendo
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+
+    conn = connect_db()
+    try:
+        migrate(conn)
+    finally:
+        conn.close()
+
+    # Se encola uno al arrancar (si no hubo otro en el último intervalo) y después cada SCAN_INTERVAL_MINUTES
+    job_queue.schedule('email_scan', SCAN_INTERVAL_MINUTES * 60)
+    job_queue.run_forever()
 
 if __name__ == "__main__":
     try: